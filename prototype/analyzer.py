@@ -0,0 +1,75 @@
+from functools import lru_cache
+from porter2stemmer import Porter2Stemmer
+from nltk.tokenize import RegexpTokenizer
+from nltk.corpus import stopwords
+
+'''
+The text analysis shared by the indexer and the query side, so that both always turn text
+into terms the same way:
+1) Lowercase all words.
+2) Get all tokens, where a token is a string of alphanumeric characters terminated by a non-alphanumeric character.
+3) Filter out all the tokens that are in the stop words list, such as 'a', 'an', 'the'.
+4) Stem each token with the Porter2 stemmer.
+
+stopwords.words('english') reads the stop word list from disk and returns a fresh list on
+every call, so calling it for every token meant a file read plus a linear scan per token.
+The list is loaded once into a frozenset here. News text is highly repetitive, so stems are
+kept in an LRU cache bounded to STEM_CACHE_SIZE words; stem_cache_stats() reports its hit rate.
+'''
+
+STEM_CACHE_SIZE = 100000
+
+tokenizer = RegexpTokenizer(r'\w+')
+stop_words = frozenset(stopwords.words('english'))
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    '''
+    Porter2Stemmer keeps the R1/R2 regions it found for the previous word and only overwrites them
+    when the new word has such a region, so a shared stemmer could stem the same word differently
+    depending on the words before it. A fresh stemmer per cache miss makes the stem a function of
+    the word alone (which is also what makes caching it correct) and is safe to call from threads.
+    '''
+    return Porter2Stemmer().stem(word)
+
+
+def analyze(text):
+    ''' Returns the list of terms of text, in order '''
+    tokens_list = tokenizer.tokenize(text.lower())
+    return [stem(word) for word in tokens_list if word not in stop_words]
+
+
+def analyze_with_offsets(text):
+    '''
+    Returns (terms, offsets): the terms of analyze(text) and for every term the (start, end)
+    character span of the token it came from in text, which is what snippets are cut along.
+    '''
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # a few characters lowercase to more than one, spans of the lowered text would be shifted,
+        # so tokens are cut from text and lowercased one by one
+        spans = list(tokenizer.span_tokenize(text))
+        tokens_list = [text[start:end].lower() for start, end in spans]
+    else:
+        spans = list(tokenizer.span_tokenize(lowered))
+        tokens_list = [lowered[start:end] for start, end in spans]
+    terms = []
+    offsets = []
+    for word, span in zip(tokens_list, spans):
+        if word not in stop_words:
+            terms.append(stem(word))
+            offsets.append(span)
+    return terms, offsets
+
+
+def stem_cache_stats():
+    info = stem.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0
+    }
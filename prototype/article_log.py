@@ -0,0 +1,134 @@
+import os
+import json
+import functools
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+'''
+Append-only article log: the articles of the streaming pipeline (pipeline.py) are appended to
+batch files, one JSON object {"url", "title", "content"} per line, instead of one pretty printed
+JSON file per article in source_files.
+
+    article_log/000001.jsonl.zst   closed batches, BATCH_SIZE articles each, zstd compressed
+    article_log/000002.jsonl       the batch being written
+
+A batch is compressed once it is full or the writer is closed (COMPRESS_BATCHES, needs the
+zstandard package). Compressing many similar articles together shrinks them several times, and
+thousands of tiny files become a handful of big ones.
+
+Every logged article is a document of the index named <folder>/<batch number>:<line number>, e.g.
+article_log/000001:17, which stays valid when its batch gets compressed. The full builds index
+the logged articles after the files of source_files (create_index.list_documents).
+'''
+
+ARTICLE_LOG_FOLDER = "article_log"
+BATCH_SIZE = 1000
+COMPRESS_BATCHES = True
+COMPRESSION_LEVEL = 3
+
+
+def article_name(batch_no, line_no, folder=ARTICLE_LOG_FOLDER):
+    return f"{folder}/{batch_no:06d}:{line_no}"
+
+
+def is_article_name(name, folder=ARTICLE_LOG_FOLDER):
+    ''' True for names of logged articles, file names in source_folder never contain a / '''
+    return name.startswith(folder + "/")
+
+
+def batch_numbers(folder=ARTICLE_LOG_FOLDER):
+    ''' Sorted numbers of the batches in folder '''
+    if not os.path.isdir(folder):
+        return []
+    return sorted({int(filename.split('.')[0]) for filename in os.listdir(folder)
+                   if filename.endswith(('.jsonl', '.jsonl.zst'))})
+
+
+def batch_path(batch_no, folder=ARTICLE_LOG_FOLDER):
+    ''' Path of a batch, compressed or not '''
+    path = os.path.join(folder, f"{batch_no:06d}.jsonl")
+    return path if os.path.exists(path) else path + ".zst"
+
+
+@functools.lru_cache(maxsize=2)
+def _batch_lines(path, mtime, size):
+    with open(path, 'rb') as file:
+        data = file.read()
+    if path.endswith('.zst'):
+        if zstd is None:
+            raise ValueError(f"{path} is zstd compressed, install the zstandard package")
+        data = zstd.ZstdDecompressor().decompress(data)
+    # not splitlines, which also splits at the unicode line separators json.dumps leaves in strings
+    lines = data.decode('utf-8').split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def batch_lines(batch_no, folder=ARTICLE_LOG_FOLDER):
+    ''' The lines of a batch, the last two batches read are kept (builds read a batch article by article) '''
+    path = batch_path(batch_no, folder)
+    stat = os.stat(path)
+    return _batch_lines(path, stat.st_mtime_ns, stat.st_size)
+
+
+def read_article(name, folder=ARTICLE_LOG_FOLDER):
+    ''' The article dict of a logged article name, raises ValueError if it can not be decoded '''
+    batch, line_no = name[len(folder) + 1:].split(':')
+    return json.loads(batch_lines(int(batch), folder)[int(line_no)])
+
+
+def article_names(folder=ARTICLE_LOG_FOLDER):
+    ''' Names of all logged articles in log order '''
+    names = []
+    for batch_no in batch_numbers(folder):
+        names.extend(article_name(batch_no, line_no, folder) for line_no in range(len(batch_lines(batch_no, folder))))
+    return names
+
+
+class ArticleLogWriter:
+    ''' Appends articles to the log, always to a new batch after the ones already there '''
+
+    def __init__(self, folder=ARTICLE_LOG_FOLDER, batch_size=BATCH_SIZE, compress=None):
+        if compress is None:
+            compress = COMPRESS_BATCHES
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.batch_size = batch_size
+        self.compress = compress and zstd is not None
+        self.batch_no = max(batch_numbers(folder), default=0) + 1
+        self.line_no = 0
+        self.file = open(os.path.join(folder, f"{self.batch_no:06d}.jsonl"), 'a', encoding='utf-8')
+
+    def append(self, article):
+        ''' Logs article and returns its name '''
+        self.file.write(json.dumps(article, ensure_ascii=False) + "\n")
+        # readers (a full build) see every article that was indexed
+        self.file.flush()
+        name = article_name(self.batch_no, self.line_no, self.folder)
+        self.line_no += 1
+        if self.line_no == self.batch_size:
+            self._close_batch()
+            self.batch_no += 1
+            self.line_no = 0
+            self.file = open(os.path.join(self.folder, f"{self.batch_no:06d}.jsonl"), 'a', encoding='utf-8')
+        return name
+
+    def _close_batch(self):
+        self.file.close()
+        path = self.file.name
+        if self.line_no == 0:
+            os.remove(path)
+        elif self.compress:
+            with open(path, 'rb') as file:
+                data = file.read()
+            with open(path + ".zst.tmp", 'wb') as file:
+                file.write(zstd.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data))
+            os.replace(path + ".zst.tmp", path + ".zst")
+            os.remove(path)
+
+    def close(self):
+        self._close_batch()
@@ -0,0 +1,61 @@
+import sys
+import time
+from segments import open_index, manifest_file
+import query_index
+
+'''
+Conjunctive against disjunctive evaluation of multi word queries on the index of the last build:
+the number of candidate documents that have to be ranked and the time to find and rank them,
+with the words combined by OR (the union free text queries used to be) and by AND (the default,
+evaluated by boolean_query.py with cost-ordered intersections).
+
+Usage: python3 benchmark_boolean.py [query ...]
+'''
+
+ROUNDS = 3
+QUERIES = [
+    "prime minister india",
+    "stock market sensex",
+    "world cup final",
+    "police arrested man",
+    "election commission",
+]
+
+
+def time_query(query, postings_index):
+    ''' (best time, number of candidates) of finding and ranking the documents of query '''
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        terms, query_type = query_index.analyze_query(query)
+        if query_index.DEFAULT_OPERATOR == "OR":
+            docs = query_index.get_docs_list_for_owq_and_ftq(terms, set(), postings_index)
+        else:
+            parsed_query = query_index.parse_query(query, query_index.DEFAULT_OPERATOR)
+            docs = query_index.get_docs_list_for_bq(parsed_query, postings_index)
+        query_index.rank_documents(terms, docs, postings_index)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, len(docs)
+
+
+def main():
+    queries = sys.argv[1:] or QUERIES
+    query_index.VERBOSE = False
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+
+    print(f"{'query':<32}{'OR docs':>10}{'OR (ms)':>10}{'AND docs':>10}{'AND (ms)':>10}")
+    for query in queries:
+        query_index.DEFAULT_OPERATOR = "OR"
+        or_time, or_docs = time_query(query, postings_index)
+        query_index.DEFAULT_OPERATOR = "AND"
+        and_time, and_docs = time_query(query, postings_index)
+        print(f"{query:<32}{or_docs:>10}{or_time * 1000:>10.2f}{and_docs:>10}{and_time * 1000:>10.2f}")
+    postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
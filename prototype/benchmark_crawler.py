@@ -0,0 +1,132 @@
+import os
+import time
+import email.utils
+import tempfile
+import threading
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from crawler import crawl, parse_feed, save_content
+from extraction import extract_article, load_sites
+
+'''
+Crawls a local stand-in for a news site: an HTTP server on 127.0.0.1 serving canned RSS feeds and
+article pages in the Times of India layout, each response delayed by LATENCY seconds like a
+round trip to the real site. Feeds overlap (ARTICLES_PER_FEED articles each, every one in two
+feeds) and answer 304 to a matching If-None-Match.
+
+before: the old scraper loop, a bare requests.get per feed and per article, one after the other.
+after:  crawler.crawl, a first crawl and then a second one, which finds every feed unchanged.
+'''
+
+FEED_COUNT = 10
+ARTICLES_PER_FEED = 20
+LATENCY = 0.02
+FEED_ETAG = '"feed-v1"'
+# pubDate of the first article, seconds since the epoch
+PUBLISHED = 1700000000
+# the article pages are in the Times of India layout
+STAND_IN_SITE = load_sites()["toi"]
+
+
+def feed_xml(feed_no, port):
+    items = []
+    for i in range(ARTICLES_PER_FEED):
+        # article numbers overlap between neighbouring feeds
+        article_no = feed_no * ARTICLES_PER_FEED // 2 + i
+        published = email.utils.formatdate(PUBLISHED + article_no * 60, usegmt=True)
+        items.append(f"<item><title>Story {article_no}</title><link>http://127.0.0.1:{port}/article/{article_no}</link>"
+                     f"<pubDate>{published}</pubDate></item>")
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {feed_no}</title>{"".join(items)}</channel></rss>'
+
+
+def article_html(article_no):
+    return (f"<html><body><h1 class=\"HNMDR\">Story number {article_no}</h1>"
+            f"<div class=\"_s30J clearfix\">Text of story {article_no}. " + "More words of the story. " * 50 +
+            "</div></body></html>")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_served = 0
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        StandInHandler.requests_served += 1
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "feed":
+            if self.headers.get("If-None-Match") == FEED_ETAG:
+                self.send_response(304)
+                self.send_header("ETag", FEED_ETAG)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = feed_xml(int(parts[1]), self.server.server_port).encode("utf-8")
+            content_type = "application/rss+xml"
+        elif parts[0] == "article":
+            body = article_html(int(parts[1])).encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if parts[0] == "feed":
+            self.send_header("ETag", FEED_ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def sequential_crawl(feed_urls, source_folder):
+    ''' The loop of the old rss_feed_scraper_*.main scripts '''
+    for rss_url in feed_urls:
+        article_urls = parse_feed(requests.get(rss_url).content)
+        for url, published in article_urls:
+            title, content = extract_article(requests.get(url).text, STAND_IN_SITE)
+            save_content(source_folder, url, title, content, published)
+
+
+def timed(function, *args, **kwargs):
+    StandInHandler.requests_served = 0
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start_time, StandInHandler.requests_served, result
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    feed_urls = [f"http://127.0.0.1:{server.server_port}/feed/{i}" for i in range(FEED_COUNT)]
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            before_folder = os.path.join(folder, "before")
+            after_folder = os.path.join(folder, "after")
+            os.makedirs(before_folder)
+            state_file = os.path.join(folder, "crawl_state.json")
+
+            before, before_requests, _ = timed(sequential_crawl, feed_urls, before_folder)
+            feeds = [(feed_url, STAND_IN_SITE) for feed_url in feed_urls]
+            first, first_requests, first_stats = timed(crawl, feeds, after_folder, state_file)
+            second, second_requests, second_stats = timed(crawl, feeds, after_folder, state_file)
+
+            assert sorted(os.listdir(before_folder)) == sorted(os.listdir(after_folder)), "crawls saved different articles"
+            for filename in os.listdir(before_folder):
+                with open(os.path.join(before_folder, filename), 'rb') as before_file, \
+                        open(os.path.join(after_folder, filename), 'rb') as after_file:
+                    assert before_file.read() == after_file.read(), f"crawls saved {filename} differently"
+            print(f"{FEED_COUNT} feeds, {len(os.listdir(after_folder))} distinct articles, {LATENCY * 1000:.0f} ms per response")
+            print(f"{'crawl':<22}{'requests':>10}{'time (s)':>10}")
+            print(f"{'sequential':<22}{before_requests:>10}{before:>10.2f}")
+            print(f"{'crawler, first':<22}{first_requests:>10}{first:>10.2f}")
+            print(f"{'crawler, unchanged':<22}{second_requests:>10}{second:>10.2f}")
+            print(f"first: {first_stats}")
+            print(f"second: {second_stats}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
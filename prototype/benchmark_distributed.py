@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import query_index
+from segments import SegmentedIndex, read_manifest, manifest_file
+from distributed import ShardedIndex, write_shards
+
+'''
+Latency of sharded, scatter-gather queries (distributed.py) as the collection grows by adding
+shards. The index of the last build is cut by doc ID into MAX_SHARDS shards (write_shards); the
+first n of them are searched by one process (query_index.search on all their segments) and by n
+worker processes with a coordinator. Every row holds n times the documents of the first, and the results of both
+have to be the same.
+
+The table shows the mean query time of both, and of the slowest shard of a query: with a core
+per worker the shards run side by side, and the sharded latency is the slowest shard plus the
+three rounds of the coordinator. On fewer cores than shards the workers take turns.
+
+Usage: python3 benchmark_distributed.py [max shards] [k]
+'''
+
+MAX_SHARDS = 4
+DEFAULT_K = 10
+ROUNDS = 3
+QUERIES = [
+    "election",
+    "prime minister",
+    "government market",
+    "india cricket",
+    '"prime minister"',
+    "india AND (cricket OR hockey) NOT pakistan",
+    "elect* AND india",
+]
+
+
+def best_time(function, *args, **kwargs):
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def first_shards(shards):
+    ''' A manifest of the segments, tombstones and deletion dictionaries of shards (the first of write_shards) '''
+    corpus = dict(shards[0], segments=[], deleted=[], spelling=[])
+    for shard in shards:
+        corpus["segments"] += shard["segments"]
+        corpus["deleted"] += shard["deleted"]
+        corpus["spelling"] += shard["spelling"]
+    return corpus
+
+
+def main():
+    max_shards = int(sys.argv[1]) if len(sys.argv) > 1 else MAX_SHARDS
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_K
+    query_index.VERBOSE = False
+    manifest = read_manifest(manifest_file)
+    if manifest is None:
+        raise SystemExit(f"{manifest_file} not found, run create_index.py first")
+    shards = write_shards(manifest, max_shards)
+    print(f"{len(manifest['segments'])} segments in {len(shards)} shards, k = {k}, {os.cpu_count()} cores")
+    print(f"{'shards':>6}{'documents':>11}{'one process (ms)':>18}{'sharded (ms)':>14}{'slowest shard (ms)':>20}")
+    for n in range(1, len(shards) + 1):
+        single_index = SegmentedIndex(first_shards(shards[:n]))
+        sharded_index = ShardedIndex(shards[:n])
+        try:
+            single_time = sharded_time = shard_time = 0
+            for query in QUERIES:
+                elapsed, (_, _, expected) = best_time(query_index.search, query, single_index, k)
+                single_time += elapsed
+                stats = {}
+                elapsed, (_, _, results) = best_time(sharded_index.search, query, k, stats=stats)
+                sharded_time += elapsed
+                shard_time += max(stats["shard_times"])
+                assert [(result["doc_id"], result["score"]) for result in results] == \
+                    [(result["doc_id"], result["score"]) for result in expected], f"sharded results of {query!r} differ"
+            print(f"{len(sharded_index.processes):>6}{single_index.doc_count:>11}{single_time / len(QUERIES) * 1000:>18.2f}"
+                  f"{sharded_time / len(QUERIES) * 1000:>14.2f}{shard_time / len(QUERIES) * 1000:>20.2f}")
+        finally:
+            sharded_index.close()
+            single_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import random
+import tempfile
+from segments import open_index, manifest_file
+from doc_store import DocStore, write_doc_store
+
+'''
+Before/after timing of reading the metadata (title, url, first 250 characters) of query results
+on the index of the last build.
+
+before: the old get_doc_metadata, which opens and parses the source JSON file of every document.
+after:  SegmentedIndex.document, which reads the doc store written at index time.
+
+Also shows the size of the doc store with and without per block zstd compression
+(doc_store.COMPRESS_BLOCKS) and the lookup time of both.
+'''
+
+source_folder = "source_files"
+RESULT_COUNTS = [10, 100, 1000]
+ROUNDS = 3
+
+
+def legacy_doc_metadata(doc_ids, doc_table):
+    ''' The per document open + json.load the query side did before doc_store.bin '''
+    snippets = {}
+    for doc_id in doc_ids:
+        with open(os.path.join(source_folder, doc_table[doc_id]['filename']), 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        snippets[doc_id] = {"title": data.get('title', ''), "url": data.get('url', ''), "content": data.get('content', '')[:250]}
+    return snippets
+
+
+def doc_store_metadata(doc_ids, doc_stores):
+    snippets = {}
+    for doc_id in doc_ids:
+        doc_store = next(doc_store for doc_store in doc_stores if doc_id in doc_store)
+        record = doc_store.get(doc_id)
+        snippets[doc_id] = {"title": record["title"], "url": record["url"], "content": record["content"][:250]}
+    return snippets
+
+
+def best_time(function, *args):
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def write_doc_stores(postings_index, folder, compress):
+    ''' Rewrites the doc stores of all segments to folder, returns (opened stores, total size in bytes) '''
+    doc_stores = []
+    size = 0
+    for i, doc_store in enumerate(postings_index.doc_stores):
+        filename = os.path.join(folder, f"doc_store_{i}_{int(compress)}.bin")
+        write_doc_store(doc_store.records(), doc_store.first_doc_id, filename, compress)
+        size += os.path.getsize(filename)
+        doc_stores.append(DocStore(filename))
+    return doc_stores, size
+
+
+def main():
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    doc_ids = list(postings_index.doc_table)
+    random.seed(42)
+
+    with tempfile.TemporaryDirectory() as folder:
+        plain_stores, plain_size = write_doc_stores(postings_index, folder, compress=False)
+        zstd_stores, zstd_size = write_doc_stores(postings_index, folder, compress=True)
+
+        print(f"{'results':>8}{'json files (ms)':>17}{'doc store (ms)':>16}{'zstd doc store (ms)':>21}")
+        for result_count in RESULT_COUNTS:
+            sample = random.sample(doc_ids, min(result_count, len(doc_ids)))
+            before, expected = best_time(legacy_doc_metadata, sample, postings_index.doc_table)
+            plain, plain_snippets = best_time(doc_store_metadata, sample, plain_stores)
+            compressed, zstd_snippets = best_time(doc_store_metadata, sample, zstd_stores)
+            assert plain_snippets == expected and zstd_snippets == expected, "doc store and source files disagree"
+            print(f"{len(sample):>8}{before * 1000:>17.2f}{plain * 1000:>16.2f}{compressed * 1000:>21.2f}")
+        print(f"doc store size: {plain_size} bytes, {zstd_size} bytes zstd compressed")
+
+        for doc_store in plain_stores + zstd_stores:
+            doc_store.close()
+    postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
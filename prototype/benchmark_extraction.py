@@ -0,0 +1,105 @@
+import os
+import time
+import concurrent.futures
+from bs4 import BeautifulSoup
+from extraction import extract_article, extract_batch, load_sites
+from crawler import PARSE_BATCH
+
+'''
+CPU time of extracting the title and content of article pages: the old scrapers (a BeautifulSoup
+tree built with html.parser, searched with find / find_all) against extraction.py (lxml and
+compiled XPath), and extraction.py over a process pool.
+
+The pages are generated in the layouts of sites.json and sized like real news pages: navigation
+with a few hundred links, inline scripts and JSON data, the article, related stories and a footer.
+'''
+
+PAGES = 200
+PARAGRAPHS = 30
+
+
+def old_parse_toi(html):
+    ''' parse_article of the old rss_feed_scraper_toi.py '''
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('h1', class_='HNMDR')
+    title = title_tag.text.strip() if title_tag else ''
+    content_tag = soup.find('div', class_='_s30J clearfix')
+    content = content_tag.get_text(separator=' ', strip=True) if content_tag else 'No Content'
+    return title, content
+
+
+def old_parse_bbc(html):
+    ''' parse_article of the old rss_feed_scraper_bbc.py '''
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('h1', class_='sc-518485e5-0 bWszMR')
+    title = title_tag.text.strip() if title_tag else ''
+    paragraphs = soup.find_all('p', class_='sc-eb7bd5f6-0 fYAfXe')
+    content = ' '.join(p.get_text(strip=True) for p in paragraphs) if paragraphs else 'No Content'
+    return title, content
+
+
+def page_frame(page_no, article):
+    navigation = "".join(f'<li class="nav-item"><a href="/section/{i}">Section {i}</a></li>' for i in range(300))
+    scripts = "".join(f'<script>window.__data{i} = {{"id": {i}, "items": [{", ".join(str(j) for j in range(100))}]}};</script>'
+                      for i in range(10))
+    related = "".join(f'<div class="card"><a href="/story/{page_no + i}"><img src="/img/{i}.jpg"><span>Related story {i}</span></a></div>'
+                      for i in range(40))
+    footer = "".join(f'<a class="footer-link" href="/about/{i}">About {i}</a>' for i in range(100))
+    return (f'<!DOCTYPE html><html><head><title>Story {page_no}</title>{scripts}<style>.a {{ color: red; }}</style></head>'
+            f'<body><header><ul class="nav">{navigation}</ul></header><main>{article}</main>'
+            f'<aside>{related}</aside><footer>{footer}</footer></body></html>')
+
+
+def sentence(page_no, i):
+    return f"Paragraph {i} of story {page_no} reports what happened and why it matters to the readers."
+
+
+def toi_page(page_no):
+    paragraphs = "".join(f'{sentence(page_no, i)}<br><br>' for i in range(PARAGRAPHS))
+    article = (f'<div class="article"><h1 class="HNMDR"><span>Story number {page_no}</span></h1>'
+               f'<div class="_s30J clearfix">{paragraphs}</div></div>')
+    return page_frame(page_no, article)
+
+
+def bbc_page(page_no):
+    paragraphs = "".join(f'<div data-component="text-block"><p class="sc-eb7bd5f6-0 fYAfXe">{sentence(page_no, i)}</p></div>'
+                         for i in range(PARAGRAPHS))
+    article = f'<article><h1 class="sc-518485e5-0 bWszMR">Story number {page_no}</h1>{paragraphs}</article>'
+    return page_frame(page_no, article)
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def main():
+    sites = load_sites()
+    layouts = [("toi", toi_page, old_parse_toi), ("bbc", bbc_page, old_parse_bbc)]
+    cores = os.cpu_count() or 1
+    print(f"{PAGES} pages per site, {cores} cores")
+    print(f"{'site':<6}{'page (KiB)':>12}{'before (ms)':>14}{'after (ms)':>12}{'speedup':>10}{'pool (ms)':>12}")
+    for name, make_page, old_parse in layouts:
+        site = sites[name]
+        pages = [make_page(page_no) for page_no in range(PAGES)]
+
+        before, old_articles = timed(lambda: [old_parse(page) for page in pages])
+        after, articles = timed(lambda: [extract_article(page, site) for page in pages])
+        assert [title for title, _ in articles] == [title for title, _ in old_articles], "titles differ"
+        assert [content.split() for _, content in articles] == [content.split() for _, content in old_articles], "contents differ"
+
+        batches = [[(page, site) for page in pages[start:start + PARSE_BATCH]] for start in range(0, PAGES, PARSE_BATCH)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=cores) as pool:
+            # start the worker processes before timing
+            list(pool.map(extract_batch, batches[:cores]))
+            pool_time, pooled = timed(lambda: [article for batch in pool.map(extract_batch, batches) for article in batch])
+        assert pooled == articles
+
+        page_size = sum(len(page) for page in pages) / PAGES / 1024
+        print(f"{name:<6}{page_size:>12.1f}{before / PAGES * 1000:>14.2f}{after / PAGES * 1000:>12.2f}"
+              f"{before / after:>9.1f}x{pool_time / PAGES * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import json
+import math
+import time
+import random
+import tempfile
+from create_index import create_postings_map_per_file, compute_doc_stats
+
+'''
+Before/after timing of the document statistics part of indexing on a synthetic corpus.
+
+before: every document re-reads, updates and re-dumps the whole doc_vector_space.txt
+        (the old update_doc_vector_space), which is O(N^2) in the number of documents.
+after:  statistics are accumulated in memory (compute_doc_stats) and
+        written once at the end (write_doc_vector_space), the way create_index.py
+        writes doc_table.json.
+'''
+
+CORPUS_SIZES = [500, 1000, 2000, 4000]
+VOCABULARY_SIZE = 20000
+TERMS_PER_DOC = 300
+
+
+def legacy_update_doc_vector_space(path, filename, terms_list):
+    ''' The per document read-modify-write of doc_vector_space.txt that indexing used to do '''
+    unique_term_freq = {}
+    for term in terms_list:
+        unique_term_freq[term] = unique_term_freq.get(term, 0) + 1
+    sum_of_squares = sum(freq * freq for freq in unique_term_freq.values())
+    data = {}
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'r') as file:
+            data = json.load(file)
+    data[filename] = math.sqrt(sum_of_squares)
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+
+def write_doc_vector_space(doc_table, doc_stats, path):
+    ''' The same file written once from the statistics accumulated in memory '''
+    data = {doc_name: stats["norm"] for doc_name, stats in zip(doc_table, doc_stats)}
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+
+def synthetic_corpus(doc_count):
+    random.seed(42)
+    vocabulary = [f"term{i}" for i in range(VOCABULARY_SIZE)]
+    return [(f"Synthetic article number {i}.json", random.choices(vocabulary, k=TERMS_PER_DOC)) for i in range(doc_count)]
+
+
+def time_before(corpus, folder):
+    path = os.path.join(folder, "doc_vector_space_before.txt")
+    start_time = time.perf_counter()
+    for filename, terms_list in corpus:
+        legacy_update_doc_vector_space(path, filename, terms_list)
+    return time.perf_counter() - start_time, path
+
+
+def time_after(corpus, folder):
+    path = os.path.join(folder, "doc_vector_space_after.txt")
+    start_time = time.perf_counter()
+    doc_table = []
+    doc_stats = []
+    for doc_id, (filename, terms_list) in enumerate(corpus):
+        postings_index_map = create_postings_map_per_file(doc_id, terms_list)
+        doc_table.append(filename)
+        doc_stats.append(compute_doc_stats(postings_index_map, len(terms_list)))
+    write_doc_vector_space(doc_table, doc_stats, path)
+    return time.perf_counter() - start_time, path
+
+
+def main():
+    print(f"{'documents':>10}{'before (s)':>14}{'after (s)':>12}{'speedup':>10}")
+    for doc_count in CORPUS_SIZES:
+        corpus = synthetic_corpus(doc_count)
+        with tempfile.TemporaryDirectory() as folder:
+            before, before_path = time_before(corpus, folder)
+            after, after_path = time_after(corpus, folder)
+            with open(before_path) as before_file, open(after_path) as after_file:
+                # both approaches have to produce the same vector magnitudes
+                assert json.load(before_file) == json.load(after_file)
+        print(f"{doc_count:>10}{before:>14.3f}{after:>12.3f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import sys
+import time
+import random
+from segments import read_manifest, manifest_file
+from binary_index import BinaryIndex
+from lexicon import encode_lexicon, Lexicon
+
+'''
+Memory and lookup time of the vocabulary of the last full build, as the dict of
+Python strings the indexer builds (create_index.postings_index) against the front-coded lexicon
+of index.bin (lexicon.py). Prefix lookups scan all keys of the dict, the lexicon finds the run
+of matching terms with two binary searches.
+
+The old term dictionary stored every term in full next to a 4 byte offset and 2 byte length.
+
+Usage: python3 benchmark_lexicon.py [lookups]
+'''
+
+DEFAULT_LOOKUPS = 2000
+SEED = 5
+
+
+def dict_size(vocabulary):
+    ''' Bytes of a dict keyed by the terms, the terms included (values not counted) '''
+    terms = {term: None for term in vocabulary}
+    return sys.getsizeof(terms) + sum(sys.getsizeof(term) for term in terms)
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LOOKUPS
+    manifest = read_manifest(manifest_file)
+    if manifest is None:
+        raise SystemExit(f"{manifest_file} not found, run create_index.py first")
+    # the segments split from a full build have the vocabulary of a period each
+    index = BinaryIndex(manifest.get("full_build", manifest["segments"][0]["index"]))
+    try:
+        vocabulary = list(index.terms())
+    finally:
+        index.close()
+    encoded = [term.encode('utf-8') for term in vocabulary]
+    data = encode_lexicon(encoded)
+    lexicon = Lexicon(data, 0, len(encoded))
+    terms = dict.fromkeys(vocabulary)
+
+    rng = random.Random(SEED)
+    exact = [rng.choice(vocabulary) for _ in range(lookups)]
+    prefixes = [term[:rng.randint(2, 4)] for term in exact]
+
+    print(f"{len(vocabulary)} terms, {lookups} lookups")
+    print(f"{'':<22}{'size (KiB)':>12}{'exact (us)':>12}{'prefix (us)':>13}")
+    dict_exact, _ = timed(lambda: [term in terms for term in exact])
+    dict_prefix, expected = timed(lambda: [[term for term in terms if term.startswith(prefix)] for prefix in prefixes])
+    old_size = sum(len(term) for term in encoded) + 6 * len(encoded)
+
+    def lexicon_prefix(prefix):
+        key = prefix.encode('utf-8')
+        return [term.decode('utf-8') for _, term in lexicon.iter_terms(lexicon.lower_bound(key), lexicon.lower_bound(key + b'\xff'))]
+
+    lexicon_exact, found = timed(lambda: [lexicon.find(term.encode('utf-8')) for term in exact])
+    lexicon_time, result = timed(lambda: [lexicon_prefix(prefix) for prefix in prefixes])
+    assert all(i >= 0 for i in found)
+    assert result == expected, "prefix lookups differ"
+    print(f"{'dict of strings':<22}{dict_size(vocabulary) / 1024:>12.1f}{dict_exact / lookups * 1e6:>12.2f}"
+          f"{dict_prefix / lookups * 1e6:>13.1f}")
+    print(f"{'old term blob':<22}{old_size / 1024:>12.1f}{'':>12}{'':>13}")
+    print(f"{'front-coded lexicon':<22}{len(data) / 1024:>12.1f}{lexicon_exact / lookups * 1e6:>12.2f}"
+          f"{lexicon_time / lookups * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
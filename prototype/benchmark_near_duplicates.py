@@ -0,0 +1,135 @@
+import os
+import time
+import random
+import tempfile
+import create_index
+from binary_index import BinaryIndex
+from crawler import save_content
+from analyzer import analyze
+
+'''
+Index size, candidate documents per query and build time with and without collapsing
+near-duplicates (near_duplicates.py), on a generated corpus where every story is published in
+one to MAX_COPIES feeds like the real ones do: under another headline, with a line of the feed's
+own boilerplate added, a few words changed or a paragraph cut.
+
+Also checks the collapsing against the known stories: a copy that is not collapsed into its
+story is a miss, a document collapsed into another story a false match.
+'''
+
+STORIES = 2000
+WORDS_PER_STORY = 300
+MAX_COPIES = 3
+VOCABULARY = 20000
+QUERIES = 200
+SEED = 7
+
+
+def make_vocabulary(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(VOCABULARY)]
+
+
+def variant(words, rng, vocabulary, copy_no):
+    ''' A copy of a story as another feed publishes it '''
+    words = list(words)
+    if copy_no == 0:
+        return words
+    edit = copy_no % 3
+    if edit == 1:
+        words += f"also read the latest {vocabulary[copy_no]} stories from our {vocabulary[copy_no + 1]} section".split()
+    elif edit == 2:
+        for _ in range(3):
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    else:
+        del words[-len(words) // 10:]
+    return words
+
+
+def make_corpus(folder, rng):
+    ''' Writes the corpus to folder, returns {file name: story number} '''
+    vocabulary = make_vocabulary(rng)
+    # Zipf like word frequencies, as in real text
+    weights = [1 / rank for rank in range(1, VOCABULARY + 1)]
+    stories = {}
+    for story_no in range(STORIES):
+        words = rng.choices(vocabulary, weights, k=WORDS_PER_STORY)
+        for copy_no in range(rng.randint(1, MAX_COPIES)):
+            title = f"Story {story_no} copy {copy_no}"
+            filename = save_content(folder, f"http://example.com/{copy_no}/{story_no}", title,
+                                    " ".join(variant(words, rng, vocabulary, copy_no)))
+            stories[filename] = story_no
+    return stories, vocabulary, weights
+
+
+def build(folder, collapse):
+    create_index.COLLAPSE_NEAR_DUPLICATES = collapse
+    postings_index = {}
+    doc_table = []
+    doc_stats = []
+    doc_records = []
+    near_duplicates = create_index.new_near_duplicates()
+    start_time = time.perf_counter()
+    for filename in sorted(os.listdir(folder)):
+        create_index.index_source_file(folder, filename, postings_index, doc_table, doc_stats, doc_records, near_duplicates)
+    elapsed = time.perf_counter() - start_time
+    index_file = os.path.join(os.path.dirname(folder), f"index_{collapse}.bin")
+    create_index.create_index_file(postings_index, len(doc_table), index_file, [stats["norm"] for stats in doc_stats],
+                                   [stats["length"] for stats in doc_stats])
+    return elapsed, index_file, doc_table, doc_stats
+
+
+def candidates(index, queries):
+    ''' Mean number of documents containing any term of a query '''
+    total = 0
+    for terms in queries:
+        docs = set()
+        for term in terms:
+            docs.update(doc_id for doc_id, _ in index.get(term, []))
+        total += len(docs)
+    return total / len(queries)
+
+
+def check(doc_table, doc_stats, stories):
+    ''' (copies not collapsed, documents collapsed into another story) '''
+    misses = 0
+    false_matches = 0
+    canonical_story = {}
+    for filename, stats in zip(doc_table, doc_stats):
+        story_no = stories[filename]
+        if "duplicate_of" in stats:
+            if stories[doc_table[stats["duplicate_of"]]] != story_no:
+                false_matches += 1
+        elif story_no in canonical_story:
+            misses += 1
+        else:
+            canonical_story[story_no] = filename
+    return misses, false_matches
+
+
+def main():
+    rng = random.Random(SEED)
+    with tempfile.TemporaryDirectory() as folder:
+        source_folder = os.path.join(folder, "source_files")
+        os.makedirs(source_folder)
+        stories, vocabulary, weights = make_corpus(source_folder, rng)
+        queries = [analyze(" ".join(rng.choices(vocabulary, weights[:1000] + [0] * (VOCABULARY - 1000), k=2)))
+                   for _ in range(QUERIES)]
+        print(f"{STORIES} stories, {len(stories)} articles")
+        print(f"{'':<10}{'indexed':>9}{'index (KiB)':>13}{'candidates':>12}{'build (s)':>11}")
+        for collapse in (False, True):
+            elapsed, index_file, doc_table, doc_stats = build(source_folder, collapse)
+            index = BinaryIndex(index_file)
+            try:
+                indexed = sum(1 for stats in doc_stats if "duplicate_of" not in stats)
+                print(f"{'after' if collapse else 'before':<10}{indexed:>9}{os.path.getsize(index_file) / 1024:>13.1f}"
+                      f"{candidates(index, queries):>12.1f}{elapsed:>11.2f}")
+            finally:
+                index.close()
+            if collapse:
+                misses, false_matches = check(doc_table, doc_stats, stories)
+                print(f"copies not collapsed: {misses}, collapsed into another story: {false_matches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import sys
+import time
+from analyzer import analyze
+from segments import open_index, manifest_file
+from phrase import phrase_docs
+
+'''
+Before/after timing of phrase queries on the index of the last build.
+
+before: the old get_docs_list_for_pq, which decodes the full postings lists of all terms, intersects
+        sets of doc IDs and then scans every term's postings list again for every candidate doc.
+after:  phrase.phrase_docs, which intersects rarest term first with skips and only decodes the
+        positions of documents that contain all the terms.
+
+Both run on a freshly opened index, so neither profits from postings decoded by the other.
+
+Usage: python3 benchmark_phrase.py [query ...]
+'''
+
+QUERIES = [
+    "prime minister",
+    "chief minister of the state",
+    "world cup",
+    "stock market",
+    "said on monday",
+]
+
+
+def legacy_docs_list_for_pq(terms, postings_index):
+    ''' The set based phrase matching query_index.py used before phrase.py '''
+    docs = set()
+    for term in terms:
+        try:
+            termDocs = [posting[0] for posting in postings_index[term]]
+            if len(docs) == 0:
+                docs = set(termDocs)
+            else:
+                docs &= set(termDocs)
+        except KeyError:
+            pass
+    result = []
+    for doc in docs:
+        query_term_position_list = []
+        for term in terms:
+            try:
+                for posting in postings_index[term]:
+                    if posting[0] == doc:
+                        query_term_position_list.append(posting[1])
+            except KeyError:
+                pass
+        sets = [set(x - i for x in sublist) for i, sublist in enumerate(query_term_position_list)]
+        if set.intersection(*sets):
+            result.append(doc)
+    return sorted(result)
+
+
+def timed(function, terms):
+    postings_index = open_index(manifest_file)
+    start_time = time.perf_counter()
+    result = function(terms, postings_index)
+    elapsed = time.perf_counter() - start_time
+    postings_index.close()
+    return elapsed, result
+
+
+def main():
+    queries = sys.argv[1:] or QUERIES
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+
+    print(f"{'query':<32}{'rarest df':>10}{'commonest df':>14}{'matches':>9}{'before (ms)':>13}{'after (ms)':>12}")
+    for query in queries:
+        terms = analyze(query)
+        doc_freqs = [postings_index.document_frequency(term) for term in terms]
+        if not terms or min(doc_freqs) == 0:
+            print(f"{query:<32} (a term is not in the index)")
+            continue
+        before, expected = timed(legacy_docs_list_for_pq, terms)
+        after, docs = timed(phrase_docs, terms)
+        assert docs == expected, f"phrase matches of {query!r} differ"
+        print(f"{query:<32}{min(doc_freqs):>10}{max(doc_freqs):>14}{len(docs):>9}{before * 1000:>13.2f}{after * 1000:>12.2f}")
+    postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
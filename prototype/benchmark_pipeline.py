@@ -0,0 +1,125 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+import create_index
+import incremental_index
+from crawler import crawl, save_content
+from pipeline import StreamingIndexer
+from article_log import ArticleLogWriter, ARTICLE_LOG_FOLDER
+from segments import open_index
+from benchmark_crawler import StandInHandler, FEED_COUNT, STAND_IN_SITE
+
+'''
+Freshness (time from an article being scraped to it being searchable) and disk usage of the
+streaming pipeline against crawling to source_files and running an incremental update after.
+
+Both crawl the local stand-in site of benchmark_crawler.py on top of the same small base index,
+in a temporary folder.
+
+before: crawler.crawl saves one JSON file per article, then incremental_index.update_index
+after:  pipeline.StreamingIndexer as the crawler's sink, with FLUSH_DOCS articles per delta segment
+'''
+
+BASE_DOCS = 20
+FLUSH_DOCS = 20
+
+
+def folder_usage(folder, names=None):
+    ''' (number of files, bytes allocated on disk) of the files in folder '''
+    files = 0
+    allocated = 0
+    for filename in os.listdir(folder):
+        if names is not None and filename not in names:
+            continue
+        files += 1
+        allocated += os.stat(os.path.join(folder, filename)).st_blocks * 512
+    return files, allocated
+
+
+def build_base(folder):
+    ''' A base index of BASE_DOCS articles in folder '''
+    source_folder = os.path.join(folder, create_index.source_folder)
+    os.makedirs(source_folder)
+    for i in range(BASE_DOCS):
+        save_content(source_folder, f"http://example.com/base/{i}", f"Base article {i}", f"Base article number {i} about old news.")
+    create_index.main()
+
+
+def crawl_then_update(feeds):
+    saved_times = []
+
+    def save(url, title, content, published):
+        saved = save_content(create_index.source_folder, url, title, content, published)
+        saved_times.append(time.time())
+        return saved
+
+    crawl(feeds, sink=save)
+    incremental_index.update_index()
+    published = time.time()
+    return [published - saved_time for saved_time in saved_times]
+
+
+def stream(feeds):
+    log_writer = ArticleLogWriter()
+    indexer = StreamingIndexer(log_writer, flush_docs=FLUSH_DOCS)
+    try:
+        crawl(feeds, sink=indexer.put)
+    finally:
+        indexer.close()
+        log_writer.close()
+    return [published - queued for queued, published in indexer.latencies]
+
+
+def summary(name, latencies, usage):
+    latencies = sorted(latencies)
+    files, allocated = usage
+    print(f"{name:<10}{len(latencies):>10}{sum(latencies) / len(latencies):>12.2f}{latencies[-1]:>12.2f}"
+          f"{files:>8}{allocated / 1024:>14.1f}")
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    feeds = [(f"http://127.0.0.1:{server.server_port}/feed/{i}", STAND_IN_SITE) for i in range(FEED_COUNT)]
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            base_folder = os.path.join(folder, "base")
+            os.makedirs(base_folder)
+            os.chdir(base_folder)
+            build_base(base_folder)
+            base_files = set(os.listdir(create_index.source_folder))
+
+            os.chdir(folder)
+            shutil.copytree(base_folder, "before")
+            os.chdir("before")
+            before = crawl_then_update(feeds)
+            before_usage = folder_usage(create_index.source_folder, set(os.listdir(create_index.source_folder)) - base_files)
+            postings_index = open_index()
+            before_docs = postings_index.doc_count
+            postings_index.close()
+
+            os.chdir(folder)
+            shutil.copytree(base_folder, "after")
+            os.chdir("after")
+            after = stream(feeds)
+            after_usage = folder_usage(ARTICLE_LOG_FOLDER)
+            postings_index = open_index()
+            after_docs = postings_index.doc_count
+            postings_index.close()
+            assert before_docs == after_docs, "both have to index the same articles"
+
+            print(f"{after_docs - BASE_DOCS} new articles, {FEED_COUNT} feeds")
+            print(f"{'':<10}{'articles':>10}{'mean (s)':>12}{'max (s)':>12}{'files':>8}{'disk (KiB)':>14}")
+            summary("before", before, before_usage)
+            summary("after", after, after_usage)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
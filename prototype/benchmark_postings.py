@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import zstandard as zstd
+from binary_index import BinaryIndex
+from file_comp_decomp import compress_zstd
+from segments import read_manifest, manifest_file
+
+'''
+Compares the compressed binary index (index.bin, see postings_codec.py) against the old
+text format (index.txt) and the whole-file zstd compression of the text format
+(file_comp_decomp.compress_zstd), both in size on disk and in decode throughput.
+
+Run create_index.py first, the text format is regenerated from the index.bin and doc_table.json of the
+last full build (builds/<generation>, see segments.py).
+'''
+
+text_index_file = "index.txt"
+zstd_index_file = "index_compressed.zst"
+ROUNDS = 3
+
+
+def write_text_index(index, doc_table, filename):
+    ''' Writes index in the old term|docID:pos,pos;docID:pos format, with file names as docIDs '''
+    with open(filename, 'w') as file:
+        for term in index.terms():
+            postings = [f'{doc_table[doc_id]["filename"]}:{",".join(map(str, positions))}' for doc_id, positions in index[term]]
+            file.write(term + '|' + ';'.join(postings) + '\n')
+
+
+def parse_text_index(lines):
+    ''' The text index parser the query side used before index.bin '''
+    postings_index = {}
+    postings_count = 0
+    for line in lines:
+        term, postings_str = line.strip().split('|')
+        postings_list = []
+        for posting in postings_str.split(';'):
+            docID, positions_str = posting.split(':')
+            positions = [int(pos) for pos in positions_str.split(',')]
+            postings_list.append([docID, positions])
+        postings_index[term] = postings_list
+        postings_count += len(postings_list)
+    return postings_count
+
+
+def decode_text():
+    with open(text_index_file, 'r') as file:
+        return parse_text_index(file)
+
+
+def decode_zstd():
+    with open(zstd_index_file, 'rb') as file:
+        text = zstd.ZstdDecompressor().decompress(file.read()).decode()
+    return parse_text_index(text.splitlines())
+
+
+def full_build_index():
+    ''' index.bin of the last full build, also when it was split into segments '''
+    manifest = read_manifest(manifest_file)
+    if manifest is None:
+        raise SystemExit(f"{manifest_file} not found, run create_index.py first")
+    return manifest.get("full_build", manifest["segments"][0]["index"])
+
+
+def decode_binary():
+    index = BinaryIndex(full_build_index())
+    postings_count = 0
+    for term in index.terms():
+        # block at a time, the way the query side consumes postings
+        for doc_ids, _, _ in index.blocks(term):
+            postings_count += len(doc_ids)
+    index.close()
+    return postings_count
+
+
+def best_time(decoder):
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        postings_count = decoder()
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, postings_count
+
+
+def main():
+    binary_index_file = full_build_index()
+    doc_table_file = os.path.join(os.path.dirname(binary_index_file), "doc_table.json")
+    with open(doc_table_file, 'r') as file:
+        doc_table = json.load(file)
+    index = BinaryIndex(binary_index_file)
+    write_text_index(index, doc_table, text_index_file)
+    index.close()
+    compress_zstd(text_index_file, zstd_index_file)
+
+    print(f"{'format':<22}{'size (bytes)':>14}{'decode (s)':>12}{'postings/s':>14}")
+    for name, filename, decoder in [
+        ("text index.txt", text_index_file, decode_text),
+        ("zstd whole file", zstd_index_file, decode_zstd),
+        ("binary vbyte blocks", binary_index_file, decode_binary),
+    ]:
+        elapsed, postings_count = best_time(decoder)
+        size = os.path.getsize(filename)
+        print(f"{name:<22}{size:>14}{elapsed:>12.4f}{postings_count / elapsed:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import sys
+import time
+import random
+import query_index
+from segments import open_index, manifest_file
+from query_cache import QueryCache
+
+'''
+Replays a query log in which a few headline queries make up most of the traffic (query i is
+picked with probability proportional to 1 / (i + 1)) on the index of the last build, without and
+with the query result cache, and prints the total time and the hit rates of the query cache and
+of the postings cache.
+
+Usage: python3 benchmark_query_cache.py [query ...]
+'''
+
+K = 10
+LOG_LENGTH = 200
+QUERIES = [
+    "election",
+    "prime minister",
+    '"prime minister"',
+    "india world cup cricket",
+    "police said on monday",
+    "government AND market",
+    "stock market",
+    "new year",
+]
+
+
+def replay(log, postings_index, cache):
+    start_time = time.perf_counter()
+    for query in log:
+        query_index.search(query, postings_index, K, cache)
+    return time.perf_counter() - start_time
+
+
+def main():
+    queries = sys.argv[1:] or QUERIES
+    random.seed(42)
+    log = random.choices(queries, weights=[1 / (i + 1) for i in range(len(queries))], k=LOG_LENGTH)
+    query_index.VERBOSE = False
+
+    # a fresh index per run, so both start with an empty postings cache
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    uncached = replay(log, postings_index, None)
+    postings_stats = postings_index.postings_cache.stats()
+    postings_index.close()
+
+    postings_index = open_index(manifest_file)
+    cache = QueryCache()
+    cached = replay(log, postings_index, cache)
+    postings_index.close()
+
+    print(f"{len(log)} queries, {len(set(log))} distinct")
+    print(f"without query cache: {uncached * 1000:.1f} ms, postings cache hit rate {postings_stats['hit_rate']:.2f}")
+    print(f"with query cache:    {cached * 1000:.1f} ms, query cache {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
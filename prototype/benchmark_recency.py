@@ -0,0 +1,85 @@
+import sys
+import time
+import query_index
+from segments import open_index, manifest_file
+
+'''
+"Latest news" queries on the index of the last build, built with its full build split into one
+segment per period of publication (set segments.SEGMENT_PERIOD, it is off by default). A search of the whole index is compared to
+the searches of query_index.rank_by_time, which go through the segments newest first: the newest
+articles (order "date"), those of the last day and week before the newest article of the index
+(since), and the best articles with the recency boost. The table shows the time of a query and
+how many of the segments and documents it searched.
+
+The early terminating searches have to return the first k of the same search without a limit,
+which searches every segment.
+
+Usage: python3 benchmark_recency.py [k] [query ...]
+'''
+
+DEFAULT_K = 10
+ROUNDS = 3
+DAY = 24 * 3600
+QUERIES = [
+    "election",
+    "prime minister",
+    "government market",
+    "india cricket",
+    "police said on monday",
+]
+
+
+def best_time(function, *args, **kwargs):
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_K
+    query_index.VERBOSE = False
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    newest = max((dates[1] for dates in postings_index.segment_dates if dates[1] is not None), default=None)
+    if newest is None:
+        postings_index.close()
+        raise SystemExit("no article of the index has a publication date")
+
+    modes = [
+        ("all segments", {}),
+        ("newest first", {"order": "date"}),
+        ("last day", {"since": newest - DAY}),
+        ("last week", {"since": newest - 7 * DAY}),
+        ("recency boost", {"recency": True}),
+    ]
+    queries = sys.argv[2:] or QUERIES
+    print(f"{postings_index.doc_count} documents in {len(postings_index.segments)} segments, k = {k}")
+    print(f"{'query':<24}{'search':<15}{'time (ms)':>11}{'segments':>10}{'documents':>11}")
+    try:
+        for query in queries:
+            for name, options in modes:
+                elapsed, (_, _, results) = best_time(query_index.search, query, postings_index, k, **options)
+                stats = {}
+                query_index.search(query, postings_index, k, stats=stats, **options)
+                if options:
+                    _, _, unlimited = query_index.search(query, postings_index, None, **options)
+                    assert [result["doc_id"] for result in results] == [result["doc_id"] for result in unlimited[:k]], \
+                        f"{name} search of {query!r} stopped too early"
+                    searched = f"{stats['segments_searched']}/{len(postings_index.segments)}"
+                    documents = f"{stats['docs_searched'] / postings_index.doc_count:.1%}"
+                else:
+                    searched = f"{len(postings_index.segments)}/{len(postings_index.segments)}"
+                    documents = "100.0%"
+                print(f"{query:<24}{name:<15}{elapsed * 1000:>11.2f}{searched:>10}{documents:>11}")
+    finally:
+        postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import sys
+import time
+import query_index
+from segments import open_index, manifest_file
+from snippets import query_term_positions, decode_offsets, make_snippet, lead_snippet
+
+'''
+Cost of query-aware snippets (snippets.py) on the index of the last build: for the top k results
+of every query, the time of the old metadata (title, url and the first SNIPPET_LENGTH characters
+of the content) against the highlighted best-window snippet, next to the time of the query itself.
+
+Usage: python3 benchmark_snippets.py [k] [query ...]
+'''
+
+DEFAULT_K = 10
+ROUNDS = 3
+QUERIES = [
+    "election",
+    "prime minister",
+    '"prime minister"',
+    "india world cup cricket",
+    "police said on monday",
+]
+
+
+def lead_snippets(doc_ids, postings_index):
+    snippets = {}
+    for doc_id in doc_ids:
+        record = postings_index.document(doc_id)
+        snippets[doc_id] = lead_snippet(record["content"])
+    return snippets
+
+
+def query_snippets(terms, doc_ids, postings_index):
+    hits = query_term_positions(terms, doc_ids, postings_index)
+    snippets = {}
+    for doc_id in doc_ids:
+        record = postings_index.document(doc_id)
+        snippets[doc_id] = make_snippet(record["content"], decode_offsets(record["offsets"]), hits[doc_id])
+    return snippets
+
+
+def best_time(function, *args):
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_K
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    query_index.VERBOSE = False
+
+    queries = sys.argv[2:] or QUERIES
+    print(f"{postings_index.doc_count} documents, k = {k}")
+    print(f"{'query':<30}{'results':>8}{'search (ms)':>13}{'lead (ms)':>11}{'snippets (ms)':>15}{'per hit (ms)':>14}")
+    for query in queries:
+        search_time, (terms, _, results) = best_time(query_index.search, query, postings_index, k)
+        doc_ids = [result["doc_id"] for result in results]
+        lead_time, _ = best_time(lead_snippets, doc_ids, postings_index)
+        snippet_time, _ = best_time(query_snippets, terms, doc_ids, postings_index)
+        per_hit = (snippet_time - lead_time) / len(doc_ids) if doc_ids else 0
+        print(f"{query:<30}{len(doc_ids):>8}{search_time * 1000:>13.2f}{lead_time * 1000:>11.2f}"
+              f"{snippet_time * 1000:>15.2f}{per_hit * 1000:>14.3f}")
+    postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
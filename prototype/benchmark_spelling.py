@@ -0,0 +1,100 @@
+import sys
+import time
+import random
+from segments import open_index, manifest_file
+from spelling import suggestions, edit_distance, allowed_distance, MIN_DOC_FREQ, MIN_TERM_LENGTH, BUDGET
+
+'''
+Spelling suggestions for misspelled terms of the index of the last build: the terms of at least
+MIN_DOC_FREQ documents with one or two random edits (insertions, deletions, substitutions and
+swaps of neighbouring characters). The deletion dictionary of spelling.py is compared to
+computing the edit distance to every term of the vocabulary, which it has to agree with; the
+table shows the latency of both and how often the original term is the best suggestion.
+
+Usage: python3 benchmark_spelling.py [misspellings]
+'''
+
+DEFAULT_MISSPELLINGS = 300
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+SEED = 3
+
+
+def misspell(term, rng):
+    characters = list(term)
+    for _ in range(rng.randint(1, 2)):
+        edit = rng.randrange(4)
+        i = rng.randrange(len(characters))
+        if edit == 0:
+            characters.insert(i, rng.choice(LETTERS))
+        elif edit == 1 and len(characters) > MIN_TERM_LENGTH:
+            del characters[i]
+        elif edit == 2:
+            characters[i] = rng.choice(LETTERS)
+        elif i + 1 < len(characters):
+            characters[i], characters[i + 1] = characters[i + 1], characters[i]
+    return "".join(characters)
+
+
+def scan_suggestions(term, vocabulary, doc_freqs):
+    ''' suggestions() by computing the edit distance to every term '''
+    max_distance = allowed_distance(term)
+    ranked = []
+    for candidate in vocabulary:
+        distance = edit_distance(term, candidate, max_distance)
+        if distance <= max_distance:
+            ranked.append((candidate, distance, doc_freqs[candidate]))
+    ranked.sort(key=lambda suggestion: (suggestion[1], -suggestion[2], suggestion[0]))
+    return ranked
+
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MISSPELLINGS
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    try:
+        doc_freqs = {term: postings_index.document_frequency(term) for term in postings_index.terms()}
+        vocabulary = [term for term, doc_freq in doc_freqs.items() if doc_freq >= MIN_DOC_FREQ and len(term) >= MIN_TERM_LENGTH]
+        rng = random.Random(SEED)
+        misspellings = []
+        while len(misspellings) < count:
+            term = rng.choice(vocabulary)
+            misspelled = misspell(term, rng)
+            if misspelled not in doc_freqs and len(misspelled) >= MIN_TERM_LENGTH:
+                misspellings.append((misspelled, term))
+
+        scan_times = []
+        dictionary_times = []
+        found = 0
+        for misspelled, term in misspellings:
+            scan_time, expected = timed(scan_suggestions, misspelled, vocabulary, doc_freqs)
+            dictionary_time, ranked = timed(suggestions, misspelled, postings_index)
+            assert ranked == expected, f"suggestions for {misspelled!r} differ"
+            scan_times.append(scan_time)
+            dictionary_times.append(dictionary_time)
+            found += bool(ranked) and ranked[0][0] == term
+        scan_times.sort()
+        dictionary_times.sort()
+        print(f"{len(doc_freqs)} terms, {len(vocabulary)} suggested, {count} misspellings, "
+              f"original term suggested first for {found / count:.0%}")
+        print(f"{'':<22}{'p50 (ms)':>10}{'p95 (ms)':>10}{'max (ms)':>10}")
+        for name, times in (("vocabulary scan", scan_times), ("deletion dictionary", dictionary_times)):
+            print(f"{name:<22}{percentile(times, 0.5) * 1000:>10.2f}{percentile(times, 0.95) * 1000:>10.2f}"
+                  f"{times[-1] * 1000:>10.2f}")
+        print(f"budget per query: {BUDGET * 1000:.0f} ms")
+    finally:
+        postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import sys
+import time
+from analyzer import analyze
+from segments import open_index, manifest_file
+from topk import wand_top_k
+from scoring import SCORERS, get_scorer
+
+'''
+Compares top-k retrieval with WAND pruning (topk.py) against exhaustive scoring of every
+matching document, on the index of the last build, with every scorer of scoring.py. For every
+query the top k of both have to be identical; the table shows the time of both and how many
+postings WAND decoded and how many postings blocks it skipped.
+
+Usage: python3 benchmark_topk.py [k] [query ...]
+'''
+
+DEFAULT_K = 10
+ROUNDS = 3
+QUERIES = [
+    "election",
+    "prime minister",
+    "government market",
+    "india world cup cricket",
+    "the new year",
+    "police said on monday",
+]
+
+
+def exhaustive_top_k(terms, postings_index, k, scorer):
+    ''' The TAAT scoring of query_index.rank_documents without the threshold, cut to the top k '''
+    document_scores = {}
+    for term in terms:
+        IDF = scorer.idf(term)
+        if IDF is None:
+            continue
+        for doc_ids, term_freqs, _ in postings_index.blocks(term, with_positions=False):
+            for doc, term_freq in zip(doc_ids, term_freqs):
+                document_scores[doc] = document_scores.get(doc, 0) + scorer.weight(term_freq, doc, IDF)
+    return sorted(document_scores.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+
+def best_time(function, *args):
+    best = None
+    for _ in range(ROUNDS):
+        start_time = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_K
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+
+    queries = sys.argv[2:] or QUERIES
+    print(f"{postings_index.doc_count} documents, k = {k}")
+    print(f"{'scorer':<8}{'query':<26}{'exhaustive (ms)':>16}{'wand (ms)':>11}{'postings':>10}{'decoded':>9}{'skipped blocks':>16}")
+    for name in SCORERS:
+        scorer = get_scorer(postings_index, name)
+        for query in queries:
+            terms = analyze(query)
+            exhaustive, expected = best_time(exhaustive_top_k, terms, postings_index, k, scorer)
+            wand, top_k = best_time(wand_top_k, terms, postings_index, k, None, scorer)
+            assert top_k == expected, f"{name} top {k} of {query!r} differs from exhaustive scoring"
+            stats = {}
+            wand_top_k(terms, postings_index, k, stats, scorer)
+            print(f"{name:<8}{query:<26}{exhaustive * 1000:>16.2f}{wand * 1000:>11.2f}"
+                  f"{stats.get('postings', 0):>10}{stats.get('decoded', 0):>9}{stats.get('skipped_blocks', 0):>16}")
+    postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import sys
+import math
+import time
+import random
+from segments import open_index, manifest_file
+from vector_space import VectorSpace
+
+'''
+Scores a batch of generated queries against the index of the last build two ways: one query
+after the other in pure Python, term-at-a-time over the postings like query_index.rank_documents,
+and all queries at once with the sparse matrix of vector_space.py. Both compute the same cosine
+similarity, so the top k of every query have to be the same.
+
+Usage: python3 benchmark_vector_space.py [queries] [k]
+'''
+
+DEFAULT_QUERIES = 1000
+DEFAULT_K = 10
+MAX_QUERY_TERMS = 3
+SEED = 11
+
+
+def python_norms(postings_index, idf):
+    ''' ||d|| of the tf * idf vector of every live document '''
+    sums = dict.fromkeys(postings_index.doc_table, 0.0)
+    for term, term_idf in idf.items():
+        for doc_ids, tfs, _ in postings_index.blocks(term, with_positions=False):
+            for doc, tf in zip(doc_ids, tfs):
+                sums[doc] += (tf * term_idf) ** 2
+    return {doc: math.sqrt(total) for doc, total in sums.items()}
+
+
+def python_top_k(terms, postings_index, idf, norms, k):
+    counts = {}
+    for term in terms:
+        if term in idf:
+            counts[term] = counts.get(term, 0) + 1
+    query_norm = math.sqrt(sum((count * idf[term]) ** 2 for term, count in counts.items()))
+    document_scores = {}
+    for term, count in counts.items():
+        query_weight = count * idf[term] / query_norm
+        for doc_ids, tfs, _ in postings_index.blocks(term, with_positions=False):
+            for doc, tf in zip(doc_ids, tfs):
+                document_scores[doc] = document_scores.get(doc, 0) + tf * idf[term] / norms[doc] * query_weight
+    return sorted(document_scores.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+
+def same_ranking(expected, actual):
+    '''
+    Same scores up to rounding, and the same documents above the last score (the float sums
+    differ in the last bits, so the order of documents tied at the cut may differ)
+    '''
+    if len(expected) != len(actual):
+        return False
+    if not all(math.isclose(a, b, rel_tol=1e-9) for (_, a), (_, b) in zip(expected, actual)):
+        return False
+    if not expected:
+        return True
+    cut = expected[-1][1] * (1 + 1e-9)
+    return {doc for doc, score in expected if score > cut} == {doc for doc, score in actual if score > cut}
+
+
+def main():
+    query_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_QUERIES
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_K
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    try:
+        rng = random.Random(SEED)
+        vocabulary = list(postings_index.terms())
+        queries = [rng.sample(vocabulary, rng.randint(1, MAX_QUERY_TERMS)) for _ in range(query_count)]
+
+        start_time = time.perf_counter()
+        idf = {term: postings_index.idf(term) for term in vocabulary}
+        idf = {term: term_idf for term, term_idf in idf.items() if term_idf is not None}
+        norms = python_norms(postings_index, idf)
+        python_setup = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        expected = [python_top_k(terms, postings_index, idf, norms, k) for terms in queries]
+        python_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        vector_space = VectorSpace(postings_index)
+        matrix_setup = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        results = vector_space.top_k(queries, k)
+        matrix_time = time.perf_counter() - start_time
+
+        for terms, top_k, python_result in zip(queries, results, expected):
+            assert same_ranking(python_result, top_k), f"top {k} of {terms} differs"
+
+        print(f"{postings_index.doc_count} documents, {len(vocabulary)} terms, {query_count} queries, k = {k}")
+        print(f"{'':<16}{'setup (s)':>11}{'queries (s)':>13}{'per query (ms)':>16}")
+        print(f"{'python':<16}{python_setup:>11.2f}{python_time:>13.3f}{python_time / query_count * 1000:>16.3f}")
+        print(f"{'sparse matrix':<16}{matrix_setup:>11.2f}{matrix_time:>13.3f}{matrix_time / query_count * 1000:>16.3f}")
+    finally:
+        postings_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import math
+import mmap
+import struct
+from postings_codec import encode_postings, decode_postings, iter_blocks
+from postings_cursor import PostingsCursor
+from lexicon import Lexicon, encode_lexicon
+from spelling import SpellingDictionary, encode_spelling
+from query_cache import LRUCache, POSTINGS_CACHE_SIZE
+
+'''
+Binary on-disk layout of the postings index (index.bin).
+
+The text index.txt has to be parsed from top to bottom before a single term can be
+looked up, so the query side pays for the whole index on every run. The binary layout
+below is opened with mmap instead, and only the postings of the terms that are
+actually looked up are ever decoded.
+
++--------------------------------------------------------------+
+| header: magic, version, term count, doc count,               |
+|         dictionary offset, spelling offset                   |
++--------------------------------------------------------------+
+| postings records, one per term, in sorted term order,        |
+| compressed as described in postings_codec.py                 |
++--------------------------------------------------------------+
+| offsets table, one fixed size entry per term number:         |
+|   postings offset, postings length, document frequency,      |
+|   max term frequency, min document length, max term weight   |
++--------------------------------------------------------------+
+| lexicon: the sorted terms, front-coded (see lexicon.py)      |
++--------------------------------------------------------------+
+| optional: deletion dictionary for spelling correction        |
+| (see spelling.py), spelling offset 0 without it              |
++--------------------------------------------------------------+
+
+The term dictionary is written last, so that the writer can stream the postings of
+one term at a time without knowing the final size of the postings region upfront.
+A lookup finds the number of the term in the lexicon, a binary search over the mmapped
+blocks, i.e. O(log V) without ever materializing the vocabulary in memory, and reads the
+entry of that number from the offsets table. Since the terms are sorted, all terms with a
+given prefix (elect* queries, autocomplete) or within a range are a run of consecutive
+term numbers, found with two lookups.
+
+Doc IDs are the dense integers assigned by the indexer, doc_table.json maps them back
+to the source file names.
+
+The max term weight of a term is the largest tf / ||D|| (the normalized term frequency used
+in ranking) over its postings. Times the IDF it is an upper bound of what the term can add to
+the TF-IDF score of any document, which is what dynamic pruning (topk.py) needs. BM25 grows
+with the term frequency and shrinks with the document length, so the max term frequency
+together with the length of the shortest document containing the term bound its BM25 score,
+whatever the average document length of the collection is (see scoring.py).
+'''
+
+MAGIC = b'IHIX'
+FORMAT_VERSION = 6
+
+# magic, version, term count, doc count, dictionary offset, spelling offset
+HEADER = struct.Struct('<4sHxxIIQQ')
+# postings offset, postings length, document frequency, max term frequency, min document length,
+# max term weight
+DICT_ENTRY = struct.Struct('<QIIIId')
+# entry numbers of the terms looked up recently, per index file: a query looks a term up several
+# times (document frequency, bounds, cursor, blocks), in every segment of a segmented index
+TERM_CACHE_SIZE = 4096
+
+
+class BinaryIndexWriter:
+    '''
+    Writes an index to filename one term at a time: add(term, postings_list) for every term in
+    ascending term order, every postings_list sorted by doc ID, then close(). Only the dictionary
+    entries are kept in memory, so several writers can be filled side by side (segments.py splits
+    a full build into one index per period in a single pass over it). As a context manager it
+    is closed on leaving the block, and left unfinished if the block raised.
+    See write_binary_index for doc_count, doc_norms, doc_lengths and spelling.
+    '''
+
+    def __init__(self, filename, doc_count, doc_norms=None, doc_lengths=None, spelling=False):
+        self.doc_count = doc_count
+        self.doc_norms = doc_norms
+        self.doc_lengths = doc_lengths
+        self.spelling = spelling
+        self.dict_entries = []
+        self.terms = []
+        self._previous_term = None
+        self._file = open(filename, 'wb')
+        # placeholder header, rewritten once the dictionary offset is known
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0, 0))
+        self._offset = HEADER.size
+
+    def add(self, term, postings_list):
+        if self._previous_term is not None and term <= self._previous_term:
+            raise ValueError(f"terms must be written in ascending order, got {term!r} after {self._previous_term!r}")
+        self._previous_term = term
+        block = encode_postings(postings_list)
+        self._file.write(block)
+        max_tf = max(len(positions) for _, positions in postings_list)
+        if self.doc_norms is None:
+            max_weight = math.inf
+        else:
+            max_weight = max(len(positions) / self.doc_norms[doc_id] for doc_id, positions in postings_list)
+        min_length = 0 if self.doc_lengths is None else min(self.doc_lengths[doc_id] for doc_id, _ in postings_list)
+        self.dict_entries.append((self._offset, len(block), len(postings_list), max_tf, min_length, max_weight))
+        self.terms.append(term.encode('utf-8'))
+        self._offset += len(block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def close(self):
+        ''' Writes the dictionary (and the deletion dictionary) behind the postings, and the header '''
+        try:
+            dict_offset = self._offset
+            for entry in self.dict_entries:
+                self._file.write(DICT_ENTRY.pack(*entry))
+            lexicon = encode_lexicon(self.terms)
+            self._file.write(lexicon)
+            spelling_offset = 0
+            if self.spelling:
+                spelling_offset = dict_offset + len(self.dict_entries) * DICT_ENTRY.size + len(lexicon)
+                self._file.write(encode_spelling([term.decode('utf-8') for term in self.terms],
+                                                 [entry[2] for entry in self.dict_entries]))
+
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(self.dict_entries), self.doc_count, dict_offset, spelling_offset))
+        finally:
+            self._file.close()
+
+
+def write_binary_index(sorted_postings, doc_count, filename, doc_norms=None, doc_lengths=None, spelling=False):
+    '''
+    Writes the index to filename. sorted_postings is an iterable of (term, postings_list)
+    tuples in ascending term order, every postings_list sorted by doc ID; it is consumed
+    exactly once, so it can be a generator that produces the postings of one term at a time.
+    doc_count is the number of documents in the collection.
+    doc_norms maps doc ID -> vector magnitude (a list or a dict) and is used for the max term
+    weights. Without it (partial indexes that are only merged, never queried) the max term
+    weights are infinite, which is a valid if useless upper bound.
+    doc_lengths maps doc ID -> number of terms the same way, for the min document lengths
+    (0 without it).
+    spelling adds the deletion dictionary of spelling correction, which only indexes that are
+    queried need.
+    '''
+    with BinaryIndexWriter(filename, doc_count, doc_norms, doc_lengths, spelling) as writer:
+        for term, postings_list in sorted_postings:
+            writer.add(term, postings_list)
+
+
+class BinaryIndex:
+    '''
+    Read-only, mmap backed view of an index.bin file. It behaves like the old in-memory
+    postings_index dict for lookups (term in index, index[term], index.get(term)),
+    but a term's postings are decoded only when that term is requested.
+    index[term] returns [[doc_id, [pos, ...]], ...] with integer doc IDs.
+    '''
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.term_count, self.doc_count, dict_offset, spelling_offset = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a binary index file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{filename} has index format version {version}, expected {FORMAT_VERSION}")
+        self._dict_offset = dict_offset
+        self._lexicon = Lexicon(self._buffer, dict_offset + self.term_count * DICT_ENTRY.size, self.term_count)
+        self._spelling = SpellingDictionary(self._buffer, spelling_offset) if spelling_offset else None
+        # decoded postings of the terms looked up recently
+        self._decoded = LRUCache(POSTINGS_CACHE_SIZE)
+        self._numbers = LRUCache(TERM_CACHE_SIZE)
+
+    def _entry(self, i):
+        return DICT_ENTRY.unpack_from(self._buffer, self._dict_offset + i * DICT_ENTRY.size)
+
+    def _find(self, term):
+        ''' Binary search over the lexicon, returns the entry index or -1 '''
+        i = self._numbers.get(term)
+        if i is None:
+            i = self._lexicon.find(term.encode('utf-8'))
+            self._numbers.put(term, i)
+        return i
+
+    def __contains__(self, term):
+        return self._find(term) != -1
+
+    def __getitem__(self, term):
+        postings_list = self._decoded.get(term)
+        if postings_list is not None:
+            return postings_list
+        i = self._find(term)
+        if i == -1:
+            raise KeyError(term)
+        postings_offset, _, doc_freq = self._entry(i)[:3]
+        postings_list = decode_postings(self._buffer, postings_offset, doc_freq)
+        self._decoded.put(term, postings_list, len(postings_list))
+        return postings_list
+
+    def term_info(self, term):
+        '''
+        Returns (postings offset, document frequency, max term frequency, max term weight,
+        min document length) of term without decoding its postings, or None for unknown terms.
+        '''
+        i = self._find(term)
+        if i == -1:
+            return None
+        postings_offset, _, doc_freq, max_tf, min_length, max_weight = self._entry(i)
+        return postings_offset, doc_freq, max_tf, max_weight, min_length
+
+    def cursor(self, term):
+        ''' A PostingsCursor over the postings of term, see postings_cursor.py '''
+        info = self.term_info(term)
+        parts = [(self._buffer, info[0], info[1])] if info else []
+        return PostingsCursor(parts)
+
+    def document_frequency(self, term):
+        ''' Number of documents containing term, read from the dictionary without decoding postings '''
+        i = self._find(term)
+        if i == -1:
+            return 0
+        return self._entry(i)[2]
+
+    def blocks(self, term, with_positions=True):
+        '''
+        Yields (doc_ids, term_frequencies, positions) one postings block at a time,
+        see postings_codec.decode_block. Yields nothing for unknown terms.
+        '''
+        i = self._find(term)
+        if i == -1:
+            return
+        postings_offset, _, doc_freq = self._entry(i)[:3]
+        yield from iter_blocks(self._buffer, postings_offset, doc_freq, with_positions)
+
+    def spelling_candidates(self, term, max_distance, deadline=None):
+        '''
+        The terms sharing a delete with term in the deletion dictionary (see spelling.py), the
+        candidates of its spelling corrections. Empty if the index has no deletion dictionary.
+        '''
+        if self._spelling is None:
+            return []
+        numbers = self._spelling.candidates(term, max_distance, deadline)
+        return [self._lexicon.term_at(number).decode('utf-8') for number in sorted(numbers)]
+
+    def get(self, term, default=None):
+        try:
+            return self[term]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.term_count
+
+    def terms(self):
+        ''' Iterates over all terms in ascending order '''
+        for _, term in self._lexicon.iter_terms():
+            yield term.decode('utf-8')
+
+    def terms_between(self, low=None, high=None):
+        ''' Iterates over the terms low <= term < high in ascending order, None leaves a side open '''
+        start = 0 if low is None else self._lexicon.lower_bound(low.encode('utf-8'))
+        end = None if high is None else self._lexicon.lower_bound(high.encode('utf-8'))
+        for _, term in self._lexicon.iter_terms(start, end):
+            yield term.decode('utf-8')
+
+    def prefix_terms(self, prefix):
+        ''' Iterates over the terms starting with prefix in ascending order '''
+        key = prefix.encode('utf-8')
+        # no utf-8 sequence contains the byte 0xFF, so every term starting with prefix sorts before this
+        end = self._lexicon.lower_bound(key + b'\xff')
+        for _, term in self._lexicon.iter_terms(self._lexicon.lower_bound(key), end):
+            yield term.decode('utf-8')
+
+    def items(self):
+        '''
+        Iterates over (term, postings_list) in ascending term order. Unlike index[term] the
+        decoded postings are not kept around, so a full scan (e.g. when merging partial
+        indexes) only ever holds the postings of one term in memory.
+        '''
+        for i, term in self._lexicon.iter_terms():
+            postings_offset, _, doc_freq = self._entry(i)[:3]
+            yield term.decode('utf-8'), decode_postings(self._buffer, postings_offset, doc_freq)
+
+    def close(self):
+        self._decoded.clear()
+        self._numbers.clear()
+        self._buffer.close()
+        self._file.close()
+
+
+def open_binary_index(filename):
+    try:
+        return BinaryIndex(filename)
+    except (IOError, ValueError) as e:
+        print(f"Error opening index file: {e}")
+        return None
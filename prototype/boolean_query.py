@@ -0,0 +1,293 @@
+import re
+from analyzer import analyze
+from postings_cursor import END, SKIP_RATIO
+from phrase import parse_phrase_query, phrase_docs
+
+'''
+Boolean queries.
+
+    india AND (cricket OR hockey) NOT pakistan
+    "prime minister" modi
+
+Operators are upper case AND, OR and NOT plus parentheses, NOT binds tighter than AND, which
+binds tighter than OR. Words next to each other without an operator are combined with the
+default operator (query_index.DEFAULT_OPERATOR). Quoted phrases (and "..."~N) are matched by
+phrase.py. Lower case and, or, not are ordinary words (stop words, in fact). The parser is
+lenient: a dangling operator or an unbalanced parenthesis is dropped rather than failing the query.
+
+Every word goes through analyzer.analyze like the indexed text; stop words vanish from the query,
+and a word that analyzes to several terms (e.g. covid-19) has to match as a phrase.
+
+A word ending in * (elect*) is a wildcard: it is lowercased but not stemmed, and matches any
+of the index terms it is a prefix of, the most frequent MAX_WILDCARD_TERMS of them (an OR of
+their terms). The parser gets the expansion from the index through expand_prefix.
+
+With correct_term (spelling.SpellingCorrector.correct) a word that is not in the index matches
+its spelling corrections instead (an OR of them), in a phrase the best one.
+
+A parsed query is a tree of tuples:
+    ("TERM", term)  ("PHRASE", terms, slop)  ("AND", [nodes])  ("OR", [nodes])  ("NOT", node)
+
+Evaluation returns the sorted doc IDs of the matching documents. An AND evaluates its cheapest
+operand first (estimated from document frequencies without decoding anything), stops as soon as
+the intermediate result is empty, and narrows it with the remaining operands in order of cost.
+Plain terms with many more postings than there are candidates narrow it with a PostingsCursor
+that skips to the remaining candidates, so a common term in a conjunction with a rare one costs
+about one block per candidate instead of its whole postings list.
+'''
+
+OPERATORS = ("AND", "OR", "NOT")
+WILDCARD = "*"
+MAX_WILDCARD_TERMS = 50
+QUERY_TOKEN = re.compile(r'"[^"]*"(?:~\d+)?|\(|\)|[^\s()"]+')
+
+
+def tokenize_query(query):
+    return QUERY_TOKEN.findall(query)
+
+
+def is_wildcard(token):
+    return len(token) > 1 and token.endswith(WILDCARD) and not token.startswith('"')
+
+
+def has_wildcard(query):
+    return any(is_wildcard(token) for token in tokenize_query(query))
+
+
+def is_boolean_query(query):
+    ''' True if query uses operators or parentheses, or mixes phrases with other words '''
+    tokens = tokenize_query(query)
+    return any(token in OPERATORS or token in ("(", ")") for token in tokens) or \
+        (len(tokens) > 1 and any(token.startswith('"') for token in tokens))
+
+
+class QueryParser:
+    '''
+    Recursive descent parser of
+
+        or_expr   := and_expr (OR and_expr)*
+        and_expr  := unary (AND unary)*
+        unary     := NOT unary | primary
+        primary   := ( or_expr ) | "phrase" | word* | word
+
+    where operands without an operator in between are joined by the default operator.
+    Returns None for a query without any (non stop word) terms.
+    expand_prefix(prefix) returns the index terms a wildcard matches; without it a wildcard
+    is an ordinary word. correct_term(term) returns the terms to match instead of term.
+    '''
+
+    def __init__(self, query, default_operator="AND", expand_prefix=None, correct_term=None):
+        self.tokens = tokenize_query(query)
+        self.i = 0
+        self.default_operator = default_operator
+        self.expand_prefix = expand_prefix
+        self.correct_term = correct_term
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def starts_operand(self, token):
+        return token is not None and token not in ("AND", "OR", ")")
+
+    def parse(self):
+        node = self.or_expr()
+        while self.peek() is not None:
+            # a stray ")" or operator, skip it and keep what follows
+            self.i += 1
+            node = combine("OR" if self.default_operator == "OR" else "AND", [node, self.or_expr()])
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while True:
+            token = self.peek()
+            if token == "OR":
+                self.i += 1
+            elif not (self.default_operator == "OR" and self.starts_operand(token)):
+                break
+            children.append(self.and_expr())
+        return combine("OR", children)
+
+    def and_expr(self):
+        children = [self.unary()]
+        while True:
+            token = self.peek()
+            if token == "AND":
+                self.i += 1
+            elif not (self.default_operator == "AND" and self.starts_operand(token)):
+                break
+            children.append(self.unary())
+        return combine("AND", children)
+
+    def unary(self):
+        if self.peek() == "NOT":
+            self.i += 1
+            child = self.unary()
+            return ("NOT", child) if child is not None else None
+        return self.primary()
+
+    def primary(self):
+        token = self.peek()
+        if not self.starts_operand(token):
+            return None
+        self.i += 1
+        if token == "(":
+            node = self.or_expr()
+            if self.peek() == ")":
+                self.i += 1
+            return node
+        phrase = parse_phrase_query(token)
+        if phrase is not None:
+            text, slop = phrase
+            return leaf(self.corrected(analyze(text)), slop)
+        if self.expand_prefix is not None and is_wildcard(token):
+            prefix = token[:-len(WILDCARD)].lower()
+            # a prefix no term starts with stays a term that matches nothing, so that AND still fails
+            return combine("OR", [("TERM", term) for term in self.expand_prefix(prefix)]) or ("TERM", prefix)
+        terms = analyze(token)
+        if self.correct_term is not None and len(terms) == 1:
+            return combine("OR", [("TERM", term) for term in self.correct_term(terms[0])])
+        return leaf(self.corrected(terms))
+
+    def corrected(self, terms):
+        ''' terms with every term replaced by its best correction, for phrases '''
+        if self.correct_term is None:
+            return terms
+        return [self.correct_term(term)[0] for term in terms]
+
+
+def leaf(terms, slop=0):
+    if not terms:
+        return None
+    if len(terms) == 1:
+        return ("TERM", terms[0])
+    return ("PHRASE", terms, slop)
+
+
+def combine(operator, children):
+    ''' Drops empty operands, flattens nested operators of the same kind '''
+    flat = []
+    for child in children:
+        if child is None:
+            continue
+        if child[0] == operator:
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+    if not flat:
+        return None
+    if len(flat) == 1:
+        return flat[0]
+    return (operator, flat)
+
+
+def parse_query(query, default_operator="AND", expand_prefix=None, correct_term=None):
+    return QueryParser(query, default_operator, expand_prefix, correct_term).parse()
+
+
+def wildcard_expander(postings_index):
+    ''' expand_prefix for the parser: the MAX_WILDCARD_TERMS most frequent terms with the prefix '''
+    return lambda prefix: [term for term, _ in postings_index.autocomplete(prefix, MAX_WILDCARD_TERMS)]
+
+
+def positive_terms(node):
+    ''' Terms of the query that are not negated, in query order; these are the ones ranking uses '''
+    if node is None or node[0] == "NOT":
+        return []
+    if node[0] == "TERM":
+        return [node[1]]
+    if node[0] == "PHRASE":
+        return list(node[1])
+    return [term for child in node[1] for term in positive_terms(child)]
+
+
+def estimated_cost(node, postings_index):
+    ''' Upper bound of the number of matching documents, from the term dictionaries only '''
+    kind = node[0]
+    if kind == "TERM":
+        return postings_index.document_frequency(node[1])
+    if kind == "PHRASE":
+        return min(postings_index.document_frequency(term) for term in node[1])
+    if kind == "NOT":
+        return postings_index.doc_count
+    costs = [estimated_cost(child, postings_index) for child in node[1]]
+    return min(costs) if kind == "AND" else sum(costs)
+
+
+def all_docs(postings_index):
+    return sorted(postings_index.doc_table)
+
+
+def term_docs(term, postings_index):
+    docs = []
+    for doc_ids, _, _ in postings_index.blocks(term, with_positions=False):
+        docs.extend(doc_ids)
+    return docs
+
+
+def narrow(docs, term, postings_index, keep=True):
+    '''
+    The docs (sorted) that contain term (keep) or do not contain it (not keep). The term's
+    cursor jumps from candidate to candidate, so only blocks that can hold a candidate are decoded.
+    '''
+    cursor = postings_index.cursor(term)
+    result = []
+    for doc in docs:
+        cursor.next_geq(doc)
+        if cursor.doc == END and keep:
+            break
+        if (cursor.doc == doc) == keep:
+            result.append(doc)
+    return result
+
+
+def intersect(docs, other_docs):
+    ''' The docs (sorted) that are also in other_docs '''
+    other_docs = set(other_docs)
+    return [doc for doc in docs if doc in other_docs]
+
+
+def evaluate(node, postings_index):
+    ''' Sorted doc IDs of the live documents matching the parsed query node '''
+    if node is None:
+        return []
+    kind = node[0]
+    if kind == "TERM":
+        return term_docs(node[1], postings_index)
+    if kind == "PHRASE":
+        return phrase_docs(node[1], postings_index, node[2])
+    if kind == "NOT":
+        # only reached for a query (or parenthesized group) that is nothing but a negation
+        excluded = set(evaluate(node[1], postings_index))
+        return [doc for doc in all_docs(postings_index) if doc not in excluded]
+    if kind == "OR":
+        docs = set()
+        for child in node[1]:
+            docs.update(evaluate(child, postings_index))
+        return sorted(docs)
+    return evaluate_and(node[1], postings_index)
+
+
+def evaluate_and(children, postings_index):
+    positives = [child for child in children if child[0] != "NOT"]
+    negatives = [child[1] for child in children if child[0] == "NOT"]
+    positives.sort(key=lambda child: estimated_cost(child, postings_index))
+    negatives.sort(key=lambda child: estimated_cost(child, postings_index))
+
+    docs = evaluate(positives[0], postings_index) if positives else all_docs(postings_index)
+    for child in positives[1:]:
+        if not docs:
+            return docs
+        if child[0] == "TERM" and len(docs) * SKIP_RATIO < postings_index.document_frequency(child[1]):
+            docs = narrow(docs, child[1], postings_index)
+        else:
+            docs = intersect(docs, evaluate(child, postings_index))
+    for child in negatives:
+        if not docs:
+            return docs
+        if child[0] == "TERM" and len(docs) * SKIP_RATIO < postings_index.document_frequency(child[1]):
+            docs = narrow(docs, child[1], postings_index, keep=False)
+        else:
+            excluded = set(evaluate(child, postings_index))
+            docs = [doc for doc in docs if doc not in excluded]
+    return docs
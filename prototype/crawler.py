@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import threading
+import concurrent.futures
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from extraction import extract_batch, load_sites, site_feeds, NO_CONTENT
+from recency import parse_date, format_date
+
+'''
+RSS crawler of the sites in sites.json (feed URLs and how to find the title and content in
+their article pages, see extraction.py).
+
+1. All feeds of all sites are fetched concurrently by a bounded thread pool. Every request sends
+   the ETag / Last-Modified the feed answered with last time (If-None-Match / If-Modified-Since),
+   so a feed that did not change answers 304 with an empty body and is skipped.
+2. The article URLs of the changed feeds are deduplicated, against each other (the same story is
+   in several feeds) and against the articles already crawled, and only the new ones are fetched,
+   again concurrently. The pages fetched meanwhile are parsed in batches of up to PARSE_BATCH by
+   a process pool (by the thread pool on a single core), so parsing neither holds up the fetching
+   nor is serialized by the GIL.
+3. The articles are saved to source_folder as JSON files, ready for incremental_index.py, or
+   handed to a sink as they arrive (pipeline.py indexes them right away). Every article keeps the
+   pubDate of its feed item (ISO 8601, "published"), the time of the crawl if the item has none;
+   the index orders and segments the articles by it (see recency.py).
+
+Every worker thread has its own requests.Session, so connections are pooled and kept alive per
+host instead of a new TCP (and TLS) handshake per request, and every request has a timeout.
+
+Feed validators and the crawled article URLs are kept in crawl_state.json. Without it (first
+crawl) the URLs of the files in source_folder count as crawled.
+
+Usage: python3 crawler.py [site ...]   (sites of sites.json, all of them by default)
+'''
+
+SOURCE_FOLDER = "source_files"
+STATE_FILE = "crawl_state.json"
+CRAWL_THREADS = 8
+PARSE_PROCESSES = os.cpu_count() or 1
+# most pages parsed by one task of the process pool
+PARSE_BATCH = 16
+# seconds to connect, seconds between two bytes of the response
+TIMEOUT = (5, 15)
+RETRIES = 2
+USER_AGENT = "search-engine-prototype-crawler/1.0"
+
+_local = threading.local()
+
+
+def session():
+    ''' The requests.Session of the calling thread '''
+    if getattr(_local, "session", None) is None:
+        new_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=CRAWL_THREADS, pool_maxsize=CRAWL_THREADS, max_retries=RETRIES)
+        new_session.mount("http://", adapter)
+        new_session.mount("https://", adapter)
+        new_session.headers["User-Agent"] = USER_AGENT
+        _local.session = new_session
+    return _local.session
+
+
+def read_state(filename, source_folder):
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"feeds": {}, "urls": sorted(stored_urls(source_folder))}
+
+
+def write_state(state, filename):
+    ''' Writes to a temporary file and renames it, an interrupted crawl never leaves half a state behind '''
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'w') as file:
+        json.dump(state, file)
+    os.replace(temp_filename, filename)
+
+
+def stored_urls(source_folder):
+    ''' URLs of the articles saved in source_folder '''
+    urls = set()
+    if not os.path.isdir(source_folder):
+        return urls
+    for filename in os.listdir(source_folder):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(source_folder, filename), 'r', encoding='utf-8') as file:
+                url = json.load(file).get("url")
+        except (OSError, ValueError):
+            continue
+        if url:
+            urls.add(url)
+    return urls
+
+
+def item_date(item):
+    ''' Publication date of an RSS item (pubDate, or dc:date) in ISO 8601, None without one '''
+    for name in ('pubDate', 'date'):
+        element = item.find(name)
+        if element is not None:
+            timestamp = parse_date(element.text)
+            if timestamp is not None:
+                return format_date(timestamp)
+    return None
+
+
+def parse_feed(content):
+    ''' (article URL, publication date or None) of the items of an RSS feed '''
+    soup = BeautifulSoup(content, 'xml')
+    items = soup.find_all('item')
+    return [(item.find('link').text.strip(), item_date(item)) for item in items if item.find('link')]
+
+
+def fetch_feed(url, validators):
+    '''
+    Conditional GET of a feed. Returns ((article URL, publication date) pairs, new validators),
+    or (None, validators) if the feed did not change since validators were recorded.
+    '''
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = session().get(url, headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304:
+        return None, validators
+    response.raise_for_status()
+    new_validators = {}
+    if response.headers.get("ETag"):
+        new_validators["etag"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        new_validators["last_modified"] = response.headers["Last-Modified"]
+    return parse_feed(response.content), new_validators
+
+
+def fetch_article(url):
+    ''' Returns the HTML of an article page '''
+    response = session().get(url, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.text
+
+
+def save_content(source_folder, url, title, content, published=None):
+    '''
+    Saves an article to a JSON file named after the title, returns the filename or None.
+    published is its publication date in ISO 8601.
+    '''
+    try:
+        # Null check for filename
+        if len(title) > 0:
+            # Sanitize the title to create a safe filename
+            safe_title = "".join(x for x in title if x.isalnum() or x in " -_")
+            filename = f"{safe_title}.json"
+            data = {
+                "url": url,
+                "title": title,
+                "content": content
+            }
+            if published:
+                data["published"] = published
+            with open(os.path.join(source_folder, filename), 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            return filename
+    except Exception as e:
+        print(f"Error saving file with title {title}: {e}")
+    return None
+
+
+def crawl(feeds, source_folder=SOURCE_FOLDER, state_file=STATE_FILE, workers=CRAWL_THREADS, sink=None,
+          parse_processes=PARSE_PROCESSES):
+    '''
+    Crawls feeds, a list of (feed URL, site config) pairs, and saves the new articles to
+    source_folder, or hands them to sink(url, title, content, published) as they arrive (pipeline.py).
+    Articles whose extraction failed (no title or no content) are not handed to sink.
+    Returns counters of what was done.
+    '''
+    os.makedirs(source_folder, exist_ok=True)
+    state = read_state(state_file, source_folder)
+    known_urls = set(state["urls"])
+    # the date of the articles whose feed item has none
+    crawl_date = format_date(time.time())
+    stats = {"feeds": len(feeds), "feeds_unchanged": 0, "articles_fetched": 0, "articles_saved": 0,
+             "duplicates": 0, "errors": 0}
+
+    parse_pool = None
+    if parse_processes > 1:
+        parse_pool = concurrent.futures.ProcessPoolExecutor(max_workers=parse_processes)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            feed_futures = {
+                executor.submit(fetch_feed, feed_url, state["feeds"].get(feed_url, {})): (feed_url, site)
+                for feed_url, site in feeds
+            }
+            # article URL -> (config of the site it came from, publication date), in feed order
+            new_articles = {}
+            for future in concurrent.futures.as_completed(feed_futures):
+                feed_url, site = feed_futures[future]
+                try:
+                    article_urls, validators = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    print(f"Error fetching feed {feed_url}: {e}")
+                    stats["errors"] += 1
+                    continue
+                state["feeds"][feed_url] = validators
+                if article_urls is None:
+                    stats["feeds_unchanged"] += 1
+                    continue
+                for url, published in article_urls:
+                    if not url:
+                        continue
+                    if url in known_urls or url in new_articles:
+                        stats["duplicates"] += 1
+                    else:
+                        new_articles[url] = (site, published or crawl_date)
+
+            # future -> (URL, site config, publication date) of a page being fetched
+            fetches = {executor.submit(fetch_article, url): (url, site, published)
+                       for url, (site, published) in new_articles.items()}
+            # future -> (URL, publication date) of a batch of pages being parsed
+            parses = {}
+            pending = set(fetches)
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                pages = []
+                for future in done:
+                    if future in fetches:
+                        url, site, published = fetches.pop(future)
+                        try:
+                            page = future.result()
+                        except requests.RequestException as e:
+                            # not marked as crawled, the next crawl tries again
+                            print(f"Error fetching article {url}: {e}")
+                            stats["errors"] += 1
+                            continue
+                        stats["articles_fetched"] += 1
+                        pages.append((url, page, site, published))
+                        continue
+                    urls = parses.pop(future)
+                    try:
+                        articles = future.result()
+                    except ValueError as e:
+                        print(f"Error parsing articles {[url for url, _ in urls]}: {e}")
+                        stats["errors"] += len(urls)
+                        continue
+                    for (url, published), (title, content) in zip(urls, articles):
+                        known_urls.add(url)
+                        if sink is not None:
+                            # save_content skips untitled articles, the sink would index them as "No Content"
+                            if not title or content == NO_CONTENT:
+                                continue
+                            if sink(url, title, content, published):
+                                stats["articles_saved"] += 1
+                        elif save_content(source_folder, url, title, content, published):
+                            stats["articles_saved"] += 1
+                            print(f"Saved '{title}' to file.")
+                # the pages fetched since the last round, parsed together
+                for start in range(0, len(pages), PARSE_BATCH):
+                    batch = pages[start:start + PARSE_BATCH]
+                    future = (parse_pool or executor).submit(extract_batch, [(page, site) for _, page, site, _ in batch])
+                    parses[future] = [(url, published) for url, _, _, published in batch]
+                    pending.add(future)
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
+
+    state["urls"] = sorted(known_urls)
+    write_state(state, state_file)
+    return stats
+
+
+def main():
+    names = sys.argv[1:] or None
+    start_time = time.time()
+    stats = crawl(site_feeds(load_sites(), names))
+    end_time = time.time()
+    print(stats)
+    print(f"crawl took {end_time - start_time:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
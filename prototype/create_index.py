@@ -2,10 +2,15 @@ import os
 import json
 import math
 import time
-from porter2stemmer import Porter2Stemmer
-
-from nltk.tokenize import RegexpTokenizer
-from nltk.corpus import stopwords
+from analyzer import analyze_with_offsets, stem_cache_stats
+from binary_index import write_binary_index
+from doc_store import make_record, write_doc_store
+from snippets import encode_offsets
+from article_log import is_article_name, read_article, article_names
+import segments
+from segments import create_manifest_file, new_build_files, hash_content
+from near_duplicates import MinHashIndex, minhash
+from recency import parse_date
 
 '''
 While parsing the articles we will perform the following operations on each page in this order:
@@ -15,97 +20,111 @@ While parsing the articles we will perform the following operations on each page
 4) Filter out all the tokens that are in the stop words list, such as 'a', 'an', 'the'.
 5) Stem each token using to finally obtain the stream of terms. Porter Stemmer removes common endings from words. For example the stemmed version of the words fish, fishes, fishing, fisher, fished are all fish.
 
+Steps 2-5 live in analyzer.py, which the query side uses as well.
+
+With COLLAPSE_NEAR_DUPLICATES, an article whose content is nearly the same as that of an article
+indexed before it (near_duplicates.py) is collapsed into that one: it keeps a doc ID and its
+doc_table entry ("duplicate_of": the canonical doc ID), but none of its terms are indexed and its
+doc store record holds only title and URL. So the same story from several feeds is indexed once
+and shows up once in the results.
+
+The publication date of every article ("published", seconds since the epoch, None if unknown) is
+kept in its doc_table entry. With segments.SEGMENT_PERIOD set, a full build indexes the articles in
+publication order, so that the manifest can split the index into one segment per day or week (see
+segments.py and recency.py); that takes a pass over the dates before indexing. Otherwise every
+source file is read once: its date and content hash come from the read that indexes it.
 '''
 
 # Directory containing the source files
 source_folder = "source_files"
 
-# List to store collected text from all files
-collected_text = []
+postings_index = {}
+# file names in the folder of the build, builds/<generation> (see segments.new_build_files)
+index_file = "index.bin"
 
-tokenizer = RegexpTokenizer(r'\w+')
-stemmer = Porter2Stemmer()
+# dense integer doc IDs: doc_table[doc_id] is the source file name (or article log name) of that document
+doc_table = []
+doc_table_file = "doc_table.json"
 
-postings_index = {}
-index_file = "index.txt"
+# per document statistics, doc_stats[doc_id] belongs to doc_table[doc_id]
+doc_stats = []
+
+# title, url and snippet of every document, doc_records[doc_id] belongs to doc_table[doc_id]
+doc_records = []
+doc_store_file = "doc_store.bin"
+
+# source file name -> hash of its content, for the manifest (see segments.create_manifest_file)
+file_hashes = {}
 
-def update_doc_vector_space(filename, terms_list):
+COLLAPSE_NEAR_DUPLICATES = True
+
+def compute_doc_stats(postings_index_map, doc_length):
     ''' 
     Note:
     1. First we contruct a vector space for the document -> this is basically a frequency list of the unique terms in the document. We need to calculate and store || D || (magnitude) for each of these documents. This can be calculated  as the square root of the sum of the squares of its components. 
 
-    2. In this implementation we are maintaining a json structure of filename and total terms per file. So if the file doc_vector_space.txt is empty, we write an empty object to the file first'''
+    2. The statistics are only accumulated in memory here (doc_stats) and written out once, after all files are processed,
+    by create_doc_table_file. Re-reading and re-writing a statistics file for every document (as the old
+    doc_vector_space.txt was) would make indexing quadratic in the number of documents.
 
-    path = "doc_vector_space.txt"
-    try:
-        # first create a hashmap to store the unique term frequency as a list
-        unique_term_freq = {}
-        for term in terms_list:
-            if term in unique_term_freq:
-                unique_term_freq[term] += 1
-            else:
-                unique_term_freq[term] = 1
-        
-        '''
-        We can use a vector to represent the document in bag of words model, 
-        since the ordering of terms is not important.
-        There is an entry for each unique term in the document with the value being 
-        its term frequency. For the sake of an example, consider the document 
-        “computer study computer science”. 
-        The vector representation of this document will be of size 3 
-        with values [2, 1, 1] corresponding to computer, study, and science respectively. 
-        We can indeed represent every document in the corpus as a k-dimensonal vector, 
-        where k is the number of unique terms in that document. 
-        Each dimension corresponds to a separate term in the document. 
-        '''
-        # now calculate the vector magnitude
-        sum_of_squares = 0
-        doc_vector = list(unique_term_freq.values())
-        for vector_ele in doc_vector:
-            sum_of_squares += (vector_ele * vector_ele)
-
-        # Initialize the dictionary to hold filename and vector magnitude
-        data = {}
-
-        # Check if the file exists
-        if os.path.exists(path):
-            # Read the existing data if the file is not empty
-            if os.path.getsize(path) > 0:
-                with open(path, 'r') as file:
-                    data = json.load(file)
-            else:
-                # If the file is empty, write an empty dictionary {}
-                with open(path, 'w') as file:
-                    json.dump(data, file)
-
-        # Update the dictionary with the vector magnitude
-        data[filename] = math.sqrt(sum_of_squares)
-
-        # Write the updated dictionary back to the file
-        with open(path, 'w') as file:
-            json.dump(data, file)
-        # print("Term frequency updated successfully.")
-    except Exception as e:
-        print("Error updating term frequency:", e)
+    postings_index_map is the per file map built by create_postings_map_per_file, so the term frequency of a term is
+    the number of its positions and the unique terms do not have to be counted a second time.'''
+
+    '''
+    We can use a vector to represent the document in bag of words model, 
+    since the ordering of terms is not important.
+    There is an entry for each unique term in the document with the value being 
+    its term frequency. For the sake of an example, consider the document 
+    “computer study computer science”. 
+    The vector representation of this document will be of size 3 
+    with values [2, 1, 1] corresponding to computer, study, and science respectively. 
+    We can indeed represent every document in the corpus as a k-dimensonal vector, 
+    where k is the number of unique terms in that document. 
+    Each dimension corresponds to a separate term in the document. 
+    '''
+    # now calculate the vector magnitude
+    sum_of_squares = 0
+    for _, positions in postings_index_map.values():
+        sum_of_squares += len(positions) * len(positions)
 
+    return {
+        "length": doc_length,
+        "norm": math.sqrt(sum_of_squares),
+        "unique_terms": len(postings_index_map)
+    }
 
 
-def create_index_file(postings_index, filename):
+def create_index_file(postings_index, doc_count, filename, doc_norms=None, doc_lengths=None, spelling=False):
+    '''
+    Writes the postings index in the binary layout described in binary_index.py.
+    Terms are written in sorted order, which is what lets the query side binary search
+    the term dictionary straight out of the mmapped file.
+    doc_norms (doc ID -> vector magnitude) and doc_lengths (doc ID -> number of terms) are needed
+    for the per term score upper bounds. spelling adds the deletion dictionary of spelling correction.
+    '''
     try:
-        with open(filename, 'w') as file:
-            for term, postings_list in postings_index.items():
-                file.write(term + '|')
-                for i, posting in enumerate(postings_list):
-                    docID, positions = posting
-                    file.write(f'{docID}:{",".join(map(str, positions))}')
-                    if i < len(postings_list) - 1:
-                        file.write(';')
-                file.write('\n')
+        write_binary_index(sorted(postings_index.items()), doc_count, filename, doc_norms, doc_lengths, spelling)
         # print(f"Data successfully written to {filename}")
     except IOError as e:
         print(f"Error writing to file: {e}")
 
-def create_postings_index(postings_index_map):
+def create_doc_table_file(doc_table, doc_stats, filename):
+    ''' doc_table.json holds the file name and the statistics of every document, indexed by doc ID '''
+    try:
+        data = [dict(doc_id=doc_id, filename=doc_name, **stats) for doc_id, (doc_name, stats) in enumerate(zip(doc_table, doc_stats))]
+        with open(filename, 'w') as file:
+            json.dump(data, file)
+    except IOError as e:
+        print(f"Error writing to file: {e}")
+
+def create_doc_store_file(doc_records, filename):
+    ''' doc_store.bin holds what the query side shows for a result, see doc_store.py '''
+    try:
+        write_doc_store(doc_records, 0, filename)
+    except IOError as e:
+        print(f"Error writing to file: {e}")
+
+def create_postings_index(postings_index, postings_index_map):
     for key, value in postings_index_map.items():
         if key not in postings_index:
             postings_index[key] = [value]
@@ -125,44 +144,157 @@ def create_postings_map_per_file(doc_id, stemmed_list):
     return postings_index_map
 
 
-def process_files():
-    for filename in os.listdir(source_folder):
-        filepath = os.path.join(source_folder, filename)
-        try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                # Read JSON data from the file
+def duplicate_stats(canonical, published=None):
+    ''' doc_stats entry of a document collapsed into the document canonical '''
+    return {"length": 0, "norm": 0.0, "unique_terms": 0, "published": published, "duplicate_of": canonical}
+
+
+def duplicate_record(record):
+    ''' Doc store record of a collapsed document, only title and URL are kept '''
+    return dict(record, content="", offsets=b"")
+
+
+def index_document(data, name, postings_index, doc_table, doc_stats, doc_records, near_duplicates=None):
+    '''
+    Analyzes one article ({"url", "title", "content", "published"}) and adds it to postings_index under the
+    next dense doc ID, with name as its doc_table entry.
+    Its doc store record is appended to doc_records (a list or a doc_store.DocStoreWriter).
+    With near_duplicates (a near_duplicates.MinHashIndex) a near-duplicate of an article indexed
+    before is collapsed into it instead.
+    Returns the postings map of the article, empty for a collapsed one.
+    '''
+    # Extract the content attribute
+    content = data.get('content', '')
+    # Lowercase, tokenize, remove stop words and stem, keeping the character span of every term for snippets
+    stemmed_list, offsets = analyze_with_offsets(content)
+    # Assign the next dense doc ID to this article
+    doc_id = len(doc_table)
+    doc_table.append(name)
+    published = parse_date(data.get('published'))
+    signature = minhash(stemmed_list)
+    if near_duplicates is not None:
+        canonical = near_duplicates.canonical(signature, near_duplicates.doc_id_offset + doc_id)
+        if canonical is not None:
+            doc_stats.append(duplicate_stats(canonical, published))
+            doc_records.append(duplicate_record(make_record(data, b"")))
+            return {}
+    # Create postings index
+    postings_index_map = create_postings_map_per_file(doc_id, stemmed_list)
+    create_postings_index(postings_index, postings_index_map)
+    # Accumulate the document statistics, they are written once at the end
+    stats = compute_doc_stats(postings_index_map, len(stemmed_list))
+    stats["published"] = published
+    if signature is not None:
+        stats["minhash"] = signature
+    doc_stats.append(stats)
+    doc_records.append(make_record(data, encode_offsets(offsets)))
+    return postings_index_map
+
+
+def collapse_near_duplicates(doc_stats, doc_records):
+    '''
+    Collapses the near-duplicates of a full build that indexed every document (parallel_index.py,
+    whose workers only see their own shard) the way index_document does while indexing: doc_stats
+    and doc_records are changed in place. Returns the doc IDs of the collapsed documents, whose
+    postings still have to be dropped.
+    '''
+    collapsed = set()
+    if not COLLAPSE_NEAR_DUPLICATES:
+        return collapsed
+    near_duplicates = MinHashIndex()
+    for doc_id, stats in enumerate(doc_stats):
+        signature = stats.get("minhash")
+        canonical = near_duplicates.canonical(signature, doc_id)
+        if canonical is not None:
+            doc_stats[doc_id] = duplicate_stats(canonical, stats.get("published"))
+            doc_records[doc_id] = duplicate_record(doc_records[doc_id])
+            collapsed.add(doc_id)
+    return collapsed
+
+
+def new_near_duplicates():
+    ''' MinHashIndex for a full build, None if near-duplicates are not collapsed '''
+    return MinHashIndex() if COLLAPSE_NEAR_DUPLICATES else None
+
+
+def index_source_file(folder, filename, postings_index, doc_table, doc_stats, doc_records, near_duplicates=None,
+                      file_hashes=None):
+    '''
+    Indexes one source file of folder, or one article of the article log (see article_log.py),
+    with index_document. Returns its postings map, or None if it could not be indexed.
+    The content hash of a source file is added to file_hashes (a dict), from the same read.
+    '''
+    try:
+        if is_article_name(filename):
+            data = read_article(filename)
+        else:
+            with open(os.path.join(folder, filename), 'rb') as file:
+                content = file.read()
+            # Read JSON data from the file
+            data = json.loads(content.decode('utf-8'))
+            if file_hashes is not None:
+                file_hashes[filename] = hash_content(content)
+        return index_document(data, filename, postings_index, doc_table, doc_stats, doc_records, near_duplicates)
+
+    except FileNotFoundError:
+        print(f"File not found: {filename}")
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON in file: {filename}")
+    except Exception as e:
+        print(f"Error reading file {filename}: {e}")
+
+
+def published_date(folder, filename):
+    ''' Publication date of a source file or logged article (seconds since the epoch), None if unknown '''
+    try:
+        if is_article_name(filename):
+            data = read_article(filename)
+        else:
+            with open(os.path.join(folder, filename), 'r', encoding='utf-8') as file:
                 data = json.load(file)
-                # Extract the content attribute
-                content = data.get('content', '')
-                # Convert content to lower case
-                content = content.lower()
-                # Tokenize the content
-                tokens_list = tokenizer.tokenize(content)
-                # Remove all English stop words
-                filtered_tokens_list = [word for word in tokens_list if word not in stopwords.words('english')]
-                # Stem the filtered token list
-                stemmed_list = [stemmer.stem(word) for word in filtered_tokens_list]
-                # Update document vector space
-                update_doc_vector_space(filename, stemmed_list)
-                # Create postings index
-                postings_index_map = create_postings_map_per_file(filename, stemmed_list)
-                create_postings_index(postings_index_map)
-            
-        except FileNotFoundError:
-            print(f"File not found: {filename}")
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON in file: {filename}")
-        except Exception as e:
-            print(f"Error reading file {filename}: {e}")
-
-
-start_time = time.time()
-process_files()
-end_time = time.time()
-print(f"process_files() took {end_time - start_time:.2f} seconds.")
-
-start_time = time.time()
-create_index_file(postings_index, index_file)
-end_time = time.time()
-print(f"create_index_file() took {end_time - start_time:.2f} seconds.")
-# print(postings_index)
+        return parse_date(data.get('published'))
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def list_documents(folder):
+    '''
+    What a full build indexes, in doc ID order: the files of folder by name, then the articles of the
+    article log. With segments.SEGMENT_PERIOD set, all of them in publication order instead, undated
+    ones first, and by name among those of the same date, so that doc IDs are stable between builds
+    '''
+    names = sorted(os.listdir(folder)) + article_names()
+    if not segments.SEGMENT_PERIOD:
+        # the dates only matter to the split into period segments, reading them costs a pass over the files
+        return names
+    dates = {name: published_date(folder, name) for name in names}
+    return sorted(names, key=lambda name: (dates[name] is not None, dates[name] or 0, name))
+
+
+def process_files():
+    near_duplicates = new_near_duplicates()
+    for filename in list_documents(source_folder):
+        index_source_file(source_folder, filename, postings_index, doc_table, doc_stats, doc_records, near_duplicates,
+                          file_hashes)
+
+
+def main():
+    start_time = time.time()
+    process_files()
+    end_time = time.time()
+    print(f"process_files() took {end_time - start_time:.2f} seconds.")
+    print(f"stem cache: {stem_cache_stats()}")
+
+    start_time = time.time()
+    index_path, doc_table_path, doc_store_path = new_build_files(index_file, doc_table_file, doc_store_file)
+    create_index_file(postings_index, len(doc_table), index_path, [stats["norm"] for stats in doc_stats],
+                      [stats["length"] for stats in doc_stats], spelling=True)
+    create_doc_table_file(doc_table, doc_stats, doc_table_path)
+    create_doc_store_file(doc_records, doc_store_path)
+    create_manifest_file(doc_table, source_folder, index_path, doc_table_path, doc_store_path, file_hashes)
+    end_time = time.time()
+    print(f"create_index_file() took {end_time - start_time:.2f} seconds.")
+    # print(postings_index)
+
+if __name__ == "__main__":
+    main()
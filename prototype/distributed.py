@@ -0,0 +1,401 @@
+import os
+import sys
+import time
+import shutil
+import heapq
+import bisect
+import itertools
+import threading
+import multiprocessing
+import query_index
+from segments import (
+    SegmentedIndex, read_manifest, write_manifest, manifest_file, load_doc_entries, split_segment, distinct_terms,
+    AUTOCOMPLETE_SIZE
+)
+from scoring import SCORERS, DEFAULT_SCORER, get_scorer
+from topk import wand_top_k
+from query_cache import LRUCache
+
+'''
+Sharded, scatter-gather query execution: the index is partitioned by doc ID into shards, every
+shard is served by a worker process of its own, and a coordinator (ShardedIndex) fans every query
+out to all of them and merges what they send back. A worker only opens the segments of its shard,
+so no single process has to hold the whole index, and the shards are searched at the same time.
+
+Shards are equal ranges of doc IDs (doc_id_ranges). A segment whose doc IDs all fall into one
+shard's range goes to that shard as it is; a segment a range boundary cuts through is written once
+more, as one piece segment per shard (segments.split_segment), into shards/<generation>_<shards>
+(write_shards). The pieces are written the first time the shards of a generation are asked for
+and reused by later coordinators, a newer generation removes them. Their deletion dictionary
+stays the one of the cut segment, which the shard of its first piece serves (manifest["spelling"]),
+so spelling corrections are the same as on the whole index. Doc IDs stay the global ones of the
+manifest, the results of the shards are merged without renumbering.
+
+A query takes three rounds, each one request to every shard (or the shards concerned) at once and
+waiting for all the answers:
+
+1. statistics: the coordinator parses the query with query_index.parse_search. The spelling
+   correction and wildcard expansion of the parser look up terms in the coordinator, which asks
+   all shards for their document frequencies, prefix terms or spelling candidates and adds them
+   up. The document frequencies are cached for the index generation.
+2. search: every shard ranks its matching documents and returns its k best (doc, score). The
+   scores use the global statistics: document count and average length of all shards (sent once,
+   when the workers start) and the document frequencies of the query terms (sent with the query),
+   see GlobalStatistics. So a document scores the same as in a search of the whole index, and
+   the k best of all shards are the first k of the merged lists. The coordinator merges them and
+   applies the rank threshold, which needs the best score of all shards.
+3. fetch: only the shards holding the merged top k make the titles, urls and snippets of those.
+
+The shards are searched in parallel, so the latency of a query is that of its slowest shard plus
+the rounds of the coordinator: growing the collection by adding shards (and cores) keeps it flat,
+see benchmark_distributed.py. The search options of segment order (since, until, order, recency)
+are not supported, query_index.search does those.
+
+Usage: python3 distributed.py [shards]
+'''
+
+DEFAULT_SHARDS = 4
+# the segments cut into pieces for the shards, see write_shards
+shards_folder = "shards"
+# term -> (document frequency, live document frequency) of all shards kept by the coordinator
+STATISTICS_CACHE_SIZE = 100000
+# seconds a worker is given to exit when the coordinator closes
+WORKER_EXIT_TIMEOUT = 5.0
+
+
+def doc_id_ranges(manifest, shard_count):
+    ''' (first, end) doc IDs of shard_count shards of about the same size, fewer for a tiny index '''
+    next_doc_id = manifest["next_doc_id"]
+    bounds = sorted({next_doc_id * j // shard_count for j in range(shard_count + 1)})
+    return list(zip(bounds, bounds[1:]))
+
+
+def write_shards(manifest, shard_count):
+    '''
+    Partitions the index of manifest by doc ID into shard_count shards and returns a manifest for
+    each of them (the "first_doc_id" and "end_doc_id" of its range added), see above. The cut
+    segments are written into shards/<generation>_<shard_count> with the shard manifests
+    (shards.json) last, so an unfinished folder is never reused.
+    '''
+    name = f"{manifest['generation']}_{shard_count}"
+    folder = os.path.join(shards_folder, name)
+    shards_file = os.path.join(folder, "shards.json")
+    shards = read_manifest(shards_file)
+    if shards is not None:
+        return shards
+
+    shutil.rmtree(folder, ignore_errors=True)
+    ranges = doc_id_ranges(manifest, shard_count)
+    shards = [{
+        "generation": manifest["generation"],
+        "first_doc_id": first,
+        "end_doc_id": end,
+        "segments": [],
+        "deleted": [doc_id for doc_id in manifest["deleted"] if first <= doc_id < end],
+        "spelling": []
+    } for first, end in ranges]
+    if manifest.get("full_build"):
+        shards[0]["spelling"].append(manifest["full_build"])
+    segments = manifest["segments"]
+    # a segment holds the doc IDs up to the first of the next one
+    segment_ends = [segment["first_doc_id"] for segment in segments[1:]] + [manifest["next_doc_id"]]
+    for segment, segment_end in zip(segments, segment_ends):
+        overlapping = [i for i, (first, end) in enumerate(ranges) if first < segment_end and end > segment["first_doc_id"]]
+        if len(overlapping) == 1:
+            shards[overlapping[0]]["segments"].append(segment)
+        elif overlapping:
+            pieces = split_segment(
+                segment, load_doc_entries(segment),
+                [(max(ranges[i][0], segment["first_doc_id"]), min(ranges[i][1], segment_end)) for i in overlapping],
+                [f"{i}_{segment['name']}" for i in overlapping], folder)
+            for i, piece in zip(overlapping, pieces):
+                shards[i]["segments"].append(piece)
+            shards[overlapping[0]]["spelling"].append(segment["index"])
+    os.makedirs(folder, exist_ok=True)
+    write_manifest(shards, shards_file)
+    # the pieces of older generations, a coordinator still reading them keeps its mmapped files
+    for other in os.listdir(shards_folder):
+        if other != name:
+            shutil.rmtree(os.path.join(shards_folder, other), ignore_errors=True)
+    return shards
+
+
+class GlobalStatistics:
+    '''
+    What the scorers of scoring.py read of an index, for a shard: its own documents (doc_table,
+    norms) with the document count and average length of all shards, and the live document
+    frequencies of all shards of the terms of the current query (doc_freqs, see set_query). The
+    scorers are created once per worker, like get_scorer does per index, and cache the IDF per term
+    for one query.
+    '''
+
+    def __init__(self, shard_index, doc_count, total_length):
+        self.doc_table = shard_index.doc_table
+        self.norms = shard_index.norms
+        self.doc_count = doc_count
+        self.average_length = total_length / max(1, doc_count)
+        self.doc_freqs = {}
+        self.scorers = {}
+        self._idf = {}
+
+    def set_query(self, doc_freqs):
+        '''
+        The document frequencies sent with a query replace those of the last one, and the IDFs
+        cached for that are dropped, so a worker only holds the statistics of one query however
+        many terms it is asked for (the coordinator bounds its own with STATISTICS_CACHE_SIZE)
+        '''
+        self.doc_freqs = doc_freqs
+        self._idf = {}
+        for scorer in self.scorers.values():
+            if hasattr(scorer, "_idf"):
+                scorer._idf = {}
+
+    def live_document_frequency(self, term):
+        return self.doc_freqs.get(term, 0)
+
+    # the IDF of TF-IDF, from the counts above
+    idf = SegmentedIndex.idf
+
+
+def shard_search(shard_index, statistics, terms, query_type, union, slop, query, k, scoring):
+    '''
+    The k best (doc, score) pairs of the shard (all if k is None) for a query parsed by
+    query_index.parse_search, best first and the smaller doc ID first on equal scores, scored with
+    the global statistics. The rank threshold is left to the coordinator.
+    '''
+    scorer = get_scorer(statistics, scoring)
+    if k is not None and union:
+        return wand_top_k(terms, shard_index, k, scorer=scorer)
+    docs = query_index.match_documents(terms, query_type, union, slop, query, shard_index)
+    document_scores = query_index.score_documents(terms, docs, shard_index, scorer)
+    ranked = document_scores.items()
+    if k is None:
+        return sorted(ranked, key=lambda ranked_doc: (-ranked_doc[1], ranked_doc[0]))
+    return heapq.nsmallest(k, ranked, key=lambda ranked_doc: (-ranked_doc[1], ranked_doc[0]))
+
+
+def serve_shard(manifest, connection):
+    '''
+    Runs in a worker process: opens the segments of the shard manifest and answers the requests
+    of the coordinator, (name, arguments) tuples, until it is told to close. Every answer is
+    ("ok", result) or ("error", message).
+    '''
+    query_index.VERBOSE = False
+    shard_index = SegmentedIndex(manifest)
+    statistics = None
+    try:
+        while True:
+            try:
+                request, arguments = connection.recv()
+            except EOFError:
+                break
+            if request == "close":
+                break
+            try:
+                if request == "info":
+                    result = {"doc_count": shard_index.doc_count,
+                              "total_length": sum(entry["length"] for entry in shard_index.doc_table.values())}
+                elif request == "global":
+                    statistics = GlobalStatistics(shard_index, *arguments)
+                    result = None
+                elif request == "statistics":
+                    result = [(shard_index.document_frequency(term), shard_index.live_document_frequency(term))
+                              for term in arguments[0]]
+                elif request == "prefix_terms":
+                    result = list(shard_index.prefix_terms(arguments[0]))
+                elif request == "spelling_candidates":
+                    term, max_distance, budget = arguments
+                    deadline = None if budget is None else time.perf_counter() + budget
+                    result = shard_index.spelling_candidates(term, max_distance, deadline)
+                elif request == "search":
+                    start_time = time.perf_counter()
+                    doc_freqs, search_arguments = arguments
+                    statistics.set_query(doc_freqs)
+                    ranked = shard_search(shard_index, statistics, *search_arguments)
+                    result = ranked, time.perf_counter() - start_time
+                elif request == "fetch":
+                    ranked_docs, terms = arguments
+                    result = query_index.collect_results(ranked_docs, shard_index, terms)
+                else:
+                    raise ValueError(f"unknown request {request!r}")
+            except Exception as error:
+                connection.send(("error", f"{type(error).__name__}: {error}"))
+            else:
+                connection.send(("ok", result))
+    finally:
+        shard_index.close()
+        connection.close()
+
+
+class ShardedIndex:
+    '''
+    Coordinator of shards (the manifests of write_shards), each served by a worker process (serve_shard).
+    search(user_input, k) answers a query like query_index.search does on the whole index.
+    For the query parser it looks like an index: document_frequency, prefix_terms, autocomplete and
+    spelling_candidates answer for all shards. doc_count is the number of live documents of all shards.
+    A lock lets one thread at a time talk to the workers, so it can be shared by threads.
+    '''
+
+    def __init__(self, shards):
+        self.generation = shards[0]["generation"]
+        # first doc ID of every shard, to find the shard of a document
+        self.first_doc_ids = [shard["first_doc_id"] for shard in shards]
+        self.statistics = LRUCache(STATISTICS_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self.connections = []
+        self.processes = []
+        for shard in shards:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=serve_shard, args=(shard, worker_connection), daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        try:
+            infos = self._gather("info")
+            self.doc_count = sum(info["doc_count"] for info in infos)
+            self._gather("global", self.doc_count, sum(info["total_length"] for info in infos))
+        except BaseException:
+            self.close()
+            raise
+
+    def _exchange(self, requests):
+        '''
+        Sends the (request, arguments) of every shard in requests (shard -> request) at once and
+        returns their results in the same order
+        '''
+        with self._lock:
+            for shard, request in requests.items():
+                self.connections[shard].send(request)
+            answers = [self.connections[shard].recv() for shard in requests]
+        for (shard, (request, _)), (status, result) in zip(requests.items(), answers):
+            if status != "ok":
+                raise RuntimeError(f"shard {shard} failed on {request}: {result}")
+        return [result for _, result in answers]
+
+    def _gather(self, request, *arguments):
+        ''' Sends the same request to all shards and returns their results in shard order '''
+        return self._exchange({shard: (request, arguments) for shard in range(len(self.connections))})
+
+    def term_statistics(self, terms):
+        ''' term -> (document frequency, live document frequency) of all shards, one round for the uncached terms '''
+        result = {}
+        missing = []
+        for term in dict.fromkeys(terms):
+            cached = self.statistics.get(term)
+            if cached is None:
+                missing.append(term)
+            else:
+                result[term] = cached
+        if missing:
+            for term, counts in zip(missing, zip(*self._gather("statistics", missing))):
+                result[term] = (sum(doc_freq for doc_freq, _ in counts), sum(live for _, live in counts))
+                self.statistics.put(term, result[term])
+        return result
+
+    def document_frequency(self, term):
+        return self.term_statistics([term])[term][0]
+
+    def live_document_frequency(self, term):
+        return self.term_statistics([term])[term][1]
+
+    def prefix_terms(self, prefix):
+        return distinct_terms(self._gather("prefix_terms", prefix))
+
+    def autocomplete(self, prefix, n=AUTOCOMPLETE_SIZE):
+        ''' Same as SegmentedIndex.autocomplete, with the frequencies of all shards '''
+        terms = list(self.prefix_terms(prefix))
+        statistics = self.term_statistics(terms)
+        completions = ((term, statistics[term][0]) for term in terms)
+        return heapq.nsmallest(n, completions, key=lambda completion: (-completion[1], completion[0]))
+
+    def spelling_candidates(self, term, max_distance, deadline=None):
+        # the workers get what is left of the budget, and the frequencies of the candidates are fetched in one round
+        budget = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        candidates = [candidate for candidates in self._gather("spelling_candidates", term, max_distance, budget)
+                      for candidate in candidates]
+        self.term_statistics(candidates)
+        return candidates
+
+    def shard_of(self, doc_id):
+        return bisect.bisect_right(self.first_doc_ids, doc_id) - 1
+
+    def search(self, user_input, k=None, scoring=None, corrections=None, stats=None):
+        '''
+        Answers one query on all shards, returns (terms, query_type, results) like query_index.search.
+        If stats is a dict, the seconds every shard spent ranking are added to it ("shard_times").
+        '''
+        if (scoring or DEFAULT_SCORER) not in SCORERS:
+            raise ValueError(f"unknown scorer {scoring!r}, expected one of {', '.join(SCORERS)}")
+        # round 1: the statistics of the analyzed words first, then of what parsing made of them
+        terms, query_type = query_index.analyze_query(user_input)
+        self.term_statistics(terms)
+        terms, query_type, union, slop, query = query_index.parse_search(user_input, self, corrections)
+        doc_freqs = {term: live for term, (_, live) in self.term_statistics(terms).items()}
+
+        # round 2: the k best of every shard, merged best first
+        answers = self._gather("search", doc_freqs, (terms, query_type, union, slop, query, k, scoring))
+        if stats is not None:
+            stats["shard_times"] = [elapsed for _, elapsed in answers]
+        merged = heapq.merge(*(ranked for ranked, _ in answers), key=lambda ranked_doc: (-ranked_doc[1], ranked_doc[0]))
+        ranked_docs = query_index.apply_rank_threshold(list(itertools.islice(merged, k)))
+
+        # round 3: metadata and snippets from the shards holding the results
+        per_shard = {}
+        for ranked_doc in ranked_docs:
+            per_shard.setdefault(self.shard_of(ranked_doc["document"]), []).append(ranked_doc)
+        fetched = {}
+        for results in self._exchange({shard: ("fetch", (shard_docs, terms)) for shard, shard_docs in per_shard.items()}):
+            for result in results:
+                fetched[result["doc_id"]] = result
+        results = [fetched[ranked_doc["document"]] for ranked_doc in ranked_docs if ranked_doc["document"] in fetched]
+        return terms, query_type, results
+
+    def close(self):
+        for connection, process in zip(self.connections, self.processes):
+            try:
+                connection.send(("close", ()))
+            except (OSError, ValueError):
+                pass
+            connection.close()
+            process.join(WORKER_EXIT_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
+
+
+def open_sharded_index(shard_count=DEFAULT_SHARDS, filename=manifest_file):
+    manifest = read_manifest(filename)
+    if manifest is None:
+        print(f"{filename} not found, run create_index.py first")
+        return None
+    return ShardedIndex(write_shards(manifest, shard_count))
+
+
+def main():
+    shard_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SHARDS
+    user_input = input("Search: ")
+
+    start_time = time.time()
+    sharded_index = open_sharded_index(shard_count)
+    if sharded_index is None:
+        raise SystemExit(1)
+    try:
+        print(f"{sharded_index.doc_count} documents in {len(sharded_index.processes)} shards, "
+              f"opened in {time.time() - start_time:.6f} seconds.")
+        start_time = time.time()
+        corrections = {}
+        _, _, results = sharded_index.search(user_input, query_index.TOP_K, corrections=corrections)
+        for term, replacements in corrections.items():
+            print(f"{term} is not in the index, showing results for {' or '.join(replacements)}")
+        for response in results:
+            print({key: value for key, value in response.items() if key != 'doc_id'})
+            print()
+        print(f"Returned {len(results)} results in {time.time() - start_time:.6f} seconds.")
+    finally:
+        sharded_index.close()
+
+
+if __name__ == "__main__":
+    main()
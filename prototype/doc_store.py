@@ -0,0 +1,208 @@
+import mmap
+import struct
+from postings_codec import vbyte_encode_number, vbyte_decode_number
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+'''
+Document store (doc_store.bin): the title, URL and content of every document plus the character
+offsets of its terms (see snippets.py), written at index time so the query side never has to open
+and parse the source JSON files of its results.
+
++--------------------------------------------------------------+
+| header: magic, version, flags, docs per block,               |
+|         first doc ID, doc count, block count, index offset   |
++--------------------------------------------------------------+
+| blocks of DOCS_PER_BLOCK consecutive documents               |
+|   record offsets in the block, one uint32 per document + 1   |
+|   every document: title, url, content (utf-8) and term      |
+|   offsets, each one a VByte byte length followed by the bytes|
+|   the whole block zstd compressed if the compressed flag     |
+|   is set                                                     |
++--------------------------------------------------------------+
+| block index: block count + 1 file offsets (uint64)           |
++--------------------------------------------------------------+
+
+The store covers the consecutive doc IDs first doc ID .. first doc ID + doc count - 1 (a segment's
+documents), so the block of a doc ID is found by arithmetic, and a lookup decompresses one block
+and decodes one record of it.
+With COMPRESS_BLOCKS every block is zstd compressed on its own: compressing a block of documents
+together gets far better ratios than compressing every document on its own, while a lookup still
+only decompresses DOCS_PER_BLOCK documents. It roughly halves the store, but the decompression
+costs more than the rest of a lookup, so it is off by default. Compression needs the zstandard
+package (as do readers of compressed stores); without it blocks are stored uncompressed.
+
+Documents a merge dropped (tombstones) keep their place as empty records.
+'''
+
+MAGIC = b'IHDS'
+FORMAT_VERSION = 2
+
+# magic, version, flags, docs per block, first doc ID, doc count, block count, index offset
+HEADER = struct.Struct('<4sHHHxxIIIQ')
+BLOCK_OFFSET = struct.Struct('<Q')
+RECORD_OFFSET = struct.Struct('<I')
+FLAG_COMPRESSED = 1
+
+DOCS_PER_BLOCK = 16
+COMPRESS_BLOCKS = False
+COMPRESSION_LEVEL = 3
+
+TEXT_FIELDS = ("title", "url", "content")
+# encoded term offsets, snippets.encode_offsets
+BINARY_FIELDS = ("offsets",)
+EMPTY_RECORD = {"title": "", "url": "", "content": "", "offsets": b""}
+
+
+def make_record(data, offsets):
+    ''' The stored fields of a parsed source file, offsets being the encoded term offsets of its content '''
+    return {
+        "title": data.get('title', ''),
+        "url": data.get('url', ''),
+        "content": data.get('content', ''),
+        "offsets": offsets
+    }
+
+
+class DocStoreWriter:
+    ''' Appends records in doc ID order, so a build can stream them out while it indexes '''
+
+    def __init__(self, filename, first_doc_id=0, compress=None):
+        if compress is None:
+            compress = COMPRESS_BLOCKS
+        self.file = open(filename, 'wb')
+        self.first_doc_id = first_doc_id
+        self.compressor = zstd.ZstdCompressor(level=COMPRESSION_LEVEL) if compress and zstd else None
+        self.doc_count = 0
+        self.block_records = []
+        self.block_offsets = []
+        self.file.write(bytes(HEADER.size))
+
+    def append(self, record):
+        encoded = bytearray()
+        for field in TEXT_FIELDS:
+            value = record.get(field, '').encode('utf-8')
+            vbyte_encode_number(len(value), encoded)
+            encoded += value
+        for field in BINARY_FIELDS:
+            value = record.get(field, b'')
+            vbyte_encode_number(len(value), encoded)
+            encoded += value
+        self.block_records.append(encoded)
+        self.doc_count += 1
+        if len(self.block_records) == DOCS_PER_BLOCK:
+            self._flush_block()
+
+    def _flush_block(self):
+        self.block_offsets.append(self.file.tell())
+        data = bytearray()
+        offset = (len(self.block_records) + 1) * RECORD_OFFSET.size
+        for encoded in self.block_records:
+            data += RECORD_OFFSET.pack(offset)
+            offset += len(encoded)
+        data += RECORD_OFFSET.pack(offset)
+        for encoded in self.block_records:
+            data += encoded
+        data = bytes(data)
+        self.file.write(self.compressor.compress(data) if self.compressor else data)
+        self.block_records = []
+
+    def close(self):
+        if self.block_records:
+            self._flush_block()
+        index_offset = self.file.tell()
+        for offset in self.block_offsets + [index_offset]:
+            self.file.write(BLOCK_OFFSET.pack(offset))
+        flags = FLAG_COMPRESSED if self.compressor else 0
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, DOCS_PER_BLOCK, self.first_doc_id,
+                                    self.doc_count, len(self.block_offsets), index_offset))
+        self.file.close()
+
+
+def write_doc_store(records, first_doc_id, filename, compress=None):
+    ''' Writes the records (dicts with the TEXT_FIELDS and BINARY_FIELDS, in doc ID order from first_doc_id) to filename '''
+    writer = DocStoreWriter(filename, first_doc_id, compress)
+    try:
+        for record in records:
+            writer.append(record)
+    finally:
+        writer.close()
+
+
+class DocStore:
+    ''' Read-only, mmapped doc_store.bin. store.get(doc_id) returns the record dict or None '''
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, docs_per_block, first_doc_id, doc_count, block_count, index_offset = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a doc store file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{filename} has doc store format version {version}, expected {FORMAT_VERSION}")
+        if flags & FLAG_COMPRESSED and zstd is None:
+            raise ValueError(f"{filename} is zstd compressed, install the zstandard package")
+        self.compressed = bool(flags & FLAG_COMPRESSED)
+        self.docs_per_block = docs_per_block
+        self.first_doc_id = first_doc_id
+        self.doc_count = doc_count
+        self.block_count = block_count
+        self._index_offset = index_offset
+        # the last decompressed block, (block number, bytes), results of a query tend to share blocks
+        self._last_block = (None, None)
+
+    def __contains__(self, doc_id):
+        return self.first_doc_id <= doc_id < self.first_doc_id + self.doc_count
+
+    def __len__(self):
+        return self.doc_count
+
+    def _block(self, block_no):
+        ''' The (decompressed) bytes of a block '''
+        last_block_no, data = self._last_block
+        if last_block_no == block_no:
+            return data
+        start = BLOCK_OFFSET.unpack_from(self._buffer, self._index_offset + block_no * BLOCK_OFFSET.size)[0]
+        end = BLOCK_OFFSET.unpack_from(self._buffer, self._index_offset + (block_no + 1) * BLOCK_OFFSET.size)[0]
+        data = self._buffer[start:end]
+        if self.compressed:
+            # decompressor objects are not thread safe, the query server looks documents up from several threads
+            data = zstd.ZstdDecompressor().decompress(data)
+        self._last_block = (block_no, data)
+        return data
+
+    def _record(self, data, i):
+        offset = RECORD_OFFSET.unpack_from(data, i * RECORD_OFFSET.size)[0]
+        record = {}
+        for field in TEXT_FIELDS:
+            length, offset = vbyte_decode_number(data, offset)
+            record[field] = data[offset:offset + length].decode('utf-8')
+            offset += length
+        for field in BINARY_FIELDS:
+            length, offset = vbyte_decode_number(data, offset)
+            record[field] = data[offset:offset + length]
+            offset += length
+        return record
+
+    def get(self, doc_id, default=None):
+        if doc_id not in self:
+            return default
+        block_no, i = divmod(doc_id - self.first_doc_id, self.docs_per_block)
+        return self._record(self._block(block_no), i)
+
+    def records(self):
+        ''' Yields the records of all documents in doc ID order '''
+        for block_no in range(self.block_count):
+            data = self._block(block_no)
+            count = min(self.docs_per_block, self.doc_count - block_no * self.docs_per_block)
+            for i in range(count):
+                yield self._record(data, i)
+
+    def close(self):
+        self._last_block = (None, None)
+        self._buffer.close()
+        self._file.close()
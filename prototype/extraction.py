@@ -0,0 +1,92 @@
+import json
+from lxml import etree, html as lxml_html
+
+'''
+Extraction of the title and content of article pages, driven by the per-site configs in
+sites.json instead of one scraper script per site:
+
+    "toi": {
+        "name": "Times of India",
+        "feeds": [{"section": "india", "url": "https://..."}, ...],
+        "title": {"tag": "h1", "class": "HNMDR"},
+        "content": {"tag": "div", "class": "_s30J clearfix"}
+    }
+
+A rule matches the elements with the tag that have all the (space separated) classes. The title
+is the text of the first match, the content the text of the first match, or of all matches
+joined when the rule has "all": true (BBC articles are a list of <p>). Text inside <script> and
+<style> is skipped and text nodes are joined with spaces. A new source only needs an entry in
+sites.json.
+
+Pages are parsed with lxml (libxml2's HTML parser, in C) and matched with XPath expressions
+compiled once per rule, instead of building a BeautifulSoup tree with the pure Python
+html.parser and searching it. extract_article only takes strings and dicts, so the crawler can
+run it in a process pool.
+'''
+
+SITES_FILE = "sites.json"
+NO_CONTENT = "No Content"
+
+# text nodes of an element, without the code of scripts and styles
+_TEXT_NODES = etree.XPath(".//text()[not(parent::script) and not(parent::style)]")
+# (tag, class) -> compiled XPath of a rule
+_rule_paths = {}
+
+
+def load_sites(filename=SITES_FILE):
+    ''' The site configs of sites.json, by site name '''
+    with open(filename, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def rule_path(rule):
+    ''' Compiled XPath selecting the elements matched by a rule '''
+    key = (rule["tag"], rule.get("class", ""))
+    if key not in _rule_paths:
+        conditions = "".join(f"[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+                             for name in key[1].split())
+        _rule_paths[key] = etree.XPath(f"//{key[0]}{conditions}")
+    return _rule_paths[key]
+
+
+def element_text(element):
+    ''' The stripped text nodes of an element joined with spaces '''
+    return " ".join(text.strip() for text in _TEXT_NODES(element) if text.strip())
+
+
+def parse_html(page):
+    ''' lxml tree of an HTML page (str or bytes), None for a page without any content '''
+    try:
+        return lxml_html.document_fromstring(page)
+    except ValueError:
+        # str with an <?xml encoding=...?> declaration, lxml only takes those as bytes
+        return lxml_html.document_fromstring(page.encode('utf-8'))
+    except etree.ParserError:
+        return None
+
+
+def extract_article(page, site):
+    ''' (title, content) of an article page of site, a site config of sites.json '''
+    tree = parse_html(page)
+    if tree is None:
+        return '', NO_CONTENT
+    titles = rule_path(site["title"])(tree)
+    title = element_text(titles[0]) if titles else ''
+    content_rule = site["content"]
+    matches = rule_path(content_rule)(tree)
+    if not content_rule.get("all"):
+        matches = matches[:1]
+    content = " ".join(element_text(match) for match in matches)
+    return title, content or NO_CONTENT
+
+
+def extract_batch(pages):
+    ''' extract_article of a list of (page, site) pairs, one task of a process pool '''
+    return [extract_article(page, site) for page, site in pages]
+
+
+def site_feeds(sites, names=None):
+    ''' (feed URL, site config) pairs of the sites with the given names, all of them by default '''
+    if names is None:
+        names = list(sites)
+    return [(feed["url"], sites[name]) for name in names for feed in sites[name]["feeds"]]
@@ -73,10 +73,11 @@ def compress_zstd(input_file, output_file):
     print(f"Zstd Compression complete. Original size: {len(original_text)} bytes, Compressed size: {len(compressed_data)} bytes")
 
 
-# Example usage:
-input_file = 'index.txt'
-output_file = 'index_compressed.zst'
-start_time = time.time()
-compress_zstd(input_file, output_file)
-end_time = time.time()
-print(f"zstd compression took {end_time - start_time:.2f} seconds.")
+if __name__ == "__main__":
+    # Example usage:
+    input_file = 'index.txt'
+    output_file = 'index_compressed.zst'
+    start_time = time.time()
+    compress_zstd(input_file, output_file)
+    end_time = time.time()
+    print(f"zstd compression took {end_time - start_time:.2f} seconds.")
@@ -0,0 +1,127 @@
+import os
+import time
+from index_merge import merge_partial_indexes
+from create_index import source_folder, index_source_file, COLLAPSE_NEAR_DUPLICATES
+from near_duplicates import MinHashIndex
+from segments import (
+    read_manifest, write_manifest, write_segment, file_state, content_hash,
+    start_background_merge, manifest_lock
+)
+
+'''
+Incremental indexing of the files the scrapers added to, changed in or removed from source_files
+since the last build, instead of rebuilding the whole index.
+
+1) Compare source_files with the "files" of segments.json. A file is new if it is not listed,
+   deleted if it is listed but gone, and modified if its mtime or size changed and its content
+   hash differs from the recorded one (a file that was only touched just gets its mtime updated).
+2) Tombstone the doc IDs of deleted and modified files.
+3) Index new and modified files into a delta segment whose doc IDs continue after the last segment.
+   Near-duplicates of live documents are collapsed (see create_index.py); files that were
+   collapsed into a document that got tombstoned are indexed again, as documents of their own.
+4) Publish the new manifest, then let the merge policy compact segments in a background thread.
+
+So the cost of an update is proportional to the number of changed files, not to the corpus.
+Run create_index.py (or parallel_index.py / spimi_index.py) once first to build the base segment.
+'''
+
+
+def detect_changes(manifest):
+    ''' Returns (new, modified, deleted) file name lists, updating the state of touched but unchanged files '''
+    files = manifest["files"]
+    on_disk = sorted(os.listdir(source_folder))
+    new, modified = [], []
+    for filename in on_disk:
+        filepath = os.path.join(source_folder, filename)
+        known = files.get(filename)
+        if known is None:
+            new.append(filename)
+            continue
+        state = file_state(filepath)
+        if known["mtime"] == state["mtime"] and known["size"] == state["size"]:
+            continue
+        file_hash = content_hash(filepath)
+        if known["hash"] == file_hash:
+            known.update(state)
+        else:
+            modified.append(filename)
+    on_disk = set(on_disk)
+    deleted = [filename for filename in files if filename not in on_disk]
+    return new, modified, deleted
+
+
+def add_delta_segment(manifest, postings_index, doc_table, doc_stats, doc_records):
+    '''
+    Writes the documents indexed into postings_index (with doc IDs from 0) as a new delta segment
+    behind the existing ones and adds it to manifest. Returns the doc table entries of the segment.
+    '''
+    first_doc_id = manifest["next_doc_id"]
+    doc_entries = [dict(doc_id=doc_id, filename=filename, **stats)
+                   for doc_id, (filename, stats) in enumerate(zip(doc_table, doc_stats), start=first_doc_id)]
+    # the delta is indexed with doc IDs from 0, shifting moves it behind the existing segments
+    delta_postings = merge_partial_indexes([sorted(postings_index.items())], [first_doc_id])
+    segment = write_segment(f"segment_{manifest['generation'] + 1}", delta_postings, doc_entries, doc_records, first_doc_id)
+    manifest["segments"].append(segment)
+    manifest["next_doc_id"] = first_doc_id + len(doc_table)
+    return doc_entries
+
+
+def update_index():
+    with manifest_lock:
+        manifest = read_manifest()
+        if manifest is None:
+            print("segments.json not found, run create_index.py first")
+            return False
+        new, modified, deleted = detect_changes(manifest)
+        print(f"{len(new)} new, {len(modified)} modified, {len(deleted)} deleted files.")
+
+        files = manifest["files"]
+        tombstoned = [files.pop(filename)["doc_id"] for filename in modified + deleted]
+        manifest["deleted"].extend(tombstoned)
+
+        near_duplicates = None
+        orphaned = []
+        if COLLAPSE_NEAR_DUPLICATES:
+            near_duplicates = MinHashIndex.from_manifest(manifest)
+            filenames = {entry["doc_id"]: filename for filename, entry in files.items()}
+            orphaned = [filenames[doc_id] for canonical in tombstoned
+                        for doc_id in near_duplicates.collapsed.get(canonical, []) if doc_id in filenames]
+            for filename in orphaned:
+                manifest["deleted"].append(files.pop(filename)["doc_id"])
+            if orphaned:
+                print(f"{len(orphaned)} files collapsed into replaced documents are indexed again.")
+
+        postings_index = {}
+        doc_table = []
+        doc_stats = []
+        doc_records = []
+        file_hashes = {}
+        for filename in sorted(new + modified + orphaned):
+            index_source_file(source_folder, filename, postings_index, doc_table, doc_stats, doc_records, near_duplicates,
+                              file_hashes)
+
+        if doc_table:
+            doc_entries = add_delta_segment(manifest, postings_index, doc_table, doc_stats, doc_records)
+            for entry in doc_entries:
+                filepath = os.path.join(source_folder, entry["filename"])
+                files[entry["filename"]] = dict(doc_id=entry["doc_id"], hash=file_hashes[entry["filename"]],
+                                                **file_state(filepath))
+
+        if doc_table or modified or deleted:
+            manifest["generation"] += 1
+        # also persists the refreshed state of touched but unchanged files
+        write_manifest(manifest)
+        return True
+
+
+def main():
+    start_time = time.time()
+    updated = update_index()
+    end_time = time.time()
+    print(f"update_index() took {end_time - start_time:.2f} seconds.")
+    if updated:
+        start_background_merge()
+
+
+if __name__ == "__main__":
+    main()
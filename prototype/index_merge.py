@@ -0,0 +1,40 @@
+import heapq
+
+'''
+Streaming k-way merge of partial indexes.
+
+A partial index covers a contiguous range of doc IDs and numbers its documents from 0,
+so partial index i is shifted by doc_id_offsets[i] (the number of documents in all the
+partial indexes before it). The partial indexes are read term by term in sorted order
+and heapq.merge picks the smallest term over all of them; postings of the same term are
+concatenated in partial index order, which keeps every merged postings list sorted by
+doc ID. Only one term per partial index is held in memory at any time.
+'''
+
+
+def tag_items(items, index_no, doc_id_offset):
+    ''' Turns (term, postings) into (term, index_no, shifted postings) so equal terms sort by index_no '''
+    for term, postings_list in items:
+        if doc_id_offset:
+            postings_list = [[doc_id + doc_id_offset, positions] for doc_id, positions in postings_list]
+        yield term, index_no, postings_list
+
+
+def merge_partial_indexes(partial_items, doc_id_offsets):
+    '''
+    partial_items is a list of (term, postings_list) iterables in ascending term order,
+    e.g. BinaryIndex.items(). Yields (term, merged postings_list) in ascending term order,
+    ready for binary_index.write_binary_index.
+    '''
+    streams = [tag_items(items, index_no, doc_id_offsets[index_no]) for index_no, items in enumerate(partial_items)]
+    current_term = None
+    merged_postings = []
+    for term, _, postings_list in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+        if term != current_term:
+            if current_term is not None:
+                yield current_term, merged_postings
+            current_term = term
+            merged_postings = []
+        merged_postings.extend(postings_list)
+    if current_term is not None:
+        yield current_term, merged_postings
@@ -0,0 +1,132 @@
+import struct
+from postings_codec import vbyte_encode_number, vbyte_decode_number
+
+'''
+Front-coded term dictionary (lexicon) of index.bin.
+
+Sorted terms share long prefixes with their neighbours (elect, election, elector, electr, ...),
+so instead of storing every term in full, the terms are cut into blocks of LEXICON_BLOCK terms:
+
+    block table, one entry per block: byte offset of the block in the block data
+    block data, every block holding:
+        the first term in full: VByte length, utf-8 bytes
+        every following term:   VByte length of the prefix it shares with the term before it,
+                                VByte length of the rest, the rest (utf-8 bytes)
+
+Term number i is term i % LEXICON_BLOCK of block i // LEXICON_BLOCK. A lookup binary searches
+the first terms of the blocks, which are stored in full, and then decodes a single block, so
+exact, prefix and range lookups are O(log V) plus one block, straight from the mmapped file:
+the vocabulary never becomes a dict of Python strings.
+
+Terms are compared as utf-8 bytes, which sorts like the strings themselves.
+'''
+
+LEXICON_BLOCK = 16
+BLOCK_OFFSET = struct.Struct('<I')
+
+
+def shared_prefix_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def encode_lexicon(terms):
+    ''' The lexicon of terms (utf-8 bytes, ascending) as bytes '''
+    block_offsets = bytearray()
+    data = bytearray()
+    previous = b''
+    for i, term in enumerate(terms):
+        if i % LEXICON_BLOCK == 0:
+            block_offsets += BLOCK_OFFSET.pack(len(data))
+            vbyte_encode_number(len(term), data)
+            data += term
+        else:
+            shared = shared_prefix_length(previous, term)
+            vbyte_encode_number(shared, data)
+            vbyte_encode_number(len(term) - shared, data)
+            data += term[shared:]
+        previous = term
+    return bytes(block_offsets + data)
+
+
+class Lexicon:
+    ''' Read-only view of an encoded lexicon of term_count terms at offset of buffer '''
+
+    def __init__(self, buffer, offset, term_count):
+        self._buffer = buffer
+        self.term_count = term_count
+        self.block_count = (term_count + LEXICON_BLOCK - 1) // LEXICON_BLOCK
+        self._table_offset = offset
+        self._data_offset = offset + self.block_count * BLOCK_OFFSET.size
+
+    def _block_start(self, block):
+        return self._data_offset + BLOCK_OFFSET.unpack_from(self._buffer, self._table_offset + block * BLOCK_OFFSET.size)[0]
+
+    def _first_term(self, block):
+        length, offset = vbyte_decode_number(self._buffer, self._block_start(block))
+        return self._buffer[offset:offset + length]
+
+    def _block_terms(self, block):
+        ''' The terms of block, in order '''
+        buffer = self._buffer
+        length, offset = vbyte_decode_number(buffer, self._block_start(block))
+        term = buffer[offset:offset + length]
+        offset += length
+        terms = [term]
+        for _ in range(min(LEXICON_BLOCK, self.term_count - block * LEXICON_BLOCK) - 1):
+            shared, offset = vbyte_decode_number(buffer, offset)
+            length, offset = vbyte_decode_number(buffer, offset)
+            term = term[:shared] + buffer[offset:offset + length]
+            offset += length
+            terms.append(term)
+        return terms
+
+    def _block_of(self, key):
+        ''' The last block whose first term is <= key, -1 if key is before the first term '''
+        lo, hi = 0, self.block_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._first_term(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def find(self, key):
+        ''' Term number of key (utf-8 bytes), or -1 '''
+        block = self._block_of(key)
+        if block < 0:
+            return -1
+        for i, term in enumerate(self._block_terms(block)):
+            if term == key:
+                return block * LEXICON_BLOCK + i
+            if term > key:
+                break
+        return -1
+
+    def lower_bound(self, key):
+        ''' Number of the first term >= key (term_count if there is none) '''
+        block = self._block_of(key)
+        if block < 0:
+            return 0
+        for i, term in enumerate(self._block_terms(block)):
+            if term >= key:
+                return block * LEXICON_BLOCK + i
+        return min((block + 1) * LEXICON_BLOCK, self.term_count)
+
+    def term_at(self, i):
+        return self._block_terms(i // LEXICON_BLOCK)[i % LEXICON_BLOCK]
+
+    def iter_terms(self, start=0, end=None):
+        ''' Yields (term number, term) for the term numbers start <= i < end, decoding block by block '''
+        end = self.term_count if end is None else min(end, self.term_count)
+        i = start
+        while i < end:
+            block = i // LEXICON_BLOCK
+            terms = self._block_terms(block)
+            for term in terms[i % LEXICON_BLOCK:min(len(terms), end - block * LEXICON_BLOCK)]:
+                yield i, term
+                i += 1
@@ -0,0 +1,134 @@
+import hashlib
+from segments import load_doc_entries
+
+'''
+Near-duplicate detection with MinHash and locality sensitive hashing (LSH). The feeds publish the
+same story in several sections ("top stories", "most recent", "india", ...), under another
+URL, often with a line more or less, so the indexer collapses articles whose content is nearly
+the same into the first of them.
+
+Similarity: the terms of a document (analyzed, so case, punctuation and stop words do not
+matter) are cut into overlapping shingles of SHINGLE_SIZE terms, and two documents are
+near-duplicates when the Jaccard similarity of their shingle sets is at least MIN_SIMILARITY.
+
+Signature: every shingle is hashed to 64 bits once; the hash picks one of SIGNATURE_SIZE bins and
+every bin keeps the smallest hash that fell into it (one permutation MinHash). Two documents
+have the same minimum in a bin with a probability equal to their Jaccard similarity, so the
+fraction of equal bins estimates it. Empty bins (short documents) borrow the value of the next
+non-empty bin, shifted by the distance, so they still compare like the others. Only the lowest
+8 bits of every bin are kept (b-bit MinHash): a signature is SIGNATURE_SIZE bytes, and the chance
+match of 1 in 256 per bin is corrected for.
+
+Lookup: the signature is cut into BANDS bands of ROWS bins, and every band is a hash table key.
+Documents with a high similarity agree on all bins of at least one band with high probability
+(1 - (1 - J^ROWS)^BANDS, over 0.999 at J = 0.8), unrelated ones practically never, so only the
+documents sharing a band are compared instead of all of them.
+
+Documents with fewer than MIN_SHINGLES shingles get no signature and are never collapsed, there
+is too little text to tell a duplicate from a short article that happens to be similar.
+'''
+
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 10
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+MIN_SIMILARITY = 0.8
+# odd 64 bit constant that shifts borrowed bin values, so an empty bin differs from the one it borrows from
+_EMPTY_BIN_SHIFT = 0x9E3779B97F4A7C15
+_BIN_MASK = (1 << 64) - 1
+
+
+def shingle_hashes(terms):
+    ''' 64 bit hashes of the distinct shingles of terms '''
+    return {int.from_bytes(hashlib.blake2b(" ".join(terms[i:i + SHINGLE_SIZE]).encode('utf-8'), digest_size=8).digest(), 'little')
+            for i in range(len(terms) - SHINGLE_SIZE + 1)}
+
+
+def minhash(terms):
+    ''' MinHash signature of terms as a hex string, None if there are fewer than MIN_SHINGLES shingles '''
+    hashes = shingle_hashes(terms)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    bins = [None] * SIGNATURE_SIZE
+    for h in hashes:
+        b = h % SIGNATURE_SIZE
+        if bins[b] is None or h < bins[b]:
+            bins[b] = h
+    signature = bytearray(SIGNATURE_SIZE)
+    for b in range(SIGNATURE_SIZE):
+        distance = 0
+        while bins[(b + distance) % SIGNATURE_SIZE] is None:
+            distance += 1
+        value = bins[(b + distance) % SIGNATURE_SIZE] + distance * _EMPTY_BIN_SHIFT
+        signature[b] = (value & _BIN_MASK) >> 56
+    return signature.hex()
+
+
+def similarity(signature, other):
+    ''' Estimated Jaccard similarity of the documents of two signatures '''
+    a = bytes.fromhex(signature)
+    b = bytes.fromhex(other)
+    equal = sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+    # one bin in 256 is equal by chance
+    return max(0.0, (equal - 1 / 256) / (1 - 1 / 256))
+
+
+def band_keys(signature):
+    # two hex digits per bin
+    return [signature[band * ROWS * 2:(band + 1) * ROWS * 2] for band in range(BANDS)]
+
+
+class MinHashIndex:
+    '''
+    Signatures of the canonical documents, by band. doc_id_offset is the global doc ID of the first
+    document the build being fed adds (the first doc ID of a delta segment, 0 for a full build).
+    collapsed maps the doc ID of a canonical document to the doc IDs collapsed into it (from_manifest).
+    '''
+
+    def __init__(self, doc_id_offset=0):
+        self.doc_id_offset = doc_id_offset
+        self.bands = [{} for _ in range(BANDS)]
+        self.collapsed = {}
+
+    @classmethod
+    def from_manifest(cls, manifest):
+        ''' The signatures of the live documents of a segmented index, for a delta segment behind it '''
+        near_duplicates = cls(manifest["next_doc_id"])
+        deleted = set(manifest["deleted"])
+        for segment in manifest["segments"]:
+            for entry in load_doc_entries(segment):
+                if "duplicate_of" in entry:
+                    near_duplicates.collapsed.setdefault(entry["duplicate_of"], []).append(entry["doc_id"])
+                elif entry["doc_id"] not in deleted and entry.get("minhash") is not None:
+                    near_duplicates.add(entry["minhash"], entry["doc_id"])
+        return near_duplicates
+
+    def add(self, signature, doc_id):
+        for band, key in zip(self.bands, band_keys(signature)):
+            band.setdefault(key, []).append((signature, doc_id))
+
+    def find(self, signature):
+        ''' The smallest doc ID with a similarity of at least MIN_SIMILARITY, or None '''
+        found = None
+        compared = set()
+        for band, key in zip(self.bands, band_keys(signature)):
+            for other, doc_id in band.get(key, ()):
+                if doc_id in compared:
+                    continue
+                compared.add(doc_id)
+                if similarity(signature, other) >= MIN_SIMILARITY and (found is None or doc_id < found):
+                    found = doc_id
+        return found
+
+    def canonical(self, signature, doc_id):
+        '''
+        The doc ID doc_id is a near-duplicate of, or None if it is not one, in which case it becomes
+        the canonical document of later near-duplicates. doc_id is global.
+        '''
+        if signature is None:
+            return None
+        found = self.find(signature)
+        if found is None:
+            self.add(signature, doc_id)
+        return found
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import tempfile
+import concurrent.futures
+from binary_index import BinaryIndex, write_binary_index
+from index_merge import merge_partial_indexes
+from segments import create_manifest_file, new_build_files, filter_deleted
+from create_index import (
+    source_folder, index_file, doc_table_file, doc_store_file,
+    index_source_file, list_documents, create_index_file, create_doc_table_file,
+    create_doc_store_file, collapse_near_duplicates
+)
+
+'''
+Parallel version of create_index.py.
+
+The list of documents (create_index.list_documents) is cut into contiguous shards. Every shard is indexed by a
+worker process of a process pool into its own partial index file (same binary layout as
+index.bin, doc IDs starting from 0), and the partial indexes are then combined with the
+streaming k-way merge in index_merge.py. Because shards are contiguous ranges of the same
+document list the serial build walks through, and a partial index is shifted by the
+number of documents in the shards before it, the final index.bin, doc_table.json and
+doc_store.bin are byte-identical to the ones create_index.py writes.
+
+A worker only sees its own shard, so near-duplicates are collapsed afterwards, over the
+fingerprints of all documents in doc ID order, and their postings are dropped during the merge.
+
+Usage: python3 parallel_index.py [number of workers]
+'''
+
+# shards per worker, a few small shards balance the load better than one big shard per worker
+SHARDS_PER_WORKER = 4
+
+
+def build_partial_index(filenames, partial_index_file):
+    ''' Runs in a worker process: indexes filenames into partial_index_file '''
+    postings_index = {}
+    doc_table = []
+    doc_stats = []
+    doc_records = []
+    file_hashes = {}
+    for filename in filenames:
+        index_source_file(source_folder, filename, postings_index, doc_table, doc_stats, doc_records,
+                          file_hashes=file_hashes)
+    create_index_file(postings_index, len(doc_table), partial_index_file)
+    return doc_table, doc_stats, doc_records, file_hashes
+
+
+def split_into_shards(filenames, shard_count):
+    shard_size = max(1, -(-len(filenames) // shard_count))
+    return [filenames[i:i + shard_size] for i in range(0, len(filenames), shard_size)]
+
+
+def build_index_parallel(workers):
+    filenames = list_documents(source_folder)
+    shards = split_into_shards(filenames, workers * SHARDS_PER_WORKER)
+
+    doc_table = []
+    doc_stats = []
+    doc_records = []
+    file_hashes = {}
+    doc_id_offsets = []
+    with tempfile.TemporaryDirectory(dir='.') as partial_folder:
+        partial_index_files = [os.path.join(partial_folder, f"partial_{i}.bin") for i in range(len(shards))]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(build_partial_index, shard, partial_index_file)
+                       for shard, partial_index_file in zip(shards, partial_index_files)]
+            # results are collected in shard order, which is the doc ID order
+            for future in futures:
+                shard_doc_table, shard_doc_stats, shard_doc_records, shard_file_hashes = future.result()
+                doc_id_offsets.append(len(doc_table))
+                doc_table.extend(shard_doc_table)
+                doc_stats.extend(shard_doc_stats)
+                doc_records.extend(shard_doc_records)
+                file_hashes.update(shard_file_hashes)
+
+        collapsed = collapse_near_duplicates(doc_stats, doc_records)
+        index_path, doc_table_path, doc_store_path = new_build_files(index_file, doc_table_file, doc_store_file)
+        partial_indexes = [BinaryIndex(partial_index_file) for partial_index_file in partial_index_files]
+        try:
+            merged = merge_partial_indexes([partial_index.items() for partial_index in partial_indexes], doc_id_offsets)
+            merged = filter_deleted(merged, collapsed)
+            write_binary_index(merged, len(doc_table), index_path, [stats["norm"] for stats in doc_stats],
+                               [stats["length"] for stats in doc_stats], spelling=True)
+        finally:
+            for partial_index in partial_indexes:
+                partial_index.close()
+
+    create_doc_table_file(doc_table, doc_stats, doc_table_path)
+    create_doc_store_file(doc_records, doc_store_path)
+    create_manifest_file(doc_table, source_folder, index_path, doc_table_path, doc_store_path, file_hashes)
+    return len(doc_table)
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    start_time = time.time()
+    doc_count = build_index_parallel(workers)
+    end_time = time.time()
+    print(f"build_index_parallel() indexed {doc_count} files with {workers} workers in {end_time - start_time:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
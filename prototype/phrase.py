@@ -0,0 +1,91 @@
+import re
+from postings_cursor import END
+
+'''
+Phrase and proximity queries.
+
+    "information retrieval"      the terms next to each other, in this order
+    "information retrieval"~3    the terms in this order, with at most 3 other terms in between
+
+Positions are positions in the analyzed term list of a document (stop words removed), the same
+as on the query side, so "prime minister of india" matches "prime minister india" in a document.
+
+Matching documents are found by intersecting the postings lists document-at-a-time with one
+PostingsCursor per distinct term, rarest term first: the rarest term proposes a candidate doc and
+the other cursors jump to it with next_geq, which uses the skip table to pass over whole blocks
+and binary searches inside a block. Whenever a cursor overshoots, its doc becomes the next
+candidate. So the work follows the postings of the rarest term, not those of the most common one.
+
+Positions are only decoded for the blocks of documents that contain all the terms, and the
+position lists of a candidate are checked with a single linear merge (match_positions).
+'''
+
+PHRASE_QUERY = re.compile(r'^"([^"]*)"(?:~(\d+))?$')
+
+
+def parse_phrase_query(query):
+    ''' Returns (phrase text, slop) for "..." and "..."~N queries, None for anything else '''
+    match = PHRASE_QUERY.match(query.strip())
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2) or 0)
+
+
+def match_positions(position_lists, slop=0):
+    '''
+    True if the sorted position lists contain positions p0 < p1 < ... in list order with at most
+    slop positions in between all of them, i.e. p_last - p0 - (len(position_lists) - 1) <= slop.
+    For every p0 the smallest following position of each next list gives the shortest span, and
+    those next positions only move forward as p0 grows, so every list is walked once.
+    '''
+    pointers = [0] * len(position_lists)
+    max_span = len(position_lists) - 1 + slop
+    for start in position_lists[0]:
+        previous = start
+        for i in range(1, len(position_lists)):
+            positions = position_lists[i]
+            pointer = pointers[i]
+            while pointer < len(positions) and positions[pointer] <= previous:
+                pointer += 1
+            pointers[i] = pointer
+            if pointer == len(positions):
+                # no later occurrence of this term for this or any following start
+                return False
+            previous = positions[pointer]
+            if previous - start > max_span:
+                break
+        else:
+            return True
+    return False
+
+
+def phrase_docs(terms, postings_index, slop=0):
+    '''
+    Doc IDs (ascending) of the documents containing terms as a phrase, or within slop of it.
+    postings_index is a SegmentedIndex or BinaryIndex.
+    '''
+    if not terms:
+        return []
+    distinct_terms = list(dict.fromkeys(terms))
+    cursors = {term: postings_index.cursor(term) for term in distinct_terms}
+    if any(cursor.doc == END for cursor in cursors.values()):
+        # a term that is not in the index matches no document
+        return []
+    by_rarity = sorted(cursors.values(), key=lambda cursor: cursor.doc_freq)
+    lead, others = by_rarity[0], by_rarity[1:]
+
+    docs = []
+    while lead.doc != END:
+        candidate = lead.doc
+        for cursor in others:
+            cursor.next_geq(candidate)
+            if cursor.doc != candidate:
+                break
+        else:
+            if match_positions([cursors[term].positions() for term in terms], slop):
+                docs.append(candidate)
+            lead.next()
+            continue
+        # a cursor overshot the candidate (or ran out): no document before its doc has all terms
+        lead.next_geq(cursor.doc)
+    return docs
@@ -0,0 +1,190 @@
+import sys
+import time
+import queue
+import threading
+from crawler import crawl
+from extraction import load_sites, site_feeds
+from create_index import index_document, COLLAPSE_NEAR_DUPLICATES
+from near_duplicates import MinHashIndex
+from incremental_index import add_delta_segment
+from article_log import ArticleLogWriter
+from segments import read_manifest, write_manifest, start_background_merge, manifest_lock
+
+'''
+Streaming crawl-to-index pipeline. Instead of saving every article as a file in source_files and
+indexing the files afterwards (crawler.py, then incremental_index.py), scraped articles flow
+
+    crawler threads --> bounded queue --> indexer thread -+-> in-memory delta --> delta segment
+                                                         +-> article log (article_log.py)
+
+The indexer thread analyzes every article as soon as it comes out of the queue, appends it to the
+article log and adds it to an in-memory delta (postings, doc stats, doc store records). The delta
+is written as a delta segment and published in segments.json when it holds FLUSH_DOCS articles,
+or FLUSH_INTERVAL seconds after its oldest article arrived, so an article is searchable (the
+query server picks up the new generation within its reload interval) seconds after it was
+scraped, instead of after the whole crawl plus an incremental update. The merge policy compacts
+the small segments in the background.
+
+Near-duplicates of indexed articles (the same story in several feeds) are collapsed as in a full
+build, see create_index.py.
+
+The queue holds at most QUEUE_SIZE articles: when indexing falls behind, the crawler threads block
+instead of piling articles up in memory.
+
+Needs an index to add to, run create_index.py first.
+Usage: python3 pipeline.py [seconds between crawls]   (without it, crawls all sites of sites.json once)
+'''
+
+QUEUE_SIZE = 256
+FLUSH_DOCS = 100
+# seconds
+FLUSH_INTERVAL = 5.0
+
+
+class StreamingIndexer:
+    '''
+    Indexer thread of the pipeline: put(url, title, content, published) queues an article, close() flushes the
+    rest and stops the thread. Articles are appended to log_writer, which stays open.
+    '''
+
+    def __init__(self, log_writer, flush_docs=FLUSH_DOCS, flush_interval=FLUSH_INTERVAL):
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.log_writer = log_writer
+        self.flush_docs = flush_docs
+        self.flush_interval = flush_interval
+        self.indexed = 0
+        self.segments_written = 0
+        # (queued time, published time) of every article, for freshness statistics
+        self.latencies = []
+        self.error = None
+        self.near_duplicates = None
+        if COLLAPSE_NEAR_DUPLICATES:
+            manifest = read_manifest()
+            if manifest is None:
+                raise RuntimeError("segments.json not found, run create_index.py first")
+            self.near_duplicates = MinHashIndex.from_manifest(manifest)
+        self._reset_delta()
+        self.thread = threading.Thread(target=self._run, name="streaming-indexer")
+        self.thread.start()
+
+    def _reset_delta(self):
+        self.postings_index = {}
+        self.doc_table = []
+        self.doc_stats = []
+        self.doc_records = []
+        self.queued_times = []
+
+    def put(self, url, title, content, published=None):
+        ''' Queues an article, blocks while the queue is full. Returns True (a crawler sink) '''
+        article = {"url": url, "title": title, "content": content}
+        if published:
+            article["published"] = published
+        item = (article, time.time())
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"indexer thread failed: {self.error}")
+            try:
+                self.queue.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                continue
+
+    def _run(self):
+        try:
+            self._index_articles()
+        except Exception as e:
+            # put() raises instead of waiting forever for a thread that is gone
+            self.error = e
+            raise
+
+    def _index_articles(self):
+        while True:
+            timeout = None
+            if self.queued_times:
+                timeout = max(0.0, self.queued_times[0] + self.flush_interval - time.time())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                # the oldest article of the delta waited FLUSH_INTERVAL
+                self.flush()
+                continue
+            if item is None:
+                self.flush()
+                return
+            article, queued_time = item
+            name = self.log_writer.append(article)
+            index_document(article, name, self.postings_index, self.doc_table, self.doc_stats, self.doc_records,
+                           self.near_duplicates)
+            self.queued_times.append(queued_time)
+            self.indexed += 1
+            if len(self.doc_table) >= self.flush_docs:
+                self.flush()
+
+    def flush(self):
+        ''' Writes the delta as a segment and publishes it, called from the indexer thread only '''
+        if not self.doc_table:
+            return
+        with manifest_lock:
+            manifest = read_manifest()
+            if manifest is None:
+                raise RuntimeError("segments.json not found, run create_index.py first")
+            shifted = self.near_duplicates is not None and manifest["next_doc_id"] != self.near_duplicates.doc_id_offset
+            if shifted:
+                # another writer added documents since the delta was started: canonical doc IDs
+                # inside the delta move along with it
+                shift = manifest["next_doc_id"] - self.near_duplicates.doc_id_offset
+                for stats in self.doc_stats:
+                    if stats.get("duplicate_of", -1) >= self.near_duplicates.doc_id_offset:
+                        stats["duplicate_of"] += shift
+            add_delta_segment(manifest, self.postings_index, self.doc_table, self.doc_stats, self.doc_records)
+            manifest["generation"] += 1
+            write_manifest(manifest)
+            if shifted:
+                self.near_duplicates = MinHashIndex.from_manifest(manifest)
+            elif self.near_duplicates is not None:
+                self.near_duplicates.doc_id_offset = manifest["next_doc_id"]
+        published = time.time()
+        self.latencies.extend((queued_time, published) for queued_time in self.queued_times)
+        self.segments_written += 1
+        self._reset_delta()
+        start_background_merge()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+        self.thread.join()
+
+
+def run_pipeline(feeds, log_writer, **crawl_args):
+    ''' One crawl of feeds through a StreamingIndexer, returns (crawl stats, indexer) '''
+    indexer = StreamingIndexer(log_writer)
+    try:
+        stats = crawl(feeds, sink=indexer.put, **crawl_args)
+    finally:
+        indexer.close()
+    return stats, indexer
+
+
+def main():
+    interval = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    if read_manifest() is None:
+        print("segments.json not found, run create_index.py first")
+        raise SystemExit(1)
+    feeds = site_feeds(load_sites())
+    log_writer = ArticleLogWriter()
+    try:
+        while True:
+            start_time = time.time()
+            stats, indexer = run_pipeline(feeds, log_writer)
+            end_time = time.time()
+            print(stats)
+            print(f"indexed {indexer.indexed} articles into {indexer.segments_written} segments in {end_time - start_time:.2f} seconds.")
+            if interval is None:
+                break
+            time.sleep(interval)
+    finally:
+        log_writer.close()
+
+
+if __name__ == "__main__":
+    main()
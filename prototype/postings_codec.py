@@ -0,0 +1,208 @@
+'''
+Compression of postings lists.
+
+Doc IDs are dense integers (see doc_table.json) and every postings list is sorted by
+doc ID, so instead of the IDs themselves we store the gaps between consecutive IDs.
+Positions inside a document are sorted as well and are gap encoded the same way.
+Gaps are small numbers, which is exactly what variable-byte (VByte) encoding is good at:
+every byte carries 7 bits of the number, and the high bit tells whether more bytes follow.
+So a gap below 128 takes a single byte instead of the 4 bytes of a packed int or the
+several characters of the old text format.
+
+A postings list is cut into blocks of BLOCK_SIZE documents:
+
+    block count
+    skip table, one entry per block: last doc ID of the block (gap to the previous
+                                     block's last doc ID), byte length of the block
+    blocks, each one holding:
+        doc ID gaps (the first one relative to the previous block's last doc ID)
+        term frequencies
+        positions of every document, gap encoded per document
+
+The skip table lets a reader jump straight to the block that can contain a given doc ID,
+and inside a block the positions come last, so a reader that only needs doc IDs and term
+frequencies can stop decoding before them. Decoding always works on one block at a time.
+'''
+
+from itertools import accumulate
+
+BLOCK_SIZE = 128
+
+
+def vbyte_encode_number(number, out):
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def vbyte_encode(numbers, out):
+    ''' Appends the VByte encoding of every number to the bytearray out '''
+    for number in numbers:
+        while number >= 0x80:
+            out.append((number & 0x7F) | 0x80)
+            number >>= 7
+        out.append(number)
+
+
+def vbyte_decode_number(buffer, offset):
+    ''' Returns (number, offset just past it) '''
+    number = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+
+def vbyte_decode(buffer, offset, count):
+    ''' Decodes count numbers starting at offset, returns (numbers, offset just past them) '''
+    # fast path: when all count numbers fit in a single byte the bytes are the numbers
+    chunk = buffer[offset:offset + count]
+    if len(chunk) == count and (count == 0 or max(chunk) < 0x80):
+        return list(chunk), offset + count
+    numbers = []
+    append = numbers.append
+    number = 0
+    shift = 0
+    while count:
+        byte = buffer[offset]
+        offset += 1
+        if byte < 0x80:
+            append(number | (byte << shift))
+            number = 0
+            shift = 0
+            count -= 1
+        else:
+            number |= (byte & 0x7F) << shift
+            shift += 7
+    return numbers, offset
+
+
+def vbyte_skip(buffer, offset, count):
+    ''' Offset just past the count numbers starting at offset, without decoding them '''
+    chunk = buffer[offset:offset + count]
+    if len(chunk) == count and (count == 0 or max(chunk) < 0x80):
+        return offset + count
+    while count:
+        if buffer[offset] < 0x80:
+            count -= 1
+        offset += 1
+    return offset
+
+
+def delta_encode(sorted_numbers, base=0):
+    gaps = []
+    previous = base
+    for number in sorted_numbers:
+        gaps.append(number - previous)
+        previous = number
+    return gaps
+
+
+def delta_decode(gaps, base=0):
+    numbers = list(accumulate(gaps, initial=base))
+    del numbers[0]
+    return numbers
+
+
+def encode_postings(postings_list):
+    '''
+    Encodes [[doc_id, [pos, pos, ...]], ...] (sorted by doc_id) into the block layout
+    described above.
+    '''
+    skip_table = bytearray()
+    blocks = bytearray()
+    previous_last_doc = 0
+    block_count = 0
+    for start in range(0, len(postings_list), BLOCK_SIZE):
+        block_postings = postings_list[start:start + BLOCK_SIZE]
+        doc_ids = [posting[0] for posting in block_postings]
+        block = bytearray()
+        vbyte_encode(delta_encode(doc_ids, previous_last_doc), block)
+        vbyte_encode([len(posting[1]) for posting in block_postings], block)
+        for posting in block_postings:
+            vbyte_encode(delta_encode(posting[1]), block)
+        vbyte_encode_number(doc_ids[-1] - previous_last_doc, skip_table)
+        vbyte_encode_number(len(block), skip_table)
+        blocks += block
+        previous_last_doc = doc_ids[-1]
+        block_count += 1
+
+    record = bytearray()
+    vbyte_encode_number(block_count, record)
+    record += skip_table
+    record += blocks
+    return bytes(record)
+
+
+def decode_skip_table(buffer, offset):
+    '''
+    Returns (last_doc_ids, block_offsets) for the postings record starting at offset.
+    block_offsets[i] is where block i starts in buffer.
+    '''
+    block_count, offset = vbyte_decode_number(buffer, offset)
+    entries, offset = vbyte_decode(buffer, offset, 2 * block_count)
+    last_doc_ids = delta_decode(entries[0::2])
+    block_offsets = []
+    for block_length in entries[1::2]:
+        block_offsets.append(offset)
+        offset += block_length
+    return last_doc_ids, block_offsets
+
+
+def block_length(doc_count, block_no):
+    ''' Number of documents in block block_no of a postings list with doc_count documents '''
+    return min(BLOCK_SIZE, doc_count - block_no * BLOCK_SIZE)
+
+
+def decode_block(buffer, offset, base_doc, count, with_positions=True):
+    '''
+    Decodes one block of count documents whose doc ID gaps are relative to base_doc
+    (the last doc ID of the previous block, 0 for the first block).
+    Returns (doc_ids, term_frequencies, positions); positions is None unless with_positions.
+    '''
+    gaps, offset = vbyte_decode(buffer, offset, count)
+    doc_ids = delta_decode(gaps, base_doc)
+    term_frequencies, offset = vbyte_decode(buffer, offset, count)
+    if not with_positions:
+        return doc_ids, term_frequencies, None
+    # the position gaps of all documents of the block are decoded in one go and then split
+    position_gaps, offset = vbyte_decode(buffer, offset, sum(term_frequencies))
+    positions = []
+    start = 0
+    for term_frequency in term_frequencies:
+        end = start + term_frequency
+        positions.append(list(accumulate(position_gaps[start:end])))
+        start = end
+    return doc_ids, term_frequencies, positions
+
+
+def decode_document_positions(buffer, offset, term_frequencies, i):
+    '''
+    Positions of the i-th document of the block at offset, whose term frequencies are known,
+    skipping over the rest of the block instead of decoding it
+    '''
+    offset = vbyte_skip(buffer, offset, 2 * len(term_frequencies) + sum(term_frequencies[:i]))
+    gaps, _ = vbyte_decode(buffer, offset, term_frequencies[i])
+    return list(accumulate(gaps))
+
+
+def iter_blocks(buffer, offset, doc_count, with_positions=True):
+    ''' Yields decode_block results for every block of the postings record at offset '''
+    last_doc_ids, block_offsets = decode_skip_table(buffer, offset)
+    base_doc = 0
+    for block_no, block_offset in enumerate(block_offsets):
+        yield decode_block(buffer, block_offset, base_doc, block_length(doc_count, block_no), with_positions)
+        base_doc = last_doc_ids[block_no]
+
+
+def decode_postings(buffer, offset, doc_count):
+    ''' Decodes a whole postings record back into [[doc_id, [pos, ...]], ...] '''
+    postings_list = []
+    for doc_ids, _, positions in iter_blocks(buffer, offset, doc_count):
+        postings_list.extend([doc_id, doc_positions] for doc_id, doc_positions in zip(doc_ids, positions))
+    return postings_list
@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from postings_codec import decode_skip_table, decode_block, decode_document_positions, block_length
+
+'''
+Document-at-a-time access to a postings list.
+
+A cursor points at one posting at a time (doc, tf) and only moves forward:
+next() goes to the following posting, next_geq(target) to the first posting whose doc ID is
+>= target. next_geq uses the skip table of the postings record (the last doc ID of every block)
+to jump over whole blocks without decoding them, which is what makes dynamic pruning and
+intersections cheaper than decoding every posting.
+
+A cursor can span several postings records ("parts"), e.g. the same term in every segment
+of a SegmentedIndex. Parts must be in ascending doc ID order, and tombstoned doc IDs in deleted
+are skipped. Once the cursor is exhausted doc is END.
+
+Positions are only decoded on request (positions()): the first request in a block decodes the
+positions of the current document only, skipping over the others (snippets want one document
+per block), a second one decodes the positions of the whole block (phrase matching reads many).
+
+decoded counts the postings of the blocks that were actually decoded, skipped_blocks the blocks
+that were jumped over.
+'''
+
+END = float('inf')
+
+# next_geq over a list of candidate docs pays off once the postings list is at least SKIP_RATIO
+# times longer than the candidates, below that decoding it block by block is cheaper
+SKIP_RATIO = 4
+
+
+class PostingsCursor:
+
+    def __init__(self, parts, deleted=frozenset()):
+        ''' parts is a list of (buffer, postings record offset, document frequency) '''
+        self.parts = parts
+        self.deleted = deleted
+        self.doc_freq = sum(part[2] for part in parts)
+        self.doc = -1
+        self.tf = 0
+        self.decoded = 0
+        self.skipped_blocks = 0
+        self._part_no = -1
+        self._block_no = -1
+        self._block_docs = []
+        self._block_tfs = []
+        self._block_positions = None
+        self._block_position_reads = 0
+        self._i = 0
+        self._open_part(0)
+        self.next()
+
+    def _open_part(self, part_no):
+        self._part_no = part_no
+        self._block_no = -1
+        self._block_docs = []
+        self._block_tfs = []
+        self._i = 0
+        if part_no < len(self.parts):
+            buffer, offset, doc_freq = self.parts[part_no]
+            self._buffer = buffer
+            self._doc_freq = doc_freq
+            self._last_doc_ids, self._block_offsets = decode_skip_table(buffer, offset)
+            return True
+        self._last_doc_ids, self._block_offsets = [], []
+        return False
+
+    def _load_block(self, block_no):
+        base_doc = self._last_doc_ids[block_no - 1] if block_no > 0 else 0
+        count = block_length(self._doc_freq, block_no)
+        self._block_docs, self._block_tfs, _ = decode_block(self._buffer, self._block_offsets[block_no], base_doc, count, with_positions=False)
+        self._block_positions = None
+        self._block_position_reads = 0
+        self._block_no = block_no
+        self._i = 0
+        self.decoded += count
+
+    def _settle(self):
+        ''' Moves to the first live posting at or after the current in-block position '''
+        while True:
+            if self._i < len(self._block_docs):
+                doc = self._block_docs[self._i]
+                if doc in self.deleted:
+                    self._i += 1
+                    continue
+                self.doc = doc
+                self.tf = self._block_tfs[self._i]
+                return
+            if self._block_no + 1 < len(self._block_offsets):
+                self._load_block(self._block_no + 1)
+            elif not self._open_part(self._part_no + 1):
+                self.doc = END
+                self.tf = 0
+                return
+
+    def next(self):
+        if self.doc == END:
+            return
+        if self._block_docs:
+            self._i += 1
+        self._settle()
+
+    def next_geq(self, target):
+        ''' Moves to the first posting with doc >= target '''
+        if self.doc >= target:
+            return
+        while self._part_no < len(self.parts):
+            if self._last_doc_ids and self._last_doc_ids[-1] >= target:
+                break
+            # target is past this whole part
+            self.skipped_blocks += len(self._block_offsets) - self._block_no - 1
+            self._open_part(self._part_no + 1)
+        else:
+            self.doc = END
+            self.tf = 0
+            return
+
+        if self._block_no < 0 or self._last_doc_ids[self._block_no] < target:
+            block_no = bisect_left(self._last_doc_ids, target, self._block_no + 1)
+            self.skipped_blocks += block_no - self._block_no - 1
+            self._load_block(block_no)
+            self._i = bisect_left(self._block_docs, target)
+        else:
+            self._i = bisect_left(self._block_docs, target, self._i)
+        self._settle()
+
+    def positions(self):
+        ''' Sorted positions of the term in the current document '''
+        if self._block_positions is None:
+            block_no = self._block_no
+            self._block_position_reads += 1
+            if self._block_position_reads == 1:
+                return decode_document_positions(self._buffer, self._block_offsets[block_no], self._block_tfs, self._i)
+            base_doc = self._last_doc_ids[block_no - 1] if block_no > 0 else 0
+            count = block_length(self._doc_freq, block_no)
+            _, _, self._block_positions = decode_block(self._buffer, self._block_offsets[block_no], base_doc, count)
+        return self._block_positions[self._i]
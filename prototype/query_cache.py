@@ -0,0 +1,124 @@
+import time
+import threading
+from collections import OrderedDict
+
+'''
+Caches of the query side, both bounded and least recently used first out.
+
+QueryCache: the results of whole queries. Headline queries repeat a lot, and a repeat only costs
+a query analysis and a dictionary lookup instead of postings lookups, ranking and snippets.
+Queries are keyed on their analyzed form (query type, terms, slop or boolean structure) plus k,
+so "Prime Minister" and "prime ministers" share an entry. Every entry is tied to the index
+generation it was computed on: when a lookup comes with a new generation (a build, an incremental
+update or a merge was published) the whole cache is dropped. Entries also expire after
+QUERY_CACHE_TTL seconds.
+
+The postings cache of SegmentedIndex (and BinaryIndex) is an LRUCache as well, bounded by the
+number of postings it holds rather than by the number of terms, so that a few very common terms
+can not push it beyond POSTINGS_CACHE_SIZE.
+
+Both are thread safe, the query server runs queries from several threads on one index.
+'''
+
+# number of query results kept
+QUERY_CACHE_SIZE = 1000
+# seconds a cached query result is served, None keeps it until it is evicted or the index changes
+QUERY_CACHE_TTL = 300.0
+# postings (summed over the cached terms) kept decoded per index
+POSTINGS_CACHE_SIZE = 1000000
+
+
+class LRUCache:
+    ''' Map bounded by the summed cost of its values, evicting least recently used entries first '''
+
+    def __init__(self, max_cost, ttl=None):
+        self.max_cost = max_cost
+        self.ttl = ttl
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, cost=1):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if cost > self.max_cost:
+                # would evict everything else and still not fit
+                return
+            self._entries[key] = (value, cost, time.monotonic())
+            self.cost += cost
+            while self.cost > self.max_cost:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, cost, _ = self._entries.pop(key)
+        self.cost -= cost
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.cost = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "cost": self.cost,
+            "max_cost": self.max_cost,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class QueryCache:
+    ''' Query results per index generation, see above '''
+
+    def __init__(self, max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.results = LRUCache(max_size, ttl)
+        self.generation = None
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation):
+        with self._lock:
+            if generation != self.generation:
+                if len(self.results):
+                    self.invalidations += 1
+                self.results.clear()
+                self.generation = generation
+
+    def get(self, generation, key):
+        ''' The cached results of the query key on index generation generation, or None '''
+        self._check_generation(generation)
+        return self.results.get(key)
+
+    def put(self, generation, key, results):
+        # a query that was still running on the previous index when a new one was swapped in
+        if generation != self.generation:
+            return
+        self.results.put(key, results)
+
+    def stats(self):
+        return {**self.results.stats(), "generation": self.generation, "invalidations": self.invalidations}
@@ -1,302 +1,429 @@
-from porter2stemmer import Porter2Stemmer
-import json
-import os
-import math
-from nltk.tokenize import RegexpTokenizer
-from nltk.corpus import stopwords
+import html
 import time
-import concurrent.futures
+import heapq
+from segments import open_index
+from analyzer import analyze
+from topk import wand_top_k, BOUND_SLACK
+from phrase import parse_phrase_query, phrase_docs
+from postings_cursor import END, SKIP_RATIO
+from boolean_query import is_boolean_query, has_wildcard, parse_query, positive_terms, evaluate, wildcard_expander
+from snippets import query_term_positions, decode_offsets, make_snippet
+from scoring import get_scorer
+from spelling import SpellingCorrector
+from recency import recency_factor, format_date, RECENCY_CACHE_SECONDS
 
-# documents list for user input
-docs=set()
+# print how long every step of a query took, the query server turns this off
+VERBOSE = True
 # percentage multiplier for rank docs' scores
 # eg, if results contain 10 docs with scores 1-10, the result list will
 # contain docs with ranks >= 6 only
 RANK_THRESHOLD_FOR_SEARCH = 0.6
+# number of results of the command line search, one word queries and OR free text queries only
+# score the documents that can make it into the top k (see topk.py). None returns every match
+TOP_K = 10
+# how words without an operator in between are combined: "AND" (every word has to match) or
+# "OR" (any word matches, the union that free text queries used to be)
+DEFAULT_OPERATOR = "AND"
+# search the nearest indexed terms instead of query terms that are not in the index (see spelling.py)
+SPELLING_CORRECTION = True
+# result orders of search: by score, or newest first
+ORDERS = ("relevance", "date")
 
-# creating the index in memory
+def print_timing(name, start_time):
+    if VERBOSE:
+        end_time = time.time()
+        print(f"{name} took {end_time - start_time:.6f} seconds.")
+
+# opening the index (base + delta segments), postings are only decoded for the terms that are looked up
 def create_index_from_file(filename):
     start_time = time.time()
-    postings_index = {}
-    try:
-        with open(filename, 'r') as file:
-            # Iterate over each line in the file
-            for line in file:
-                term, postings_str = line.strip().split('|')
-                postings_list = []
-                # Split postings list by ';'
-                for posting in postings_str.split(';'):
-                    docID, positions_str = posting.split(':')
-                    positions = [int(pos) for pos in positions_str.split(',')]
-                    postings_list.append([docID, positions])
-                postings_index[term] = postings_list
-        print("Index created successfully!")
-        end_time = time.time()
-        print(f"create_index_from_file took {end_time - start_time:.6f} seconds.")
-        return postings_index
-    except IOError as e:
-        print(f"Error reading file: {e}")
-        return None
+    postings_index = open_index(filename)
+    if postings_index is not None and VERBOSE:
+        print("Index opened successfully!")
+    print_timing("create_index_from_file", start_time)
+    return postings_index
 
 '''
 Query Types
-Let's first remember the query types. Our search engine is going to answer 3 types of queries that we generally use while searching.
+Let's first remember the query types. Our search engine is going to answer 4 types of queries that we generally use while searching.
 1) One Word Queries (OWQ): OWQ consist of only a single word. Such as computer, or university. The matching documents are the ones containing the single query term.
-2) Free Text Queries (FTQ): FTQ contain sequence of words separated by space like an actual sentence. Such as computer science, or Brown University. The matching documents are the ones that contain any of the query terms.
+2) Free Text Queries (FTQ): FTQ contain sequence of words separated by space like an actual sentence. Such as computer science, or Brown University.
 3) Phrase Queries (PQ): PQ also contain sequence of words just like FTQ, but they are typed within double quotes. The meaning is, we want to see all query terms in the matching documents, and exactly in the order specified. Such as “Turing Award”, or “information retrieval and web search”.
+   Followed by ~N, e.g. "information retrieval"~3, the terms only have to be in order with at most N other terms in between (proximity query).
+4) Boolean Queries (BQ): words and phrases combined with AND, OR, NOT and parentheses, such as india AND (cricket OR hockey) NOT pakistan. See boolean_query.py.
+   A query of negations only, such as NOT film, matches every document without the negated terms; none of them has a query term to score, so they are all returned with score 0, in doc ID order.
+5) Wildcard Queries (WQ): words ending in *, such as elect* or india elect*. The wildcard matches every index term starting with the word (election, elector, electr...), the other words are combined with it like in a FTQ.
+The words of a FTQ are combined with DEFAULT_OPERATOR, so by default the matching documents are the ones that contain all of the query terms.
 '''
 def determine_query_type(query):
-    if '"' in query and query.count('"') == 2 and query[0] == '"' and query[-1] == '"':
+    if parse_phrase_query(query) is not None:
         return 'PQ'  # Phrase Query
+    elif is_boolean_query(query):
+        return 'BQ'  # Boolean Query
+    elif has_wildcard(query):
+        return 'WQ'  # Wildcard Query
     elif ' ' in query:
         return 'FTQ'  # Free Text Query
     else:
         return 'OWQ'  # One Word Query
     
-def get_query_from_user():
-    tokenizer = RegexpTokenizer(r'\w+')
-    stemmer = Porter2Stemmer()  
+def analyze_query(user_input):
     '''
     The transformations performed on words of the collection, such as stemming, lowercasing, removing stopwords, 
     and eliminating non-alphanumeric characters will be performed on the query as well. 
     So, querying for computer or Computer is basically the same.
+    Both sides use analyzer.analyze for this, so they can not drift apart.
     '''
-    # get input from the user
-    user_input = input("Search: ")
     start_time = time.time()
     # determine the query type
     query_type = determine_query_type(user_input)
-    # lower case the strings
-    text = user_input.lower()
-    # # Get all tokens, where a token is a string of alphanumeric characters terminated by a non-alphanumeric character.
-    tokens_list = tokenizer.tokenize(text)
-    # Remove all the english stop words such as 'a', 'an', 'the' etc
-    filtered_tokens_list = [word for word in tokens_list if word not in stopwords.words('english')]
-    # stem the filtered token list
-    stemmed_list = [stemmer.stem(word) for word in filtered_tokens_list]
-    end_time = time.time()
-    print(f"get_query_from_user took {end_time - start_time:.6f} seconds.")
+    if query_type == 'PQ':
+        # the ~N of a proximity query is not a term
+        user_input, _ = parse_phrase_query(user_input)
+    # lower case, tokenize, remove the english stop words and stem
+    stemmed_list = analyze(user_input)
+    print_timing("analyze_query", start_time)
     return stemmed_list, query_type
 
-def get_docs_list_for_owq_and_ftq(terms, docs):
+def get_docs_list_for_owq_and_ftq(terms, docs, postings_index):
     start_time = time.time()
     # It’s like evaluating a OWQ for every query term, and taking the union of the results
     for term in terms:
-        try:
-            termDocs=[posting[0] for posting in postings_index[term]]
+        # only doc IDs are needed here, so the positions are never decoded
+        for doc_ids, _, _ in postings_index.blocks(term, with_positions=False):
             # take a union of all the matching docs
-            docs |= set(termDocs)
-        except:
-            #term is not in index
-            pass
-    end_time = time.time()
-    print(f"get_docs_list_for_owq_and_ftq took {end_time - start_time:.6f} seconds.")
+            docs.update(doc_ids)
+    print_timing("get_docs_list_for_owq_and_ftq", start_time)
     return list(docs)
 
-def get_docs_list_for_pq(terms, docs):
+def get_docs_list_for_pq(terms, postings_index, slop=0):
+    '''
+    Documents containing the terms as a phrase (or within slop of it), see phrase.py: the postings
+    lists are intersected rarest term first with skips, so the cost follows the rarest term.
+    '''
     start_time = time.time()
-    for term in terms:
-        try:
-            termDocs=[posting[0] for posting in postings_index[term]]
-            if len(docs) == 0:
-                docs = set(termDocs)
-            else:
-                # take an intersection of all the matching docs
-                docs &= set(termDocs)
-        except:
-            #term is not in index
-            pass
-    docs = list(docs)
-    result = []
-    # now check if the order is correct or not
-    for doc in docs:
-        query_term_position_list = []
-        for term in terms:
-            try:
-                postings_list = postings_index[term]
-                for posting in postings_list:
-                    if posting[0] == doc:
-                        query_term_position_list.append(posting[1])
-            except:
-                pass
-        # print("query term position list", query_term_position_list)
-        # perform subtractions
-        query_term_position_list_after_sub = []
-        for i, sublist in enumerate(query_term_position_list):
-            new_sublist = []
-            for x in sublist:
-                new_element = x - i
-                new_sublist.append(new_element)
-            query_term_position_list_after_sub.append(new_sublist)
-
-        # print("query term position list after subtraction", query_term_position_list_after_sub)
-        # Convert each sublist into a set
-        sets = [set(sublist) for sublist in query_term_position_list_after_sub]
-
-        # Find the intersection of all sets
-        list_intersection = set.intersection(*sets)
-        if len(list_intersection) != 0:
-            result.append(doc)
-    end_time = time.time()
-    print(f"get_docs_list_for_pq took {end_time - start_time:.6f} seconds.")
+    result = phrase_docs(terms, postings_index, slop)
+    print_timing("get_docs_list_for_pq", start_time)
     return result
 
-def get_doc_vector_space():
+def get_docs_list_for_bq(query, postings_index):
+    ''' Documents matching a parsed boolean query, cheapest operands of a conjunction first '''
     start_time = time.time()
-    try:
-        with open("doc_vector_space.txt", 'r') as file:
-            data = json.load(file)
-            end_time = time.time()
-            print(f"get_doc_vector_space took {end_time - start_time:.6f} seconds.")
-            return data
-    except:
-        print("Error fetching total terms per file")
-
-def rank_documents(terms, docs):
+    result = evaluate(query, postings_index)
+    print_timing("get_docs_list_for_bq", start_time)
+    return result
+
+def rank_documents(terms, docs, postings_index, scorer=None):
+    '''
+    Score of every doc in docs: the sum over the query terms of the term's weight in the doc, as
+    given by scorer (see scoring.py, BM25 or TF-IDF; the default scorer of the index if None).
+
+    Scores are accumulated term-at-a-time: the postings list of each query term is walked once,
+    block by block and without decoding positions, the weights of a whole block are computed at
+    once and the weight of every candidate doc in it is added to that doc's accumulator. The term
+    frequency is stored in every posting and the IDF is computed once per term, so ranking costs
+    O(postings of the query terms) instead of a scan of the postings list per term per candidate doc.
+    When there are far fewer candidates than postings of a term (conjunctive, boolean and phrase queries)
+    a cursor jumps from candidate to candidate instead, and only decodes the blocks holding them.
+    '''
     start_time = time.time()
     # return empty list, if docs length is 0
     if len(docs) == 0:
         return []
-    
-    doc_rank_map = {}
+
+    document_scores = score_documents(terms, docs, postings_index, scorer)
+    # Drop the documents below the threshold first, so only the survivors have to be sorted
+    above_threshold = apply_rank_threshold(document_scores.items())
+    # Sort documents based on combined scores in descending order
+    sorted_documents = sorted(above_threshold, key=lambda x: x["score"], reverse=True)
+    print_timing("rank_documents", start_time)
+    return sorted_documents
+
+def score_documents(terms, docs, postings_index, scorer=None):
+    '''
+    doc -> score of the docs in docs that contain a query term, accumulated as described in rank_documents.
+    If none of them does (a query of negations only, such as NOT film), every doc in docs scores 0.
+    '''
+    if scorer is None:
+        scorer = get_scorer(postings_index)
+    candidates = set(docs)
+    sorted_candidates = None
+    # doc -> score accumulator, doc IDs are sparse (deletes, merges), so a dict rather than a dense array
     document_scores = {}
-    for doc in docs:
-        rank_meta_data = {}
-        normalized_term_freq = []
-        inverse_doc_freq = []
-        for term in terms:
-            # calculate Normalized term frequency(TF) for all the terms
-            # get the total no of terms in the doc
-            total_terms = doc_vector_space_map[doc]
-            # get the term frequency,  in this doc
-            if term not in postings_index:
-                continue
-            list_of_docs_for_term = postings_index[term]
-            # print("list of docs for term", doc, term, list_of_docs_for_term)
-            # term_freq_for_doc = len([element for element in list_of_docs_for_term if element[0] == doc])
-            term_freq_for_doc = 0
-            for doc_and_freq in list_of_docs_for_term:
-                if doc_and_freq[0] == doc:
-                    term_freq_for_doc = len(doc_and_freq[1])
+    get_score = document_scores.get
+    for term in terms:
+        IDF = scorer.idf(term)
+        if IDF is None:
+            # term is not in index
+            continue
+        if len(candidates) * SKIP_RATIO < postings_index.document_frequency(term):
+            # far fewer candidates than postings (conjunctions, phrases): skip from candidate to candidate
+            if sorted_candidates is None:
+                sorted_candidates = sorted(candidates)
+            cursor = postings_index.cursor(term)
+            for doc in sorted_candidates:
+                cursor.next_geq(doc)
+                if cursor.doc == END:
                     break
+                if cursor.doc == doc:
+                    document_scores[doc] = get_score(doc, 0) + scorer.weight(cursor.tf, doc, IDF)
+            continue
+        for doc_ids, term_freqs, _ in postings_index.blocks(term, with_positions=False):
+            for doc, weight in zip(doc_ids, scorer.block_weights(doc_ids, term_freqs, IDF)):
+                if doc in candidates:
+                    document_scores[doc] = get_score(doc, 0) + weight
+    if not document_scores:
+        return dict.fromkeys(docs, 0)
+    return document_scores
+
+def apply_rank_threshold(ranked):
+    ''' Keeps the (doc, score) pairs scoring at least RANK_THRESHOLD_FOR_SEARCH times the best score '''
+    if len(ranked) == 0:
+        return []
+    min_score = RANK_THRESHOLD_FOR_SEARCH * max(score for _, score in ranked)
+    return [{"document": doc, "score": score} for doc, score in ranked if score >= min_score]
 
-            TF = term_freq_for_doc / total_terms
-            # print("Doc, term, TF and total_terms", doc, term, term_freq_for_doc, total_terms)
-            normalized_term_freq.append(TF)
-            # now calculate the inverse doc frequency for this term
-            term_freq_in_corpus = len(postings_index[term])
-            total_docs_in_corpus = len(doc_vector_space_map)
-            # check if total_docs_in_corpus / term_freq_in_corpus == 1
-            if total_docs_in_corpus == term_freq_in_corpus: # it means the input term is present in all the documents
-                IDF = 1 # because log 1 will be 0
+def rank_top_k(terms, postings_index, k, scorer=None):
+    '''
+    The k best documents of rank_documents without scoring all of them: WAND skips the documents
+    whose score upper bound can not beat the k-th best score so far. The best score is the same
+    as in exhaustive ranking, so the threshold cuts the top k at the same place.
+    '''
+    start_time = time.time()
+    sorted_documents = apply_rank_threshold(wand_top_k(terms, postings_index, k, scorer=scorer))
+    print_timing("rank_top_k", start_time)
+    return sorted_documents
+
+def rank_by_time(terms, match, postings_index, k, scorer, since=None, until=None, order="relevance", recency=False,
+                 stats=None):
+    '''
+    Ranks the documents published at since <= published < until (seconds since the epoch, None
+    leaves a side open) one segment at a time, newest segment first (SegmentedIndex.segment_views).
+    match(view) returns the matching documents of a segment view, they are scored by scorer.
+
+    order "relevance" ranks by score, times recency.recency_factor of the document with recency.
+    A segment is skipped when the best score its documents can get (the upper bounds of the query
+    terms in that segment, times the factor of its newest document) does not beat the k-th best
+    score so far; with the recency boost the old segments can rarely beat it.
+    order "date" ranks the newest documents first, and stops at the first segment whose newest
+    document is older than the k-th newest so far.
+    If stats is a dict, the number of segments in the date range, of those searched and of the
+    documents in those is added to it.
+    '''
+    start_time = time.time()
+    now = time.time()
+    views = postings_index.segment_views(since, until)
+    # (key, -doc, score) of the k best documents so far, the lowest key first
+    best = []
+    searched = []
+    for view in views:
+        newest = view.segment_dates[0][1]
+        if k is not None and len(best) == k:
+            if order == "date":
+                if newest is None or newest < best[0][0]:
+                    # every segment left is older
+                    break
             else:
-                IDF = math.log(total_docs_in_corpus / term_freq_in_corpus)
-            # print("Doc, term, IDF", doc, term, IDF)
-            inverse_doc_freq.append(IDF)
-        rank_meta_data["TF"] = normalized_term_freq
-        rank_meta_data["IDF"] = inverse_doc_freq
-        doc_rank_map[doc] = rank_meta_data
-    
-    for doc, tf_idf in doc_rank_map.items():
-        score = 0
-        for i in range(len(tf_idf['TF'])):
-            score += tf_idf['TF'][i] * tf_idf['IDF'][i]
-        document_scores[doc] = score
+                bound = 0
+                for term in terms:
+                    IDF = scorer.idf(term)
+                    if IDF is not None:
+                        bound += scorer.upper_bound(term, IDF, view)
+                if recency:
+                    bound *= recency_factor(newest, now)
+                if bound * (1 + BOUND_SLACK) <= best[0][0]:
+                    continue
+        searched.append(view)
+        docs = match(view)
+        document_scores = score_documents(terms, docs, view, scorer)
+        for doc in docs:
+            score = document_scores.get(doc, 0)
+            published = view.doc_table[doc].get("published")
+            if order == "date":
+                key = -1 if published is None else published
+            else:
+                if recency:
+                    score *= recency_factor(published, now)
+                key = score
+            if k is None or len(best) < k:
+                heapq.heappush(best, (key, -doc, score))
+            elif (key, -doc) > best[0][:2]:
+                heapq.heapreplace(best, (key, -doc, score))
 
-    max_score = max(document_scores.values())
-    # Sort documents based on combined scores in descending order
-    sorted_documents = [
-        {"document": doc, "score": score} 
-        for doc, score in sorted(document_scores.items(), key=lambda x: x[1], reverse=True)
-        if score >= RANK_THRESHOLD_FOR_SEARCH * max_score
-    ]
-    end_time = time.time()
-    print(f"rank_documents took {end_time - start_time:.6f} seconds.")
+    if stats is not None:
+        stats["segments"] = stats.get("segments", 0) + len(views)
+        stats["segments_searched"] = stats.get("segments_searched", 0) + len(searched)
+        stats["docs_searched"] = stats.get("docs_searched", 0) + sum(view.doc_count for view in searched)
+    best.sort(reverse=True)
+    if order == "date":
+        sorted_documents = [{"document": -negative_doc, "score": score} for _, negative_doc, score in best]
+    else:
+        sorted_documents = apply_rank_threshold([(-negative_doc, score) for _, negative_doc, score in best])
+    print_timing("rank_by_time", start_time)
     return sorted_documents
 
-def get_doc_metadata(ranked_docs):
+def get_doc_metadata(ranked_docs, postings_index, terms):
+    '''
+    Title, url and a query-aware snippet of the ranked docs, read from the doc store written at
+    index time (see doc_store.py) rather than from the source files, and only for the docs returned.
+    The snippet is the part of the content where the query terms are closest together, with the
+    terms highlighted (see snippets.py). Title and snippet are HTML, the title is escaped like the
+    text of the snippet; the url is plain text.
+    '''
     start_time = time.time()
+    hits = query_term_positions(terms, ranked_docs, postings_index)
     snippets = {}
-    source_dir = "source_files"
-    
     for doc_id in ranked_docs:
-        try:
-            with open(os.path.join(source_dir, doc_id), 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                url = data.get('url', '')
-                title = data.get('title', '')
-                content = data.get('content', '')[:250]
-                
-                snippets[doc_id] = {
-                    "doc_id": doc_id,
-                    "metadata": {
-                        "title": title,
-                        "url": url,
-                        "content": content
-                    }
-                }
-        except FileNotFoundError:
-            print(f"File not found: {doc_id}")
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON in file: {doc_id}")
-        except Exception as e:
-            print(f"Error reading file {doc_id}: {e}")
-    end_time = time.time()
-    print(f"get_doc_metadata took {end_time - start_time:.6f} seconds.")
+        record = postings_index.document(doc_id)
+        if record is None:
+            print(f"Document not found: {doc_id}")
+            continue
+        snippets[doc_id] = {
+            "doc_id": doc_id,
+            "metadata": {
+                "title": html.escape(record["title"]),
+                "url": record["url"],
+                "content": make_snippet(record["content"], decode_offsets(record["offsets"]), hits[doc_id])
+            }
+        }
+    print_timing("get_doc_metadata", start_time)
     return snippets
 
 
-index_file = 'index.txt'
-# get input from user
-terms, query_type = get_query_from_user()
-
-start_time = time.time()
-# create the index and vector_space_map in memory parallely
-# because they are separate files
-with concurrent.futures.ThreadPoolExecutor() as executor:
-    # Submit the functions to the executor
-    future_index = executor.submit(create_index_from_file, index_file)
-    future_doc_vector = executor.submit(get_doc_vector_space)
-
-    # Wait for all futures to complete and get the results
-    postings_index = future_index.result()
-    doc_vector_space_map = future_doc_vector.result()
-
-print("processed input terms", terms)
-if query_type == "OWQ" or query_type == "FTQ":
-    docs = get_docs_list_for_owq_and_ftq(terms, docs)
-elif query_type == "PQ":
-    docs = get_docs_list_for_pq(terms, docs)
-else:
+def parse_search(user_input, postings_index, corrections=None):
+    '''
+    Analyzes and parses a query of search: returns (terms, query_type, union, slop, query), the
+    terms to rank by, whether any of them matches (OWQ, OR free text queries), the slop of a
+    phrase query and the parsed boolean query (None for union and phrase queries).
+    Spelling correction and wildcard expansion only look up the term dictionaries of postings_index
+    (document_frequency, spelling_candidates, autocomplete), distributed.ShardedIndex answers those
+    for all of its shards.
+    '''
+    terms, query_type = analyze_query(user_input)
+    if VERBOSE:
+        print("processed input terms", terms)
+    union = query_type == "OWQ" or (query_type == "FTQ" and DEFAULT_OPERATOR == "OR")
+    slop = 0
+    query = None
+    corrector = SpellingCorrector(postings_index) if SPELLING_CORRECTION else None
+    if query_type == "PQ":
+        _, slop = parse_phrase_query(user_input)
+        if corrector is not None:
+            terms = [corrector.best(term) for term in terms]
+    elif not union:
+        query = parse_query(user_input, DEFAULT_OPERATOR, wildcard_expander(postings_index),
+                            corrector.correct if corrector is not None else None)
+        # negated terms do not contribute to the score
+        terms = positive_terms(query)
+    elif corrector is not None:
+        terms = [replacement for term in terms for replacement in corrector.correct(term)]
+    if corrector is not None and corrector.corrections:
+        if VERBOSE:
+            print("spelling corrections", corrector.corrections)
+        if corrections is not None:
+            corrections.update(corrector.corrections)
+    return terms, query_type, union, slop, query
+
+def match_documents(terms, query_type, union, slop, query, postings_index):
+    ''' The documents of postings_index matching a query parsed by parse_search '''
+    if union:
+        return get_docs_list_for_owq_and_ftq(terms, set(), postings_index)
+    elif query_type == "PQ":
+        return get_docs_list_for_pq(terms, postings_index, slop)
+    elif query_type in ("FTQ", "BQ", "WQ"):
+        return get_docs_list_for_bq(query, postings_index)
     print("unknown query type")
+    return []
 
-''' now we have the "docs" list i.e the list of documents in which our input terms appear. 
-We can run the "rank_documents" method and another method "get_doc_metadata" in
-parallel which will fetch the relevant snippets for each document
-'''
-# now that we have the doc list, we need to rank the docs based on TF-IDF
-with concurrent.futures.ThreadPoolExecutor() as executor:
-    # Submit the functions to the executor
-    future_ranked_docs = executor.submit(rank_documents, terms, docs)
-    future_metadata_per_doc = executor.submit(get_doc_metadata, docs)
 
-    # Wait for all futures to complete and get the results
-    ranked_docs = future_ranked_docs.result()
-    metadata_per_doc = future_metadata_per_doc.result()
+def search(user_input, postings_index, k=None, cache=None, scoring=None, corrections=None,
+           since=None, until=None, order="relevance", recency=False, stats=None):
+    '''
+    Answers one query against an opened index.
+    Returns (terms, query_type, results), results being a list of
+    {"doc_id", "title", "url", "content", "score", "published"} dicts in descending score order
+    ("published" only for dated articles), at most k of them if k is given. "title" and "content"
+    are HTML escaped (content highlights the query terms with <b>), the others are plain text.
+    scoring names the scorer of scoring.SCORERS ("bm25" or "tfidf"), scoring.DEFAULT_SCORER if None.
+    since and until (seconds since the epoch) keep the articles published at since <= published < until,
+    order "date" returns the newest first instead of the best, and recency boosts the scores of
+    recent articles (see recency.py). These search the segments newest first (rank_by_time), stats
+    (a dict) is filled with how many of them were searched.
+    Query terms that are not in the index are replaced by their spelling corrections
+    (SPELLING_CORRECTION), a corrections dict given is filled with {term: [replacement terms]}.
+    With a query_cache.QueryCache, a query that was already answered on the same index generation
+    returns the cached results (shared, do not modify them).
+    '''
+    terms, query_type, union, slop, query = parse_search(user_input, postings_index, corrections)
+
+    if order not in ORDERS:
+        raise ValueError(f"unknown order {order!r}, expected one of {', '.join(ORDERS)}")
+    scorer = get_scorer(postings_index, scoring)
+    # the analyzed query, so that queries differing only in case, stop words or word forms share an entry;
+    # boosted scores change with the time of the query, so they are cached for RECENCY_CACHE_SECONDS
+    cache_key = (query_type, tuple(terms), slop, repr(query), k, scorer.name, since, until, order,
+                 int(time.time() // RECENCY_CACHE_SECONDS) if recency else None)
+    if cache is not None:
+        results = cache.get(postings_index.generation, cache_key)
+        if results is not None:
+            return terms, query_type, results
 
+    if since is not None or until is not None or order == "date" or recency:
+        def match(view):
+            return match_documents(terms, query_type, union, slop, query, view)
 
-for ranked_doc in ranked_docs:
-    # ranked_doc['metadata'] = metadata_per_doc[ranked_doc['document']]
-    response = metadata_per_doc[ranked_doc['document']]['metadata']
-    response['score'] = ranked_doc['score']
-    print(response)
-    print()
+        ranked_docs = rank_by_time(terms, match, postings_index, k, scorer, since, until, order, recency, stats)
+    elif k is not None and union:
+        ranked_docs = rank_top_k(terms, postings_index, k, scorer)
+    else:
+        docs = match_documents(terms, query_type, union, slop, query, postings_index)
+        # now that we have the doc list, we need to rank the docs based on BM25 or TF-IDF
+        ranked_docs = rank_documents(terms, docs, postings_index, scorer)
+        if k is not None:
+            ranked_docs = ranked_docs[:k]
+    results = collect_results(ranked_docs, postings_index, terms)
+    if cache is not None:
+        cache.put(postings_index.generation, cache_key, results)
+    return terms, query_type, results
 
-end_time = time.time()
-print(f"Returned {len(ranked_docs)} results in {end_time - start_time:.6f} seconds.")
+def collect_results(ranked_docs, postings_index, terms):
+    ''' Adds the metadata and snippets to the ranked docs, they are only made for these final results '''
+    metadata_per_doc = get_doc_metadata([ranked_doc['document'] for ranked_doc in ranked_docs], postings_index, terms)
+    results = []
+    for ranked_doc in ranked_docs:
+        # ranked_doc['metadata'] = metadata_per_doc[ranked_doc['document']]
+        if ranked_doc['document'] not in metadata_per_doc:
+            continue
+        response = dict(doc_id=ranked_doc['document'], **metadata_per_doc[ranked_doc['document']]['metadata'])
+        response['score'] = ranked_doc['score']
+        published = postings_index.doc_table[ranked_doc['document']].get('published')
+        if published is not None:
+            response['published'] = format_date(published)
+        results.append(response)
+    return results
 
 
+manifest_file = 'segments.json'
 
+def main():
+    # get input from user
+    user_input = input("Search: ")
 
+    start_time = time.time()
+    postings_index = create_index_from_file(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+
+    corrections = {}
+    _, _, results = search(user_input, postings_index, TOP_K, corrections=corrections)
+    for term, replacements in corrections.items():
+        print(f"{term} is not in the index, showing results for {' or '.join(replacements)}")
+    for response in results:
+        print({key: value for key, value in response.items() if key != 'doc_id'})
+        print()
 
+    end_time = time.time()
+    print(f"Returned {len(results)} results in {end_time - start_time:.6f} seconds.")
 
+if __name__ == "__main__":
+    main()
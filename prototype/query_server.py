@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import traceback
+import concurrent.futures
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+import query_index
+from scoring import SCORERS, DEFAULT_SCORER
+from segments import open_index, manifest_file, AUTOCOMPLETE_SIZE
+from query_cache import QueryCache
+from recency import parse_date
+
+'''
+Long running query server. query_index.py opens the index for every single query, this server
+opens it once and keeps it resident, so a warm query only pays for analysis, postings lookups
+and ranking.
+
+It speaks a small subset of HTTP/1.1 (with keep-alive) over asyncio and answers in JSON:
+
+    GET  /search?q=<query>[&k=<max results>][&scoring=bm25|tfidf]
+                [&since=<date>][&until=<date>][&order=relevance|date][&recency=1]
+                                               ranked results, same as query_index.py prints them,
+                                               and the spelling corrections of the query terms;
+                                               title and content of a result are HTML escaped,
+                                               content with the query terms in <b>;
+                                               since and until (ISO 8601 or RFC 822 dates) limit the
+                                               publication dates, order=date returns the newest
+                                               articles first and recency=1 boosts recent ones
+                                               (see recency.py)
+    GET  /autocomplete?q=<prefix>[&n=<max completions>]
+                                               the index terms starting with prefix that are in the
+                                               most documents
+    GET  /stats                                index generation, document count, query latencies,
+                                               query and postings cache counters
+    POST /reload                               re-open the index right away
+
+Queries run in a thread pool, so a slow query does not block the event loop or other clients.
+Results are cached per index generation (query_cache.QueryCache), so repeated queries are answered
+without evaluating them again, and a newly swapped in index starts with an empty cache.
+
+Hot swapping: the server watches the mtime of segments.json. When a build, an incremental update
+or a segment merge publishes a new manifest, the new index is opened in the background and then
+swapped in with a single reference assignment. Queries that already started keep using the index
+they started with; the old index is released once the last of them finishes.
+
+Usage: python3 query_server.py [port]
+'''
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# seconds between two checks of segments.json
+RELOAD_INTERVAL = 2.0
+SEARCH_THREADS = 8
+# number of recent query latencies kept for /stats
+LATENCY_WINDOW = 1000
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+
+
+def manifest_mtime():
+    try:
+        return os.stat(manifest_file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class QueryServer:
+
+    def __init__(self):
+        self.index = None
+        self.index_mtime = None
+        self.queries_served = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.cache = QueryCache()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=SEARCH_THREADS)
+        self.reload_lock = asyncio.Lock()
+
+    async def reload(self, force=False):
+        ''' Opens the index again if segments.json changed since it was last opened '''
+        async with self.reload_lock:
+            mtime = manifest_mtime()
+            if mtime is None or (mtime == self.index_mtime and not force):
+                return False
+            loop = asyncio.get_running_loop()
+            new_index = await loop.run_in_executor(self.executor, open_index, manifest_file)
+            if new_index is None:
+                return False
+            # in-flight queries hold their own reference to the previous index
+            self.index = new_index
+            self.index_mtime = mtime
+            print(f"Serving index generation {new_index.generation} with {new_index.doc_count} documents.")
+            return True
+
+    async def watch_index(self):
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"Error reloading index: {e}")
+
+    def run_search(self, index, query, k, scoring, since=None, until=None, order="relevance", recency=False):
+        start_time = time.perf_counter()
+        corrections = {}
+        segment_stats = {}
+        terms, query_type, results = query_index.search(query, index, k, self.cache, scoring, corrections,
+                                                        since, until, order, recency, segment_stats)
+        took = time.perf_counter() - start_time
+        self.latencies.append(took)
+        self.queries_served += 1
+        return {
+            "query": query,
+            "query_type": query_type,
+            "terms": terms,
+            "corrections": corrections,
+            "scoring": scoring,
+            "order": order,
+            "recency": recency,
+            "segments": segment_stats,
+            "generation": index.generation,
+            "took_ms": took * 1000,
+            "results": results
+        }
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "generation": self.index.generation if self.index else None,
+            "doc_count": self.index.doc_count if self.index else 0,
+            "queries_served": self.queries_served,
+            "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+            "p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+            "query_cache": self.cache.stats(),
+            "postings_cache": self.index.postings_cache.stats() if self.index else None
+        }
+
+    async def route(self, method, target):
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if url.path == "/search":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            query = params.get("q", [""])[0]
+            if not query.strip():
+                return 400, {"error": "missing query parameter q"}
+            try:
+                k = int(params["k"][0]) if "k" in params else None
+            except ValueError:
+                return 400, {"error": "k must be an integer"}
+            scoring = params.get("scoring", [DEFAULT_SCORER])[0]
+            if scoring not in SCORERS:
+                return 400, {"error": f"scoring must be one of {', '.join(SCORERS)}"}
+            dates = {}
+            for name in ("since", "until"):
+                dates[name] = parse_date(params[name][0]) if name in params else None
+                if name in params and dates[name] is None:
+                    return 400, {"error": f"{name} must be an ISO 8601 or RFC 822 date"}
+            order = params.get("order", ["relevance"])[0]
+            if order not in query_index.ORDERS:
+                return 400, {"error": f"order must be one of {', '.join(query_index.ORDERS)}"}
+            recency = params.get("recency", ["0"])[0] not in ("", "0", "false")
+            index = self.index
+            if index is None:
+                return 503, {"error": "index not loaded"}
+            loop = asyncio.get_running_loop()
+            return 200, await loop.run_in_executor(self.executor, self.run_search, index, query, k, scoring,
+                                                   dates["since"], dates["until"], order, recency)
+        if url.path == "/autocomplete":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            prefix = params.get("q", [""])[0].strip().lower()
+            if not prefix:
+                return 400, {"error": "missing query parameter q"}
+            try:
+                n = int(params["n"][0]) if "n" in params else AUTOCOMPLETE_SIZE
+            except ValueError:
+                return 400, {"error": "n must be an integer"}
+            index = self.index
+            if index is None:
+                return 503, {"error": "index not loaded"}
+            loop = asyncio.get_running_loop()
+            completions = await loop.run_in_executor(self.executor, index.autocomplete, prefix, n)
+            return 200, {
+                "prefix": prefix,
+                "generation": index.generation,
+                "completions": [{"term": term, "doc_freq": doc_freq} for term, doc_freq in completions]
+            }
+        if url.path == "/stats":
+            return 200, self.stats()
+        if url.path == "/reload":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            reloaded = await self.reload(force=True)
+            return 200, {"reloaded": reloaded, **self.stats()}
+        return 404, {"error": f"unknown path {url.path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0)):
+                    await reader.readexactly(int(headers['content-length']))
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    status, payload, keep_alive = 400, {"error": "malformed request"}, False
+                else:
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                    try:
+                        status, payload = await self.route(method, target)
+                    except Exception as e:
+                        # a bug or an I/O error while answering: the client still gets a response
+                        print(f"Error answering {method} {target}: {e!r}")
+                        traceback.print_exc()
+                        status, payload = 500, {"error": "internal server error"}
+
+                body = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port):
+        await self.reload()
+        if self.index is None:
+            print("No index to serve, run create_index.py first")
+            return
+        server = await asyncio.start_server(self.handle_connection, HOST, port)
+        print(f"Serving queries on http://{HOST}:{port}/search?q=...")
+        watcher = asyncio.create_task(self.watch_index())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=False)
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    # per step timings would flood the server log
+    query_index.VERBOSE = False
+    try:
+        asyncio.run(QueryServer().serve(port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import time
+import datetime
+import email.utils
+
+'''
+Publication dates of the articles, and what the index and the query side do with them.
+
+The crawler keeps the pubDate of every RSS item (ISO 8601 in the saved article, "published"),
+the indexer stores it in the doc table as seconds since the epoch, and a full build assigns the
+doc IDs in publication order. So the articles of a day or a week are a run of consecutive doc
+IDs, and the manifest splits the build into one segment per period (see segments.py): a query
+for the latest news only has to look at the newest segments.
+
+Articles without a date (saved before the crawler kept them) are "undated" and sort before
+all others.
+
+The recency boost multiplies the score of a document by
+
+    1 + RECENCY_WEIGHT * 0.5 ** (age / RECENCY_HALF_LIFE)
+
+so a brand new article scores up to 1 + RECENCY_WEIGHT times what it would without the boost,
+and one RECENCY_HALF_LIFE old half as much more. Undated articles are not boosted.
+'''
+
+UNDATED = "undated"
+# seconds
+RECENCY_HALF_LIFE = 2 * 24 * 3600
+RECENCY_WEIGHT = 1.0
+# boosted scores change with the time of the query, the query cache keeps them this many seconds at most
+RECENCY_CACHE_SECONDS = 60
+
+
+def parse_date(value):
+    '''
+    Seconds since the epoch of a date, an RFC 822 date (pubDate of RSS) or ISO 8601 (the
+    "published" of saved articles, dc:date). Dates without a time zone are taken as UTC.
+    None if value is empty or not a date.
+    '''
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+
+def format_date(timestamp):
+    ''' ISO 8601 (UTC) of seconds since the epoch '''
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def period_of(timestamp, period):
+    ''' Name of the day ("2024-05-17") or ISO week ("2024-W20") of timestamp, UNDATED for None '''
+    if timestamp is None:
+        return UNDATED
+    date = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date()
+    if period == "day":
+        return date.isoformat()
+    year, week, _ = date.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def recency_factor(published, now=None):
+    ''' Score multiplier of a document published at published (seconds since the epoch, or None) '''
+    if published is None:
+        return 1.0
+    now = time.time() if now is None else now
+    age = max(0.0, now - published)
+    return 1.0 + RECENCY_WEIGHT * 0.5 ** (age / RECENCY_HALF_LIFE)
@@ -0,0 +1,698 @@
+import os
+import json
+import math
+import shutil
+import hashlib
+import heapq
+import bisect
+import itertools
+import copy
+import contextlib
+import threading
+from binary_index import BinaryIndex, BinaryIndexWriter, write_binary_index
+from postings_cursor import PostingsCursor
+from doc_store import DocStore, write_doc_store, EMPTY_RECORD
+from index_merge import merge_partial_indexes
+from query_cache import LRUCache, POSTINGS_CACHE_SIZE
+from article_log import is_article_name
+from recency import period_of
+
+'''
+Segmented index: one base segment written by a full build (create_index.py, parallel_index.py
+or spimi_index.py) plus small delta segments written by incremental_index.py and by the
+streaming pipeline (pipeline.py).
+
+segments.json (the manifest) ties them together:
+{
+    "generation": bumped on every change, so readers can tell that the index changed,
+    "next_doc_id": first doc ID the next delta segment will use,
+    "segments": [{"name", "index", "doc_table", "doc_store", "first_doc_id", "doc_count",
+                  "period", "min_published", "max_published"}, ...] in ascending doc ID order,
+    "deleted": doc IDs of documents that were deleted or replaced by a newer version (tombstones),
+    "full_build": index.bin of the full build the segments were split from (only if it was split),
+                  its deletion dictionary (see spelling.py) serves them. It is in the folder of
+                  that build (builds/<generation>/index.bin), which no later build writes to,
+    "files": {file name: {"doc_id", "mtime", "size", "hash"}} for every indexed source file
+             (articles of the article log are not listed, they never change)
+}
+
+Every segment is an index.bin, doc_table.json and doc_store.bin triple. Doc IDs are global: a delta segment
+continues where the previous segments stopped, so concatenating the postings of a term over
+all segments keeps them sorted by doc ID. A modified file gets a new doc ID in a delta segment
+and its old doc ID is tombstoned; readers drop tombstoned doc IDs from every postings list.
+
+Segments are never modified in place. Merging writes a new segment, swaps it into the manifest
+with an atomic rename, and only then removes the merged segments. The same holds for full builds:
+they write into a new folder, builds/<generation> (new_build_files), so the query server can go on
+reading the mmapped files of the previous build until it swaps in the new manifest.
+
+Time sharding: with SEGMENT_PERIOD set, a full build assigns the doc IDs in publication order
+(create_index.list_documents), and create_manifest_file splits it into one segment per period (day or ISO
+week, see recency.py) in a single pass over the built index. Every segment records the period of its newest
+article and the range of publication dates it holds (min_published, max_published), so the query
+side can search the newest segments first and skip those outside a date range
+(SegmentedIndex.segment_views). Delta segments hold the newest articles anyway. The merge policy
+only merges neighbouring segments of the same period, so the periods stay apart. The files of
+the full build stay where they are: the period segments are written without a deletion dictionary
+of their own, spelling correction uses the one of the full build's index.bin, instead of one
+lookup per segment.
+'''
+
+manifest_file = "segments.json"
+segments_folder = "segments"
+# every full build writes its files into a folder of its own, builds/<generation>
+builds_folder = "builds"
+
+# merge policy: merge all delta segments once there are more than MAX_DELTA_SEGMENTS of them,
+# and compact everything once more than MAX_DELETED_RATIO of the indexed documents are tombstones.
+# With time sharding: merge the longest run of neighbouring segments of the same period once there
+# are more than MAX_DELTA_SEGMENTS segments besides one per period, and compact the segment with
+# the most tombstones
+MAX_DELTA_SEGMENTS = 4
+MAX_DELETED_RATIO = 0.2
+# full builds are split into one segment per "day" or "week" of publication, None keeps a single base segment.
+# Off by default: date ranges, newest first and recency queries then stop early, but every other
+# query looks up its terms in every segment
+SEGMENT_PERIOD = None
+# completions returned by SegmentedIndex.autocomplete
+AUTOCOMPLETE_SIZE = 10
+
+# a single writer per process: incremental updates and background merges take turns
+manifest_lock = threading.Lock()
+
+
+def file_state(filepath):
+    stat = os.stat(filepath)
+    return {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def content_hash(filepath):
+    with open(filepath, 'rb') as file:
+        return hash_content(file.read())
+
+
+def hash_content(content):
+    ''' The "hash" of the manifest's files, of content read as bytes '''
+    return hashlib.sha1(content).hexdigest()
+
+
+def read_manifest(filename=manifest_file):
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(manifest, filename=manifest_file):
+    ''' Writes to a temporary file and renames it, so readers never see a half written manifest '''
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(temp_filename, filename)
+
+
+def create_manifest_file(doc_table, source_folder, index_file, doc_table_file, doc_store_file, file_hashes=None):
+    '''
+    Called by the full builds: starts a new manifest with the freshly built index, split into one
+    segment per period with SEGMENT_PERIOD, and drops the segments of the previous build.
+    file_hashes holds the content hashes of the source files taken while indexing them
+    (create_index.index_source_file), the files missing there are read once more.
+    '''
+    files = {}
+    for doc_id, filename in enumerate(doc_table):
+        if is_article_name(filename):
+            # logged articles are not files incremental_index.py has to watch
+            continue
+        filepath = os.path.join(source_folder, filename)
+        file_hash = (file_hashes or {}).get(filename) or content_hash(filepath)
+        files[filename] = dict(doc_id=doc_id, hash=file_hash, **file_state(filepath))
+
+    previous_manifest = read_manifest()
+    generation = previous_manifest["generation"] + 1 if previous_manifest else 1
+    base = {"name": "base", "index": index_file, "doc_table": doc_table_file, "doc_store": doc_store_file,
+            "first_doc_id": 0, "doc_count": len(doc_table)}
+    doc_entries = load_doc_entries(base)
+    base.update(date_range(doc_entries))
+    runs = period_runs(doc_entries) if SEGMENT_PERIOD else []
+    segments = split_by_period(base, doc_entries, runs, generation) if len(runs) > 1 else [base]
+    manifest = {
+        "generation": generation,
+        "next_doc_id": len(doc_table),
+        "segments": segments,
+        "deleted": [],
+        "files": files
+    }
+    if len(segments) > 1:
+        manifest["full_build"] = index_file
+        # the segments have doc stores of their own, the one of the full build is never read
+        os.remove(doc_store_file)
+    write_manifest(manifest)
+    # only now that readers open the new files, the old ones can go (an mmapped file outlives its name)
+    remove_unused_segments(manifest)
+    remove_unused_builds(manifest)
+
+
+def new_build_files(index_file, doc_table_file, doc_store_file):
+    '''
+    Paths of the index, doc table and doc store of a new full build: a new folder named by the
+    generation it is going to publish. A build never writes over the files of the published one,
+    which a running query server still has mmapped; create_manifest_file removes those once the
+    new manifest is out.
+    '''
+    manifest = read_manifest()
+    folder = os.path.join(builds_folder, str(manifest["generation"] + 1 if manifest else 1))
+    # left behind by a build that failed before publishing, nothing reads it
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    return tuple(os.path.join(folder, filename) for filename in (index_file, doc_table_file, doc_store_file))
+
+
+def remove_unused_segments(manifest):
+    ''' Removes the segment folders the manifest does not list '''
+    if not os.path.isdir(segments_folder):
+        return
+    used = {segment["name"] for segment in manifest["segments"]}
+    for name in os.listdir(segments_folder):
+        if name not in used:
+            shutil.rmtree(os.path.join(segments_folder, name), ignore_errors=True)
+
+
+def remove_unused_builds(manifest):
+    ''' Removes the build folders none of the files the manifest lists are in '''
+    if not os.path.isdir(builds_folder):
+        return
+    paths = [path for segment in manifest["segments"] for path in (segment["index"], segment["doc_table"], segment["doc_store"])]
+    if manifest.get("full_build"):
+        paths.append(manifest["full_build"])
+    used = {os.path.abspath(os.path.dirname(path)) for path in paths}
+    for name in os.listdir(builds_folder):
+        folder = os.path.join(builds_folder, name)
+        if os.path.abspath(folder) not in used:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def date_range(doc_entries):
+    '''
+    The time fields of the manifest entry of a segment holding doc_entries: the range of their
+    publication dates and the period of the newest one (None if they are all undated)
+    '''
+    dates = [entry["published"] for entry in doc_entries if entry.get("published") is not None]
+    newest = max(dates, default=None)
+    return {
+        "period": period_of(newest, SEGMENT_PERIOD) if SEGMENT_PERIOD else None,
+        "min_published": min(dates, default=None),
+        "max_published": newest
+    }
+
+
+def period_runs(doc_entries):
+    ''' (start, end) slices of doc_entries (in doc ID order) whose documents were published in the same period '''
+    runs = []
+    previous_period = None
+    for i, entry in enumerate(doc_entries):
+        period = period_of(entry.get("published"), SEGMENT_PERIOD)
+        if not runs or period != previous_period:
+            runs.append([i, i + 1])
+            previous_period = period
+        else:
+            runs[-1][1] = i + 1
+    return [tuple(run) for run in runs]
+
+
+def new_segment(name, doc_entries, first_doc_id, folder=segments_folder):
+    ''' Creates the folder of a new segment holding doc_entries, writes its doc table and returns its manifest entry '''
+    folder = os.path.join(folder, name)
+    os.makedirs(folder, exist_ok=True)
+    segment = {
+        "name": name,
+        "index": os.path.join(folder, "index.bin"),
+        "doc_table": os.path.join(folder, "doc_table.json"),
+        "doc_store": os.path.join(folder, "doc_store.bin"),
+        "first_doc_id": first_doc_id,
+        "doc_count": len(doc_entries)
+    }
+    segment.update(date_range(doc_entries))
+    with open(segment["doc_table"], 'w') as file:
+        json.dump(doc_entries, file)
+    return segment
+
+
+def write_segment(name, sorted_postings, doc_entries, doc_records, first_doc_id):
+    '''
+    Writes a new segment folder and returns its manifest entry.
+    doc_records are the doc store records of the doc IDs first_doc_id, first_doc_id + 1, ...
+    '''
+    segment = new_segment(name, doc_entries, first_doc_id)
+    doc_norms = {entry["doc_id"]: entry["norm"] for entry in doc_entries}
+    doc_lengths = {entry["doc_id"]: entry["length"] for entry in doc_entries}
+    write_binary_index(sorted_postings, len(doc_entries), segment["index"], doc_norms, doc_lengths, spelling=True)
+    write_doc_store(doc_records, first_doc_id, segment["doc_store"])
+    return segment
+
+
+def split_by_period(base, doc_entries, runs, generation):
+    '''
+    Writes the documents of every run of period_runs as a segment of its own (split_segment).
+    Returns the manifest entries of the segments. They have no deletion dictionary, the one of
+    base covers them.
+    '''
+    first_doc_ids = [doc_entries[start]["doc_id"] for start, _ in runs]
+    ranges = list(zip(first_doc_ids, first_doc_ids[1:] + [base["first_doc_id"] + len(doc_entries)]))
+    names = [f"{period_of(doc_entries[start].get('published'), SEGMENT_PERIOD)}_{generation}" for start, _ in runs]
+    return split_segment(base, doc_entries, ranges, names)
+
+
+def split_segment(segment, doc_entries, ranges, names, folder=segments_folder):
+    '''
+    Writes the documents of segment (doc_entries are its doc table) with doc IDs in each of ranges
+    ((first, end) doc ID ranges, ascending and not overlapping) as a new segment called names[i] in
+    folder, reading the postings and the doc store of segment once. Returns the manifest entries
+    of the new segments. They have no deletion dictionary.
+    '''
+    pieces = []
+    index = BinaryIndex(segment["index"])
+    doc_store = DocStore(segment["doc_store"])
+    try:
+        # the writers are finished on leaving the block, and left unfinished if it raised
+        with contextlib.ExitStack() as stack:
+            writers = []
+            for (first, end), name in zip(ranges, names):
+                entries = [entry for entry in doc_entries if first <= entry["doc_id"] < end]
+                piece = new_segment(name, entries, first, folder)
+                pieces.append(piece)
+                writers.append(stack.enter_context(BinaryIndexWriter(
+                    piece["index"], len(entries), {entry["doc_id"]: entry["norm"] for entry in entries},
+                    {entry["doc_id"]: entry["length"] for entry in entries})))
+            records = doc_store.records()
+            next_doc_id = doc_store.first_doc_id
+            for piece, (first, end) in zip(pieces, ranges):
+                # the records between two ranges are skipped
+                for _ in itertools.islice(records, max(0, first - next_doc_id)):
+                    pass
+                write_doc_store(itertools.islice(records, end - first), first, piece["doc_store"])
+                next_doc_id = end
+            first_doc_ids = [first for first, _ in ranges]
+            for term, postings_list in index.items():
+                doc_ids = [doc_id for doc_id, _ in postings_list]
+                start = 0
+                while start < len(doc_ids):
+                    # the range of the first posting left, and where the postings after it start
+                    i = bisect.bisect_right(first_doc_ids, doc_ids[start]) - 1
+                    if i >= 0 and doc_ids[start] < ranges[i][1]:
+                        end = bisect.bisect_left(doc_ids, ranges[i][1], start)
+                        writers[i].add(term, postings_list[start:end])
+                    else:
+                        # not in any range, on to the next one
+                        end = len(doc_ids) if i + 1 == len(ranges) else bisect.bisect_left(doc_ids, first_doc_ids[i + 1], start)
+                    start = end
+    finally:
+        index.close()
+        doc_store.close()
+    return pieces
+
+
+def load_doc_entries(segment):
+    with open(segment["doc_table"], 'r') as file:
+        return json.load(file)
+
+
+def remove_segment_files(segment):
+    ''' Only segment folders are removed, the files of a full build stay until the next one (remove_unused_builds) '''
+    folder = os.path.dirname(segment["index"])
+    if os.path.abspath(folder).startswith(os.path.abspath(segments_folder) + os.sep):
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def filter_deleted(items, deleted):
+    ''' Drops tombstoned doc IDs from (term, postings_list) items, and terms left without postings '''
+    for term, postings_list in items:
+        if deleted:
+            postings_list = [posting for posting in postings_list if posting[0] not in deleted]
+        if postings_list:
+            yield term, postings_list
+
+
+def select_segments_to_merge(manifest):
+    ''' Returns the consecutive slice (start, end) of manifest["segments"] to merge, or None '''
+    segments = manifest["segments"]
+    indexed_docs = sum(segment["doc_count"] for segment in segments)
+    if indexed_docs and len(manifest["deleted"]) / indexed_docs > MAX_DELETED_RATIO:
+        if not SEGMENT_PERIOD:
+            return 0, len(segments)
+        # one segment at a time, merging it with others would mix periods
+        first_doc_ids = [segment["first_doc_id"] for segment in segments]
+        tombstones = [0] * len(segments)
+        for doc_id in manifest["deleted"]:
+            tombstones[bisect.bisect_right(first_doc_ids, doc_id) - 1] += 1
+        i = max(range(len(segments)), key=lambda i: tombstones[i])
+        return i, i + 1
+    if not SEGMENT_PERIOD:
+        if len(segments) - 1 > MAX_DELTA_SEGMENTS:
+            return 1, len(segments)
+        return None
+    runs = []
+    for i, segment in enumerate(segments):
+        if runs and segment.get("period") == segments[i - 1].get("period"):
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    if sum(end - start - 1 for start, end in runs) > MAX_DELTA_SEGMENTS:
+        return tuple(max(runs, key=lambda run: run[1] - run[0]))
+    return None
+
+
+def merge_segments(manifest, start, end):
+    ''' Merges manifest["segments"][start:end] into one segment without the tombstoned documents '''
+    to_merge = manifest["segments"][start:end]
+    deleted = set(manifest["deleted"])
+    indexes = [BinaryIndex(segment["index"]) for segment in to_merge]
+    doc_stores = [DocStore(segment["doc_store"]) for segment in to_merge]
+    try:
+        doc_entries = []
+        for segment in to_merge:
+            doc_entries.extend(entry for entry in load_doc_entries(segment) if entry["doc_id"] not in deleted)
+        # the merged doc store keeps covering the whole doc ID range, tombstoned documents become empty records
+        doc_records = (
+            EMPTY_RECORD if doc_id in deleted else record
+            for doc_store in doc_stores
+            for doc_id, record in enumerate(doc_store.records(), start=doc_store.first_doc_id)
+        )
+        merged = merge_partial_indexes([filter_deleted(index.items(), deleted) for index in indexes], [0] * len(indexes))
+        merged_segment = write_segment(f"segment_{manifest['generation'] + 1}", merged, doc_entries,
+                                       doc_records, to_merge[0]["first_doc_id"])
+    finally:
+        for index in indexes:
+            index.close()
+        for doc_store in doc_stores:
+            doc_store.close()
+
+    merged_doc_ids = set()
+    for segment in to_merge:
+        merged_doc_ids.update(entry["doc_id"] for entry in load_doc_entries(segment))
+    # a segment left without live documents is dropped, the doc store of a doc ID without a segment is never read
+    manifest["segments"][start:end] = [merged_segment] if merged_segment["doc_count"] else []
+    manifest["deleted"] = [doc_id for doc_id in manifest["deleted"] if doc_id not in merged_doc_ids]
+    manifest["generation"] += 1
+    write_manifest(manifest)
+    for segment in to_merge:
+        remove_segment_files(segment)
+    if not merged_segment["doc_count"]:
+        remove_segment_files(merged_segment)
+
+
+def maybe_merge_segments():
+    ''' Applies the merge policy to the current manifest, returns True if segments were merged '''
+    with manifest_lock:
+        manifest = read_manifest()
+        if manifest is None:
+            return False
+        selected = select_segments_to_merge(manifest)
+        if selected is None:
+            return False
+        merge_segments(manifest, *selected)
+        print(f"Merged segments {selected[0]}..{selected[1] - 1}, index generation {manifest['generation']}.")
+        return True
+
+
+def start_background_merge():
+    ''' Runs maybe_merge_segments in a background thread and returns the thread '''
+    thread = threading.Thread(target=maybe_merge_segments, name="segment-merge")
+    thread.start()
+    return thread
+
+
+class SegmentedIndex:
+    '''
+    Read-only view over all segments of a manifest, with the same lookup interface as
+    BinaryIndex (term in index, index[term], index.get(term), index.blocks(term)).
+    Postings of all segments are concatenated and tombstoned documents are left out.
+
+    doc_table maps doc ID -> {"doc_id", "filename", "length", "norm", "unique_terms", "minhash"}
+    for every live document, norms maps doc ID -> norm, doc_count is the number of live documents
+    and average_length their average length. scorers holds the scorers of scoring.get_scorer.
+    Near-duplicates collapsed into another document (see create_index.py) are left out of all three.
+    document(doc_id) reads the title, url, content and term offsets of a document from the segment's doc store.
+    postings_cache keeps the live postings (index[term]) and the blocks without positions
+    (blocks(term, with_positions=False)) of recently used terms, bounded by POSTINGS_CACHE_SIZE postings.
+    segment_dates holds the (min_published, max_published) of every segment, segment_docs its live doc IDs,
+    and segment_views(since, until) views of single segments for searching them newest first.
+    '''
+
+    def __init__(self, manifest):
+        self.generation = manifest["generation"]
+        self.deleted = set(manifest["deleted"])
+        self.segments = [BinaryIndex(segment["index"]) for segment in manifest["segments"]]
+        self.doc_stores = [DocStore(segment["doc_store"]) for segment in manifest["segments"]]
+        # deletion dictionaries of indexes that are not segments themselves: the full build the segments
+        # were split from (see create_manifest_file), and the segments cut into shards (manifest["spelling"],
+        # see distributed.py)
+        spelling_files = ([manifest["full_build"]] if manifest.get("full_build") else []) + manifest.get("spelling", [])
+        self.spelling = [BinaryIndex(filename) for filename in spelling_files]
+        self.segment_dates = [(segment.get("min_published"), segment.get("max_published")) for segment in manifest["segments"]]
+        self.segment_docs = []
+        self.doc_table = {}
+        for segment in manifest["segments"]:
+            docs = []
+            for entry in load_doc_entries(segment):
+                if entry["doc_id"] not in self.deleted and "duplicate_of" not in entry:
+                    self.doc_table[entry["doc_id"]] = entry
+                    docs.append(entry["doc_id"])
+            self.segment_docs.append(docs)
+        self.doc_count = len(self.doc_table)
+        # doc ID -> vector magnitude, the TF normalization used in ranking
+        self.norms = {doc_id: entry["norm"] for doc_id, entry in self.doc_table.items()}
+        # the avgdl of BM25
+        self.average_length = sum(entry["length"] for entry in self.doc_table.values()) / max(1, self.doc_count)
+        self.scorers = {}
+        # live postings of the terms looked up recently, IDF of the terms looked up so far
+        self.postings_cache = LRUCache(POSTINGS_CACHE_SIZE)
+        self._idf = {}
+        # segment number -> view of the whole segment, created on first use; the views share
+        # postings_cache, their entries are told apart by the _scope of the keys
+        self._views = {}
+        self._scope = None
+
+    def __getitem__(self, term):
+        postings_list = self.postings_cache.get((self._scope, "postings", term))
+        if postings_list is not None:
+            return postings_list
+        postings_list = []
+        for segment in self.segments:
+            segment_postings = segment.get(term)
+            if segment_postings:
+                postings_list.extend(posting for posting in segment_postings if posting[0] not in self.deleted)
+        if not postings_list:
+            raise KeyError(term)
+        self.postings_cache.put((self._scope, "postings", term), postings_list, len(postings_list))
+        return postings_list
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def get(self, term, default=None):
+        try:
+            return self[term]
+        except KeyError:
+            return default
+
+    def document_frequency(self, term):
+        ''' Upper bound of the document frequency of term, tombstoned documents are still counted '''
+        return sum(segment.document_frequency(term) for segment in self.segments)
+
+    def live_document_frequency(self, term):
+        ''' Exact number of live documents containing term '''
+        if not self.deleted:
+            # straight from the term dictionaries, no postings are decoded
+            return self.document_frequency(term)
+        return sum(len(doc_ids) for doc_ids, _, _ in self.blocks(term, with_positions=False))
+
+    def idf(self, term):
+        '''
+        Inverse document frequency of term, computed once per term and index generation.
+        log(N / df), except for terms present in every document, whose IDF is 1 rather than log 1 = 0.
+        Returns None for terms that are not in the index.
+        '''
+        if term not in self._idf:
+            doc_freq = self.live_document_frequency(term)
+            if doc_freq == 0:
+                self._idf[term] = None
+            elif doc_freq == self.doc_count:
+                self._idf[term] = 1
+            else:
+                self._idf[term] = math.log(self.doc_count / doc_freq)
+        return self._idf[term]
+
+    def max_weight(self, term):
+        ''' Largest tf / ||D|| of term over all segments (0 for unknown terms), see binary_index.py '''
+        infos = [segment.term_info(term) for segment in self.segments]
+        return max((info[3] for info in infos if info), default=0)
+
+    def term_bounds(self, term):
+        '''
+        (largest term frequency, length of the shortest document containing term) over all segments,
+        None for unknown terms, see binary_index.py
+        '''
+        infos = [info for info in (segment.term_info(term) for segment in self.segments) if info]
+        if not infos:
+            return None
+        return max(info[2] for info in infos), min(info[4] for info in infos)
+
+    def spelling_candidates(self, term, max_distance, deadline=None):
+        ''' Candidate spelling corrections of term from the deletion dictionaries of all segments, see spelling.py '''
+        candidates = []
+        for segment in self.spelling + self.segments:
+            candidates.extend(segment.spelling_candidates(term, max_distance, deadline))
+        return candidates
+
+    def cursor(self, term):
+        ''' A PostingsCursor over the live postings of term in all segments '''
+        parts = []
+        for segment in self.segments:
+            info = segment.term_info(term)
+            if info:
+                parts.append((segment._buffer, info[0], info[1]))
+        return PostingsCursor(parts, self.deleted)
+
+    def blocks(self, term, with_positions=True):
+        ''' Yields (doc_ids, term_frequencies, positions) blocks of all segments, without tombstoned documents '''
+        if with_positions:
+            yield from self._live_blocks(term, with_positions)
+            return
+        # doc IDs and term frequencies are what ranking and boolean queries read, cache those
+        blocks = self.postings_cache.get((self._scope, "blocks", term))
+        if blocks is None:
+            blocks = list(self._live_blocks(term, with_positions))
+            self.postings_cache.put((self._scope, "blocks", term), blocks, sum(len(doc_ids) for doc_ids, _, _ in blocks))
+        yield from blocks
+
+    def _live_blocks(self, term, with_positions):
+        for segment in self.segments:
+            for doc_ids, term_frequencies, positions in segment.blocks(term, with_positions):
+                if self.deleted and not self.deleted.isdisjoint(doc_ids):
+                    live = [i for i, doc_id in enumerate(doc_ids) if doc_id not in self.deleted]
+                    doc_ids = [doc_ids[i] for i in live]
+                    term_frequencies = [term_frequencies[i] for i in live]
+                    if positions is not None:
+                        positions = [positions[i] for i in live]
+                if doc_ids:
+                    yield doc_ids, term_frequencies, positions
+
+    def document(self, doc_id):
+        ''' Doc store record {"title", "url", "content", "offsets"} of a live document, or None '''
+        if doc_id not in self.doc_table:
+            return None
+        for doc_store in self.doc_stores:
+            if doc_id in doc_store:
+                return doc_store.get(doc_id)
+        return None
+
+    def terms(self):
+        ''' Iterates over the distinct terms of all segments in ascending order '''
+        return distinct_terms(segment.terms() for segment in self.segments)
+
+    def terms_between(self, low=None, high=None):
+        ''' Iterates over the distinct terms low <= term < high in ascending order, None leaves a side open '''
+        return distinct_terms(segment.terms_between(low, high) for segment in self.segments)
+
+    def prefix_terms(self, prefix):
+        ''' Iterates over the distinct terms starting with prefix in ascending order '''
+        return distinct_terms(segment.prefix_terms(prefix) for segment in self.segments)
+
+    def autocomplete(self, prefix, n=AUTOCOMPLETE_SIZE):
+        '''
+        The n terms starting with prefix that are in the most documents, as (term, document frequency)
+        in descending frequency order. The frequencies are read from the term dictionaries, so
+        tombstoned documents still count (see document_frequency).
+        '''
+        completions = ((term, self.document_frequency(term)) for term in self.prefix_terms(prefix))
+        return heapq.nsmallest(n, completions, key=lambda completion: (-completion[1], completion[0]))
+
+    def segment_views(self, since=None, until=None):
+        '''
+        One view per segment holding documents published at since <= published < until (seconds
+        since the epoch, None leaves a side open), without the documents outside that range. The
+        segment with the newest documents comes first and undated segments last, so that a search
+        for recent articles can stop after the first few (see query_index.rank_by_time).
+        '''
+        filtered = since is not None or until is not None
+
+        def newest_first(i):
+            newest = self.segment_dates[i][1]
+            return newest is not None, newest or 0, i
+
+        views = []
+        for i in sorted(range(len(self.segments)), key=newest_first, reverse=True):
+            oldest, newest = self.segment_dates[i]
+            if not filtered:
+                if i not in self._views:
+                    self._views[i] = self._view(i, self.segment_docs[i])
+                    self._views[i].postings_cache = self.postings_cache
+                    self._views[i]._scope = i
+                views.append(self._views[i])
+            elif newest is not None and (since is None or newest >= since) and (until is None or oldest < until):
+                docs = [doc for doc in self.segment_docs[i] if in_range(self.doc_table[doc].get("published"), since, until)]
+                views.append(self._view(i, docs))
+        return views
+
+    def _view(self, i, docs):
+        '''
+        A SegmentedIndex over segment i with only the live documents docs, the other documents of the
+        segment are left out like tombstoned ones. It shares the opened segments and must not be
+        closed. Its norms and average length are those of the whole index: documents are ranked by
+        the scorers of the whole index, the same as in a search of all segments.
+        '''
+        view = copy.copy(self)
+        view.segments = [self.segments[i]]
+        view.doc_stores = [self.doc_stores[i]]
+        view.segment_dates = [self.segment_dates[i]]
+        view.segment_docs = [docs]
+        view.doc_table = {doc: self.doc_table[doc] for doc in docs}
+        if len(docs) < len(self.segment_docs[i]):
+            kept = set(docs)
+            view.deleted = self.deleted | {doc for doc in self.segment_docs[i] if doc not in kept}
+        view.doc_count = len(view.doc_table)
+        view.scorers = {}
+        view.postings_cache = LRUCache(POSTINGS_CACHE_SIZE)
+        view._idf = {}
+        view._views = {}
+        return view
+
+    def close(self):
+        self.postings_cache.clear()
+        self._idf = {}
+        self._views = {}
+        for spelling in self.spelling:
+            spelling.close()
+        for segment in self.segments:
+            segment.close()
+        for doc_store in self.doc_stores:
+            doc_store.close()
+
+
+def in_range(published, since=None, until=None):
+    ''' True if published (seconds since the epoch, None if unknown) is in since <= published < until '''
+    if since is None and until is None:
+        return True
+    return published is not None and (since is None or published >= since) and (until is None or published < until)
+
+
+def distinct_terms(sorted_terms):
+    ''' Merges sorted term iterators into one, without repeating the terms several of them have '''
+    previous_term = None
+    for term in heapq.merge(*sorted_terms):
+        if term != previous_term:
+            yield term
+            previous_term = term
+
+
+def open_index(filename=manifest_file):
+    manifest = read_manifest(filename)
+    if manifest is None:
+        print(f"{filename} not found, run create_index.py first")
+        return None
+    try:
+        return SegmentedIndex(manifest)
+    except (IOError, ValueError) as e:
+        print(f"Error opening index: {e}")
+        return None
@@ -0,0 +1,147 @@
+import html
+from postings_codec import vbyte_encode, vbyte_decode, vbyte_decode_number
+from postings_cursor import END
+
+'''
+Query-aware snippets: for every result, the stretch of its content where the query terms occur
+closest together, with the query terms highlighted.
+
+Positions in the postings are positions in the analyzed term list of a document (stop words
+removed), not characters. So at index time analyzer.analyze_with_offsets records, for every
+position, the character span of the token it came from, and the doc store keeps them next to
+the content (encode_offsets). At query time:
+
+1. the positions of the query terms in the result docs are read from the postings, with one
+   PostingsCursor per query term that jumps from result to result (query_term_positions),
+2. the best window is the run of hits that fits in SNIPPET_LENGTH characters and contains the most
+   distinct query terms, then the most hits (best_window, a linear sliding window),
+3. the window is widened to SNIPPET_LENGTH characters on word boundaries and every hit inside it
+   is wrapped in HIGHLIGHT_START / HIGHLIGHT_END (make_snippet).
+
+Snippets are HTML: the text of the article is escaped (html.escape) before the markers are added,
+so a < or & in the content can not break the markup or inject tags.
+
+This only runs for the returned results, and costs a doc store lookup plus one positions block
+decode per query term for each of them.
+'''
+
+# characters of content in a snippet
+SNIPPET_LENGTH = 250
+HIGHLIGHT_START = "<b>"
+HIGHLIGHT_END = "</b>"
+ELLIPSIS = "..."
+
+
+def encode_offsets(offsets):
+    ''' VByte encodes the number of (start, end) spans, then every span as start gap to the previous end, length '''
+    numbers = [len(offsets)]
+    previous_end = 0
+    for start, end in offsets:
+        numbers.append(start - previous_end)
+        numbers.append(end - start)
+        previous_end = end
+    out = bytearray()
+    vbyte_encode(numbers, out)
+    return bytes(out)
+
+
+def decode_offsets(data):
+    ''' The (start, end) spans of encode_offsets data '''
+    if not data:
+        return []
+    count, offset = vbyte_decode_number(data, 0)
+    numbers, _ = vbyte_decode(data, offset, 2 * count)
+    offsets = []
+    previous_end = 0
+    for i in range(0, len(numbers), 2):
+        start = previous_end + numbers[i]
+        previous_end = start + numbers[i + 1]
+        offsets.append((start, previous_end))
+    return offsets
+
+
+def query_term_positions(terms, doc_ids, postings_index):
+    ''' {doc_id: [(position, term), ...] sorted by position} of the query terms in doc_ids '''
+    hits = {doc_id: [] for doc_id in doc_ids}
+    sorted_doc_ids = sorted(hits)
+    for term in dict.fromkeys(terms):
+        cursor = postings_index.cursor(term)
+        for doc_id in sorted_doc_ids:
+            cursor.next_geq(doc_id)
+            if cursor.doc == END:
+                break
+            if cursor.doc == doc_id:
+                hits[doc_id].extend((position, term) for position in cursor.positions())
+    for doc_hits in hits.values():
+        doc_hits.sort()
+    return hits
+
+
+def best_window(hits, offsets, length=SNIPPET_LENGTH):
+    '''
+    (first, last) indexes into hits of the window of hits whose characters span at most length
+    characters and that has the most distinct terms, then the most hits; the earliest such window.
+    '''
+    best = (0, 0)
+    best_score = (0, 0)
+    term_counts = {}
+    first = 0
+    for last, (position, term) in enumerate(hits):
+        term_counts[term] = term_counts.get(term, 0) + 1
+        while offsets[position][1] - offsets[hits[first][0]][0] > length and first < last:
+            first_term = hits[first][1]
+            term_counts[first_term] -= 1
+            if term_counts[first_term] == 0:
+                del term_counts[first_term]
+            first += 1
+        score = (len(term_counts), last - first + 1)
+        if score > best_score:
+            best_score = score
+            best = (first, last)
+    return best
+
+
+def lead_snippet(content):
+    ''' The start of content, for results without query term hits '''
+    if len(content) <= SNIPPET_LENGTH:
+        return html.escape(content)
+    return html.escape(content[:SNIPPET_LENGTH]) + ELLIPSIS
+
+
+def make_snippet(content, offsets, hits):
+    ''' Highlighted snippet of content around the best window of hits (see query_term_positions) '''
+    # positions past the stored offsets can not be located (should not happen, but never fail a query on it)
+    hits = [hit for hit in hits if hit[0] < len(offsets)]
+    if not hits:
+        return lead_snippet(content)
+    first, last = best_window(hits, offsets)
+    window_start = offsets[hits[first][0]][0]
+    window_end = offsets[hits[last][0]][1]
+
+    # center the window in SNIPPET_LENGTH characters, then move the cuts to word boundaries
+    padding = max(0, SNIPPET_LENGTH - (window_end - window_start)) // 2
+    start = max(0, window_start - padding)
+    end = min(len(content), max(window_end, start + SNIPPET_LENGTH))
+    start = max(0, min(start, end - SNIPPET_LENGTH))
+    if start > 0:
+        space = content.find(' ', start, window_start)
+        if space != -1:
+            start = space + 1
+    if end < len(content):
+        space = content.rfind(' ', window_end, end)
+        if space != -1:
+            end = space
+
+    pieces = [ELLIPSIS] if start > 0 else []
+    cursor = start
+    for position in sorted(set(hit[0] for hit in hits)):
+        hit_start, hit_end = offsets[position]
+        if hit_start < cursor or hit_end > end:
+            continue
+        pieces.append(html.escape(content[cursor:hit_start]))
+        pieces.append(HIGHLIGHT_START + html.escape(content[hit_start:hit_end]) + HIGHLIGHT_END)
+        cursor = hit_end
+    pieces.append(html.escape(content[cursor:end]))
+    if end < len(content):
+        pieces.append(ELLIPSIS)
+    return ''.join(pieces)
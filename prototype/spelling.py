@@ -0,0 +1,191 @@
+import time
+import struct
+from postings_codec import vbyte_encode_number, vbyte_decode_number
+from lexicon import Lexicon, encode_lexicon
+
+'''
+Spelling correction of query terms that are not in the index, with a SymSpell deletion dictionary.
+
+Two terms within edit distance d of each other become equal after deleting at most d characters
+from each of them. So the indexer stores, for every term, all strings made of it by deleting up to
+MAX_EDIT_DISTANCE characters (its deletes), and a query term is looked up by its own deletes: the
+index terms sharing one of them are the only candidates, and the true edit distance (Damerau-
+Levenshtein, a swap of two neighbouring characters counting as one edit) is computed for those
+alone, instead of for the whole vocabulary. Only the first PREFIX_LENGTH characters of a term are
+used for the deletes, which bounds their number per term (SymSpell's prefix trick); candidates are
+still checked on the full terms.
+
+The deletion dictionary is written into index.bin next to the term dictionary (see
+binary_index.py), for the terms of at least MIN_DOC_FREQ documents of the segment, so typos that
+made it into a single article are not suggested:
+
+    delete count, byte length of the term number lists
+    offsets table, one entry per delete: offset of its term number list
+    term number lists (VByte, gap encoded): the numbers of the terms in the index's lexicon
+    lexicon of the deletes (front-coded, lexicon.py)
+
+It is read from the mmapped file like the rest of the index, so nothing is built at query time.
+
+A query term that is not in the index is replaced by the indexed terms at the smallest edit
+distance, the MAX_CORRECTIONS that are in the most documents (SpellingCorrector). Short terms
+are allowed fewer edits (MAX_SHORT_DISTANCE), every other candidate of a short term would match.
+The lookups of a query stop at a latency budget (BUDGET seconds); terms that were not corrected
+by then are kept as they are.
+'''
+
+MAX_EDIT_DISTANCE = 2
+# terms up to SHORT_TERM_LENGTH characters are allowed MAX_SHORT_DISTANCE edits
+SHORT_TERM_LENGTH = 4
+MAX_SHORT_DISTANCE = 1
+MIN_TERM_LENGTH = 3
+PREFIX_LENGTH = 7
+MIN_DOC_FREQ = 2
+MAX_CORRECTIONS = 3
+# seconds of spelling lookups per query
+BUDGET = 0.005
+
+# delete count, byte length of the term number lists
+SECTION_HEADER = struct.Struct('<II')
+LIST_OFFSET = struct.Struct('<I')
+
+
+def deletes(term, max_distance):
+    ''' The strings made of term by deleting up to max_distance characters, term included '''
+    result = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier if len(word) > 1 for i in range(len(word))}
+        result |= frontier
+    return result
+
+
+def allowed_distance(term):
+    return MAX_SHORT_DISTANCE if len(term) <= SHORT_TERM_LENGTH else MAX_EDIT_DISTANCE
+
+
+def edit_distance(a, b, max_distance):
+    ''' Damerau-Levenshtein (optimal string alignment) distance of a and b, max_distance + 1 if it is larger '''
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before_previous_row, previous_row = previous_row, row
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before_previous_row[j - 2] + 1)
+        if min(row) > max_distance:
+            return max_distance + 1
+    return min(row[-1], max_distance + 1)
+
+
+def encode_spelling(terms, doc_freqs):
+    ''' The deletion dictionary section of terms (strings, ascending, numbered in order) as bytes '''
+    term_numbers = {}
+    for number, (term, doc_freq) in enumerate(zip(terms, doc_freqs)):
+        if doc_freq >= MIN_DOC_FREQ and len(term) >= MIN_TERM_LENGTH:
+            for delete in deletes(term[:PREFIX_LENGTH], MAX_EDIT_DISTANCE):
+                # terms are visited in ascending number order, so every list comes out sorted
+                term_numbers.setdefault(delete.encode('utf-8'), []).append(number)
+    sorted_deletes = sorted(term_numbers)
+    offsets = bytearray()
+    lists = bytearray()
+    for delete in sorted_deletes:
+        offsets += LIST_OFFSET.pack(len(lists))
+        previous = 0
+        for number in term_numbers[delete]:
+            vbyte_encode_number(number - previous, lists)
+            previous = number
+    return SECTION_HEADER.pack(len(sorted_deletes), len(lists)) + bytes(offsets) + bytes(lists) + encode_lexicon(sorted_deletes)
+
+
+class SpellingDictionary:
+    ''' Read-only view of a deletion dictionary section at offset of buffer '''
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self.delete_count, self._lists_length = SECTION_HEADER.unpack_from(buffer, offset)
+        self._offsets_offset = offset + SECTION_HEADER.size
+        self._lists_offset = self._offsets_offset + self.delete_count * LIST_OFFSET.size
+        self._deletes = Lexicon(buffer, self._lists_offset + self._lists_length, self.delete_count)
+
+    def _list_offset(self, i):
+        if i == self.delete_count:
+            return self._lists_length
+        return LIST_OFFSET.unpack_from(self._buffer, self._offsets_offset + i * LIST_OFFSET.size)[0]
+
+    def term_numbers(self, delete):
+        ''' Numbers of the terms that have delete among their deletes '''
+        i = self._deletes.find(delete.encode('utf-8'))
+        if i == -1:
+            return []
+        offset = self._lists_offset + self._list_offset(i)
+        end = self._lists_offset + self._list_offset(i + 1)
+        numbers = []
+        number = 0
+        while offset < end:
+            gap, offset = vbyte_decode_number(self._buffer, offset)
+            number += gap
+            numbers.append(number)
+        return numbers
+
+    def candidates(self, term, max_distance, deadline=None):
+        ''' Numbers of the terms sharing a delete with term, the lookups stop at deadline (perf_counter) '''
+        numbers = set()
+        for delete in deletes(term[:PREFIX_LENGTH], max_distance):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            numbers.update(self.term_numbers(delete))
+        return numbers
+
+
+def suggestions(term, postings_index, deadline=None):
+    '''
+    Indexed terms within the allowed edit distance of term, as (term, distance, document frequency)
+    with the smallest distance and then the most documents first. postings_index is a SegmentedIndex.
+    '''
+    if len(term) < MIN_TERM_LENGTH:
+        return []
+    max_distance = allowed_distance(term)
+    found = {}
+    for candidate in postings_index.spelling_candidates(term, max_distance, deadline):
+        if candidate not in found:
+            distance = edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                found[candidate] = distance
+    ranked = [(candidate, distance, postings_index.document_frequency(candidate)) for candidate, distance in found.items()]
+    ranked.sort(key=lambda suggestion: (suggestion[1], -suggestion[2], suggestion[0]))
+    return ranked
+
+
+class SpellingCorrector:
+    '''
+    Corrects the terms of one query: correct(term) returns the terms to search instead of term,
+    term itself if it is in the index or nothing close is. corrections maps every corrected term
+    to its replacements. All lookups of a query share one budget of budget seconds.
+    '''
+
+    def __init__(self, postings_index, budget=BUDGET):
+        self.postings_index = postings_index
+        self.deadline = time.perf_counter() + budget
+        self.corrections = {}
+
+    def correct(self, term):
+        if term in self.corrections:
+            return self.corrections[term]
+        if self.postings_index.document_frequency(term) > 0 or time.perf_counter() > self.deadline:
+            return [term]
+        ranked = suggestions(term, self.postings_index, self.deadline)
+        if not ranked:
+            return [term]
+        best_distance = ranked[0][1]
+        replacements = [candidate for candidate, distance, _ in ranked if distance == best_distance][:MAX_CORRECTIONS]
+        self.corrections[term] = replacements
+        return replacements
+
+    def best(self, term):
+        ''' The single best replacement of term (for phrases) '''
+        return self.correct(term)[0]
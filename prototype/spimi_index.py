@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import tempfile
+from binary_index import BinaryIndex, write_binary_index
+from index_merge import merge_partial_indexes
+from segments import create_manifest_file, new_build_files
+from doc_store import DocStoreWriter
+from create_index import (
+    source_folder, index_file, doc_table_file, doc_store_file,
+    index_source_file, list_documents, create_index_file, create_doc_table_file,
+    new_near_duplicates
+)
+
+'''
+Single-Pass In-Memory Indexing (SPIMI) version of create_index.py, for collections whose
+index does not fit in memory.
+
+Files are indexed into the in-memory postings_index like create_index.py does, but as soon
+as its estimated size goes over the memory budget the postings are sorted and flushed to
+disk as a run (a partial index in the binary layout of index.bin) and indexing continues
+with an empty postings_index. At the end the runs are combined with the streaming k-way
+merge in index_merge.py, which holds only one term per run in memory. So peak memory is
+the budget plus the merge buffers, no matter how large the collection is.
+
+Doc IDs are assigned globally while reading the files, so runs cover consecutive doc ID
+ranges and the merged output is byte-identical to a create_index.py build.
+
+Usage: python3 spimi_index.py [memory budget in MB]
+'''
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# Rough CPython sizes used to estimate the memory held by postings_index:
+# a new term costs its dict slot, key string and postings list,
+# a posting its [doc_id, positions] lists, and a position one int plus its list slot.
+TERM_BYTES = 200
+POSTING_BYTES = 150
+POSITION_BYTES = 36
+
+
+def estimate_added_bytes(postings_index, postings_index_map):
+    ''' Estimated memory that adding postings_index_map (already added) took in postings_index '''
+    added_bytes = 0
+    for term, (_, positions) in postings_index_map.items():
+        if len(postings_index[term]) == 1:
+            added_bytes += TERM_BYTES
+        added_bytes += POSTING_BYTES + POSITION_BYTES * len(positions)
+    return added_bytes
+
+
+def build_index_spimi(memory_budget_bytes, run_folder, doc_records):
+    '''
+    Indexes all source files, flushing runs to run_folder. Returns (run files, doc_table, doc_stats, file_hashes).
+    Doc store records go straight to the doc_records writer instead of being kept in memory.
+    '''
+    postings_index = {}
+    doc_table = []
+    doc_stats = []
+    file_hashes = {}
+    run_files = []
+    used_bytes = 0
+    near_duplicates = new_near_duplicates()
+
+    def flush_run():
+        run_file = os.path.join(run_folder, f"run_{len(run_files)}.bin")
+        create_index_file(postings_index, len(doc_table), run_file)
+        run_files.append(run_file)
+        print(f"Flushed run {len(run_files)} with {len(postings_index)} terms (~{used_bytes / (1024 * 1024):.1f} MB).")
+
+    for filename in list_documents(source_folder):
+        postings_index_map = index_source_file(source_folder, filename, postings_index, doc_table, doc_stats, doc_records,
+                                               near_duplicates, file_hashes)
+        if postings_index_map is None:
+            continue
+        used_bytes += estimate_added_bytes(postings_index, postings_index_map)
+        if used_bytes >= memory_budget_bytes:
+            flush_run()
+            postings_index.clear()
+            used_bytes = 0
+
+    if postings_index or not run_files:
+        flush_run()
+    return run_files, doc_table, doc_stats, file_hashes
+
+
+def merge_runs(run_files, doc_norms, doc_lengths, filename):
+    runs = [BinaryIndex(run_file) for run_file in run_files]
+    try:
+        # runs already carry global doc IDs, so none of them is shifted
+        merged = merge_partial_indexes([run.items() for run in runs], [0] * len(runs))
+        write_binary_index(merged, len(doc_norms), filename, doc_norms, doc_lengths, spelling=True)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def main():
+    memory_budget_mb = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MEMORY_BUDGET_MB
+    start_time = time.time()
+    index_path, doc_table_path, doc_store_path = new_build_files(index_file, doc_table_file, doc_store_file)
+    with tempfile.TemporaryDirectory(dir='.') as run_folder:
+        doc_records = DocStoreWriter(doc_store_path)
+        try:
+            run_files, doc_table, doc_stats, file_hashes = build_index_spimi(memory_budget_mb * 1024 * 1024, run_folder, doc_records)
+        finally:
+            doc_records.close()
+        end_time = time.time()
+        print(f"build_index_spimi() wrote {len(run_files)} runs in {end_time - start_time:.2f} seconds.")
+
+        start_time = time.time()
+        merge_runs(run_files, [stats["norm"] for stats in doc_stats], [stats["length"] for stats in doc_stats], index_path)
+        end_time = time.time()
+        print(f"merge_runs() took {end_time - start_time:.2f} seconds.")
+
+    create_doc_table_file(doc_table, doc_stats, doc_table_path)
+    create_manifest_file(doc_table, source_folder, index_path, doc_table_path, doc_store_path, file_hashes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import heapq
+from collections import Counter
+from postings_cursor import END
+from scoring import get_scorer
+
+'''
+Top-k retrieval with WAND dynamic pruning.
+
+rank_documents in query_index.py scores every document that contains a query term. For the
+top k only the documents that can still beat the k-th best score found so far matter, and
+the scorer gives an upper bound for every term (from the max term weight, or the max term
+frequency and min document length, stored per term in the index, see binary_index.py and
+scoring.py): no document can get more than that from the term.
+
+WAND evaluates the query document-at-a-time with one PostingsCursor per query term:
+1. sort the cursors by their current doc ID,
+2. add up their upper bounds in that order until the sum exceeds the threshold (the k-th best
+   score so far); the cursor where that happens is the pivot. Documents before the pivot doc
+   appear in too few query terms to make it into the top k,
+3. if all cursors before the pivot already sit on the pivot doc it is scored, otherwise those
+   cursors jump to the pivot doc with next_geq, skipping whole postings blocks on the way.
+
+The k best documents are kept in a min-heap of (score, -doc), so the k-th best is always at
+the top and ties go to the smaller doc ID.
+
+Scores are added up in query term order with the same scorer as rank_documents, so the top k is
+exactly the top k of exhaustive scoring.
+'''
+
+# guards the upper bound comparison against float rounding of the summed bounds
+BOUND_SLACK = 1e-9
+
+
+class TermCursor:
+    ''' A query term's postings cursor with its IDF and score upper bound '''
+
+    def __init__(self, cursor, idf, upper_bound):
+        self.cursor = cursor
+        self.idf = idf
+        self.upper_bound = upper_bound
+
+
+def wand_top_k(terms, postings_index, k, stats=None, scorer=None):
+    '''
+    Returns the k best (doc, score) pairs of rank_documents' score, best first, scored by scorer
+    (see scoring.py, the default scorer of postings_index if None).
+    postings_index is a SegmentedIndex. If stats is a dict, the number of postings in the query
+    terms' lists, the number of postings decoded and the number of blocks skipped are added to it.
+    '''
+    if k <= 0:
+        return []
+    if scorer is None:
+        scorer = get_scorer(postings_index)
+    term_cursors = {}
+    for term, count in Counter(terms).items():
+        IDF = scorer.idf(term)
+        if IDF is None:
+            # term is not in index
+            continue
+        # a term repeated in the query adds its score once per occurrence
+        upper_bound = scorer.upper_bound(term, IDF, postings_index) * count
+        term_cursors[term] = TermCursor(postings_index.cursor(term), IDF, upper_bound)
+    # query terms in query order, the order in which scores are added up
+    scored_terms = [term for term in terms if term in term_cursors]
+    active = list(term_cursors.values())
+
+    top_k = []
+    while True:
+        active = [term_cursor for term_cursor in active if term_cursor.cursor.doc != END]
+        active.sort(key=lambda term_cursor: term_cursor.cursor.doc)
+        threshold = top_k[0][0] if len(top_k) == k else -1
+
+        pivot = None
+        bound = 0
+        for i, term_cursor in enumerate(active):
+            bound += term_cursor.upper_bound
+            if bound * (1 + BOUND_SLACK) > threshold:
+                pivot = i
+                break
+        if pivot is None:
+            # no remaining document can make it into the top k
+            break
+
+        pivot_doc = active[pivot].cursor.doc
+        if active[0].cursor.doc == pivot_doc:
+            score = 0
+            for term in scored_terms:
+                term_cursor = term_cursors[term]
+                if term_cursor.cursor.doc == pivot_doc:
+                    score = score + scorer.weight(term_cursor.cursor.tf, pivot_doc, term_cursor.idf)
+            if len(top_k) < k:
+                heapq.heappush(top_k, (score, -pivot_doc))
+            elif score > threshold:
+                # equal scores keep the smaller doc IDs that are already in the heap
+                heapq.heapreplace(top_k, (score, -pivot_doc))
+            for term_cursor in active:
+                if term_cursor.cursor.doc == pivot_doc:
+                    term_cursor.cursor.next()
+        else:
+            for term_cursor in active[:pivot]:
+                term_cursor.cursor.next_geq(pivot_doc)
+
+    if stats is not None:
+        for term_cursor in term_cursors.values():
+            stats["postings"] = stats.get("postings", 0) + term_cursor.cursor.doc_freq
+            stats["decoded"] = stats.get("decoded", 0) + term_cursor.cursor.decoded
+            stats["skipped_blocks"] = stats.get("skipped_blocks", 0) + term_cursor.cursor.skipped_blocks
+    return [(-negative_doc, score) for score, negative_doc in sorted(top_k, reverse=True)]
@@ -0,0 +1,174 @@
+import sys
+import json
+import time
+from analyzer import analyze
+from segments import open_index, manifest_file
+
+try:
+    import numpy as np
+    import scipy.sparse as sparse
+except ImportError:
+    np = None
+    sparse = None
+
+'''
+Vector space model of an opened index as a sparse matrix, for scoring many queries at once
+(offline evaluation, re-ranking the results of another stage in bulk).
+
+The corpus is a CSR matrix with one row per live document and one column per term of the
+vocabulary. Entry (d, t) is tf * idf, idf being log(N / df) like SegmentedIndex.idf, and every
+row is divided by its norm ||d|| once when the matrix is built, so that the cosine similarity of
+a document and a query is a dot product. A query is a vector of term counts * idf of unit length.
+
+A batch of queries is one sparse matrix - sparse matrix product, documents x queries, with a
+non-zero for every document that has a term of the query. The top k of a column are found with
+argpartition, which does not sort the other scores.
+
+Unlike query_index.rank_documents, which adds up tf / ||D|| * idf with ||D|| the magnitude of the
+raw term frequency vector, this is the textbook cosine: both vectors are idf weighted, query terms
+are weighted by how often they occur in the query, and there is no rank threshold.
+
+Needs numpy and scipy, which the rest of the prototype does not.
+
+Usage: python3 vector_space.py queries.txt [k]
+    one query per line, prints one JSON line with the top k per query
+'''
+
+DEFAULT_K = 10
+
+
+class VectorSpace:
+    '''
+    vocabulary maps term -> column, doc_ids maps row -> doc ID, idf holds the idf per column
+    and row_norms the norm of every row before it was normalized.
+    Built from one opened index, build a new one for a new index generation.
+    '''
+
+    def __init__(self, postings_index):
+        if np is None:
+            raise ImportError("vector_space.py needs numpy and scipy, install them")
+        self.generation = postings_index.generation
+        self.doc_ids = np.array(sorted(postings_index.doc_table), dtype=np.int64)
+        rows_of = {doc_id: row for row, doc_id in enumerate(self.doc_ids.tolist())}
+        self.vocabulary = {}
+        rows = []
+        columns = []
+        term_freqs = []
+        # segment by segment, a document lives in a single one
+        for segment in postings_index.segments:
+            for term in segment.terms():
+                column = self.vocabulary.setdefault(term, len(self.vocabulary))
+                for doc_ids, tfs, _ in segment.blocks(term, with_positions=False):
+                    for doc_id, tf in zip(doc_ids, tfs):
+                        row = rows_of.get(doc_id)
+                        # tombstoned
+                        if row is not None:
+                            rows.append(row)
+                            columns.append(column)
+                            term_freqs.append(tf)
+        shape = (len(self.doc_ids), len(self.vocabulary))
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        doc_count = len(self.doc_ids)
+        doc_freqs = np.bincount(columns, minlength=shape[1])
+        with np.errstate(divide='ignore'):
+            self.idf = np.where(doc_freqs == doc_count, 1.0, np.log(doc_count / np.maximum(doc_freqs, 1)))
+        weights = np.array(term_freqs, dtype=np.float64) * self.idf[columns]
+        matrix = sparse.csr_matrix((weights, (rows, columns)), shape=shape)
+        self.row_norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        inverse_norms = np.divide(1.0, self.row_norms, out=np.zeros_like(self.row_norms), where=self.row_norms > 0)
+        self.matrix = sparse.diags(inverse_norms) @ matrix
+
+    def query_matrix(self, queries):
+        ''' One unit length row per query (a list of analyzed terms), unknown terms are left out '''
+        rows = []
+        columns = []
+        counts = []
+        for row, terms in enumerate(queries):
+            for term in terms:
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    counts.append(1.0)
+        # repeated terms are summed up into their count
+        matrix = sparse.csr_matrix((np.array(counts), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))),
+                                   shape=(len(queries), len(self.vocabulary)))
+        matrix = matrix @ sparse.diags(self.idf)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        return sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)) @ matrix
+
+    def scores(self, queries):
+        ''' Cosine similarities as a sparse documents x queries matrix (CSC, one column per query) '''
+        return (self.matrix @ self.query_matrix(queries).T).tocsc()
+
+    def top_k(self, queries, k=DEFAULT_K):
+        '''
+        The k most similar documents of every query (a list of analyzed terms), as lists of
+        (doc ID, score) in descending score order, ties by ascending doc ID like wand_top_k
+        '''
+        scores = self.scores(queries)
+        return [self._best(scores.indices[start:end], scores.data[start:end], k)
+                for start, end in zip(scores.indptr[:-1], scores.indptr[1:])]
+
+    def rerank(self, terms, doc_ids, k=None):
+        ''' Scores the documents doc_ids (another stage's candidates) against one query, best first '''
+        doc_ids = np.array(list(doc_ids), dtype=np.int64)
+        rows = np.searchsorted(self.doc_ids, doc_ids)
+        # documents that are not live are left out
+        found = rows < len(self.doc_ids)
+        found[found] = self.doc_ids[rows[found]] == doc_ids[found]
+        rows = rows[found]
+        column = (self.matrix[rows] @ self.query_matrix([terms]).T).toarray().ravel()
+        return self._best(rows, column, len(rows) if k is None else k, keep_zeros=True)
+
+    def _best(self, rows, scores, k, keep_zeros=False):
+        if not keep_zeros:
+            nonzero = scores > 0
+            rows = rows[nonzero]
+            scores = scores[nonzero]
+        if len(scores) > k > 0:
+            # everything scoring at least the k-th best score, so ties at the cut are broken by doc ID below
+            kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            selected = scores >= kth
+            rows = rows[selected]
+            scores = scores[selected]
+        doc_ids = self.doc_ids[rows]
+        order = np.lexsort((doc_ids, -scores))[:k]
+        return list(zip(doc_ids[order].tolist(), scores[order].tolist()))
+
+    def search(self, queries, k=DEFAULT_K):
+        ''' top_k of query strings, analyzed like query_index analyzes free text queries '''
+        return self.top_k([analyze(query) for query in queries], k)
+
+
+def main():
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: python3 vector_space.py queries.txt [k]")
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_K
+    with open(sys.argv[1], encoding='utf-8') as file:
+        queries = [line.strip() for line in file if line.strip()]
+    postings_index = open_index(manifest_file)
+    if postings_index is None:
+        raise SystemExit(1)
+    try:
+        start_time = time.perf_counter()
+        vector_space = VectorSpace(postings_index)
+        build_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        results = vector_space.search(queries, k)
+        query_time = time.perf_counter() - start_time
+        for query, top_k in zip(queries, results):
+            print(json.dumps({
+                "query": query,
+                "results": [{"doc_id": doc_id, "filename": postings_index.doc_table[doc_id]["filename"], "score": score}
+                            for doc_id, score in top_k]
+            }))
+        print(f"matrix of {vector_space.matrix.shape[0]} documents x {vector_space.matrix.shape[1]} terms built in "
+              f"{build_time:.2f} seconds, {len(queries)} queries in {query_time:.3f} seconds", file=sys.stderr)
+    finally:
+        postings_index.close()
+
+
+if __name__ == "__main__":
+    main()